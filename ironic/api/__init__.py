@@ -27,6 +27,11 @@ API_SERVICE_OPTS = [
                default=1000,
                help='The maximum number of items returned in a single '
                     'response from a collection resource.'),
+    cfg.BoolOpt('stream_collections',
+                default=False,
+                help='Send the JSON body of the node and port lists as a '
+                     'stream, rendering one item at a time, rather than '
+                     'building the whole body in memory first.'),
     ]
 
 CONF = cfg.CONF
@@ -47,6 +47,10 @@ def setup_app(pecan_config=None, extra_hooks=None):
                  hooks.DBHook(),
                  hooks.ContextHook(pecan_config.app.acl_public_routes),
                  hooks.RPCHook(),
+                 # 'after' hooks run in the reverse order, so the
+                 # streamed body is only set once the other hooks are
+                 # done reading the rendered one.
+                 hooks.StreamingHook(),
                  hooks.NoExceptionTracebackHook()]
     if extra_hooks:
         app_hooks.extend(extra_hooks)
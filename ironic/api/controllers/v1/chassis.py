@@ -120,7 +120,8 @@ class ChassisCollection(collection.Collection):
         collection.chassis = [Chassis.convert_with_links(ch, expand)
                               for ch in chassis]
         url = url or None
-        collection.next = collection.get_next(limit, url=url, **kwargs)
+        collection.next = collection.get_next(limit, url=url, items=chassis,
+                                              **kwargs)
         return collection
 
     @classmethod
@@ -148,10 +149,8 @@ class ChassisController(rest.RestController):
                                 expand=False, resource_url=None):
         limit = api_utils.validate_limit(limit)
         sort_dir = api_utils.validate_sort_dir(sort_dir)
-        marker_obj = None
-        if marker:
-            marker_obj = objects.Chassis.get_by_uuid(pecan.request.context,
-                                                     marker)
+        marker_obj = api_utils.decode_marker(marker, sort_key,
+                                             objects.Chassis)
         chassis = pecan.request.dbapi.get_chassis_list(limit, marker_obj,
                                                        sort_key=sort_key,
                                                        sort_dir=sort_dir)
@@ -161,7 +160,7 @@ class ChassisController(rest.RestController):
                                                     sort_key=sort_key,
                                                     sort_dir=sort_dir)
 
-    @wsme_pecan.wsexpose(ChassisCollection, types.uuid,
+    @wsme_pecan.wsexpose(ChassisCollection, wtypes.text,
                          int, wtypes.text, wtypes.text)
     def get_all(self, marker=None, limit=None, sort_key='id', sort_dir='asc'):
         """Retrieve a list of chassis.
@@ -173,7 +172,7 @@ class ChassisController(rest.RestController):
         """
         return self._get_chassis_collection(marker, limit, sort_key, sort_dir)
 
-    @wsme_pecan.wsexpose(ChassisCollection, types.uuid, int,
+    @wsme_pecan.wsexpose(ChassisCollection, wtypes.text, int,
                          wtypes.text, wtypes.text)
     def detail(self, marker=None, limit=None, sort_key='id', sort_dir='asc'):
         """Retrieve a list of chassis with detail.
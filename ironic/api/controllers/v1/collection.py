@@ -13,11 +13,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import json
+
 import pecan
+from wsme.rest import json as wsme_json
 from wsme import types as wtypes
 
 from ironic.api.controllers import base
 from ironic.api.controllers import link
+from ironic.api.controllers.v1 import utils as api_utils
 
 
 class Collection(base.APIBase):
@@ -33,16 +37,63 @@ class Collection(base.APIBase):
         """Return whether collection has more items."""
         return len(self.collection) and len(self.collection) == limit
 
-    def get_next(self, limit, url=None, **kwargs):
-        """Return a link to the next subset of the collection."""
+    def get_next(self, limit, url=None, items=None, **kwargs):
+        """Return a link to the next subset of the collection.
+
+        :param items: the objects or rows the collection was built from.
+                      If given, the marker of the link is encoded from
+                      the last one and the sort_key in kwargs, otherwise
+                      it is the UUID of the last item.
+        """
         if not self.has_next(limit):
             return wtypes.Unset
 
+        if items:
+            marker = api_utils.encode_marker(items[-1], kwargs['sort_key'])
+        else:
+            marker = self.collection[-1].uuid
+        return self._make_next_link(limit, marker, url, **kwargs)
+
+    def _make_next_link(self, limit, marker, url=None, **kwargs):
         resource_url = url or self._type
         q_args = ''.join(['%s=%s&' % (key, kwargs[key]) for key in kwargs])
         next_args = '?%(args)slimit=%(limit)d&marker=%(marker)s' % {
                                             'args': q_args, 'limit': limit,
-                                            'marker': self.collection[-1].uuid}
+                                            'marker': marker}
 
         return link.Link.make_link('next', pecan.request.host_url,
                                    resource_url, next_args).href
+
+    def stream(self, items, item_type, convert, limit, url=None, **kwargs):
+        """Send the collection as a stream of JSON chunks.
+
+        Rather than converting every item and rendering the whole body
+        at once, the items are converted and rendered one at a time
+        while the body is sent; hooks.StreamingHook puts these chunks in
+        place of the body wsme renders. The body is the same as the one
+        of the collection built with all the items.
+
+        :param items: the objects or rows the collection is made of.
+        :param item_type: the API type of the items.
+        :param convert: a function returning the API object of an item.
+                        It is called after the controller returned, when
+                        pecan.request is no longer set.
+        :param limit: the page size, as for get_next().
+        :param url: the resource URL, as for get_next().
+        """
+        next_link = wtypes.Unset
+        if items and len(items) == limit:
+            marker = api_utils.encode_marker(items[-1], kwargs['sort_key'])
+            next_link = self._make_next_link(limit, marker, url, **kwargs)
+        pecan.request.streamed_body = self._iter_json(items, item_type,
+                                                      convert, next_link)
+
+    def _iter_json(self, items, item_type, convert, next_link):
+        yield '{"%s": [' % self._type
+        for i, item in enumerate(items):
+            body = wsme_json.encode_result(convert(item), item_type)
+            yield body if i == 0 else ', ' + body
+        if next_link is wtypes.Unset:
+            yield ']}'
+        else:
+            yield '], "next": %s}' % json.dumps(next_link)
@@ -149,6 +149,34 @@ class NodeStates(base.APIBase):
         return sample
 
 
+class BulkPowerRequest(base.APIBase):
+    """API representation of a power state change of several nodes."""
+
+    node_uuids = wsme.wsattr([types.uuid], mandatory=True)
+    "The UUIDs of the nodes"
+
+    target = wsme.wsattr(wtypes.text, mandatory=True)
+    "The desired power state of the nodes"
+
+
+class BulkPowerResult(base.APIBase):
+    """API representation of the outcome of a bulk power request."""
+
+    accepted = [types.uuid]
+    "The UUIDs of the nodes whose power state change has started"
+
+    failed = {wtypes.text: wtypes.text}
+    "The reason why each of the other nodes is not being changed"
+
+    @classmethod
+    def sample(cls):
+        sample = cls(accepted=['1be26c0b-03f2-4d2e-ae87-c02d7f33c123'],
+                     failed={'e1b2b4a1-ba3b-4b3e-9a3a-0d3c2c8c4cbf':
+                             'Node is locked by another process or does '
+                             'not exist.'})
+        return sample
+
+
 class NodeStatesController(rest.RestController):
 
     _custom_actions = {
@@ -256,6 +284,11 @@ class NodeStatesController(rest.RestController):
         pecan.response.location = link.build_url('nodes', url_args)
 
 
+# Fields of a node shown when listing nodes without details.
+NODE_LIST_FIELDS = ['instance_uuid', 'maintenance', 'power_state',
+                    'provision_state', 'uuid']
+
+
 class Node(base.APIBase):
     """API representation of a bare metal node.
 
@@ -373,9 +406,7 @@ class Node(base.APIBase):
     @classmethod
     def _convert_with_links(cls, node, url, expand=True):
         if not expand:
-            except_list = ['instance_uuid', 'maintenance', 'power_state',
-                           'provision_state', 'uuid']
-            node.unset_fields_except(except_list)
+            node.unset_fields_except(NODE_LIST_FIELDS)
         else:
             node.ports = [link.Link.make_link('self', url, 'nodes',
                                               node.uuid + "/ports"),
@@ -397,7 +428,11 @@ class Node(base.APIBase):
 
     @classmethod
     def convert_with_links(cls, rpc_node, expand=True):
-        node = Node(**rpc_node.as_dict())
+        if isinstance(rpc_node, dict):
+            # A row of a node list, holding only NODE_LIST_FIELDS.
+            node = Node(**rpc_node)
+        else:
+            node = Node(**rpc_node.as_dict())
         return cls._convert_with_links(node, pecan.request.host_url,
                                        expand)
 
@@ -435,7 +470,40 @@ class NodeCollection(collection.Collection):
                            expand=False, **kwargs):
         collection = NodeCollection()
         collection.nodes = [Node.convert_with_links(n, expand) for n in nodes]
-        collection.next = collection.get_next(limit, url=url, **kwargs)
+        collection.next = collection.get_next(limit, url=url, items=nodes,
+                                              **kwargs)
+        return collection
+
+    @classmethod
+    def stream_with_links(cls, nodes, limit, url=None,
+                          expand=False, **kwargs):
+        """Like convert_with_links(), but stream the nodes.
+
+        :param nodes: Node objects, or rows of NODE_LIST_FIELDS if not
+                      expanded.
+        """
+        host_url = pecan.request.host_url
+        # The nodes are converted after the request is done with, so the
+        # UUIDs of their chassis are looked up now, once per chassis.
+        chassis_uuids = {}
+        if expand:
+            for chassis_id in set(n.chassis_id for n in nodes):
+                if chassis_id:
+                    chassis = pecan.request.dbapi.get_chassis(chassis_id)
+                    chassis_uuids[chassis_id] = chassis.uuid
+
+        def convert(rpc_node):
+            if isinstance(rpc_node, dict):
+                node = Node(**rpc_node)
+            else:
+                node_dict = rpc_node.as_dict()
+                chassis_id = node_dict.pop('chassis_id', None)
+                node = Node(**node_dict)
+                node._chassis_uuid = chassis_uuids.get(chassis_id)
+            return Node._convert_with_links(node, host_url, expand)
+
+        collection = NodeCollection()
+        collection.stream(nodes, Node, convert, limit, url=url, **kwargs)
         return collection
 
     @classmethod
@@ -499,6 +567,7 @@ class NodesController(rest.RestController):
     _custom_actions = {
         'detail': ['GET'],
         'validate': ['GET'],
+        'power': ['PUT'],
     }
 
     def _get_nodes_collection(self, chassis_uuid, instance_uuid, associated,
@@ -511,10 +580,7 @@ class NodesController(rest.RestController):
         limit = api_utils.validate_limit(limit)
         sort_dir = api_utils.validate_sort_dir(sort_dir)
 
-        marker_obj = None
-        if marker:
-            marker_obj = objects.Node.get_by_uuid(pecan.request.context,
-                                                  marker)
+        marker_obj = api_utils.decode_marker(marker, sort_key, objects.Node)
         if instance_uuid:
             nodes = self._get_nodes_by_instance(instance_uuid)
         else:
@@ -526,16 +592,34 @@ class NodesController(rest.RestController):
             if maintenance is not None:
                 filters['maintenance'] = maintenance
 
-            nodes = pecan.request.dbapi.get_node_list(filters, limit,
-                                                      marker_obj,
-                                                      sort_key=sort_key,
-                                                      sort_dir=sort_dir)
+            if expand:
+                nodes = pecan.request.dbapi.get_node_list(filters, limit,
+                                                          marker_obj,
+                                                          sort_key=sort_key,
+                                                          sort_dir=sort_dir)
+            else:
+                # Only read the columns which are shown, rather than
+                # loading and decoding whole nodes, plus the ones the
+                # marker of the next page is made of.
+                columns = NODE_LIST_FIELDS + ['id']
+                if sort_key not in columns:
+                    columns.append(sort_key)
+                rows = pecan.request.dbapi.get_nodeinfo_list(
+                        columns=columns, filters=filters, limit=limit,
+                        marker=marker_obj, sort_key=sort_key,
+                        sort_dir=sort_dir)
+                nodes = [dict(zip(columns, row)) for row in rows]
 
         parameters = {'sort_key': sort_key, 'sort_dir': sort_dir}
         if associated:
             parameters['associated'] = associated
         if maintenance:
             parameters['maintenance'] = maintenance
+        if CONF.api.stream_collections and not instance_uuid:
+            return NodeCollection.stream_with_links(nodes, limit,
+                                                    url=resource_url,
+                                                    expand=expand,
+                                                    **parameters)
         return NodeCollection.convert_with_links(nodes, limit,
                                                  url=resource_url,
                                                  expand=expand,
@@ -553,7 +637,7 @@ class NodesController(rest.RestController):
             return []
 
     @wsme_pecan.wsexpose(NodeCollection, types.uuid, types.uuid,
-               types.boolean, types.boolean, types.uuid, int, wtypes.text,
+               types.boolean, types.boolean, wtypes.text, int, wtypes.text,
                wtypes.text)
     def get_all(self, chassis_uuid=None, instance_uuid=None, associated=None,
                 maintenance=None, marker=None, limit=None, sort_key='id',
@@ -580,7 +664,7 @@ class NodesController(rest.RestController):
                                           limit, sort_key, sort_dir)
 
     @wsme_pecan.wsexpose(NodeCollection, types.uuid, types.uuid,
-            types.boolean, types.boolean, types.uuid, int, wtypes.text,
+            types.boolean, types.boolean, wtypes.text, int, wtypes.text,
             wtypes.text)
     def detail(self, chassis_uuid=None, instance_uuid=None, associated=None,
                maintenance=None, marker=None, limit=None, sort_key='id',
@@ -626,6 +710,59 @@ class NodesController(rest.RestController):
         return pecan.request.rpcapi.validate_driver_interfaces(
                 pecan.request.context, rpc_node.uuid, topic)
 
+    @wsme_pecan.wsexpose(BulkPowerResult, body=BulkPowerRequest,
+                         status_code=202)
+    def power(self, request):
+        """Set the power state of several nodes.
+
+        The nodes are grouped by the conductor they are mapped to, and each
+        of those conductors is sent a single request for all of its nodes.
+
+        :param request: a BulkPowerRequest with the UUIDs of the nodes and
+                        their desired power state.
+        :raises: InvalidStateRequested (HTTP 400) if the requested target
+                 state is not valid.
+        """
+        if self.from_chassis:
+            raise exception.OperationNotPermitted
+
+        node_uuids = list(set(request.node_uuids))
+        if request.target not in [ir_states.POWER_ON,
+                                  ir_states.POWER_OFF,
+                                  ir_states.REBOOT]:
+            raise exception.InvalidStateRequested(
+                    state=request.target, node=', '.join(node_uuids))
+
+        context = pecan.request.context
+        rpcapi = pecan.request.rpcapi
+        nodes = pecan.request.dbapi.get_nodeinfo_list(
+                columns=['uuid', 'driver'], filters={'uuid_in': node_uuids})
+
+        result = BulkPowerResult(accepted=[], failed={})
+        found = set(node_uuid for node_uuid, driver in nodes)
+        for node_uuid in node_uuids:
+            if node_uuid not in found:
+                result.failed[node_uuid] = _('Node not found.')
+
+        # Nodes whose driver no conductor supports are reported as failed,
+        # without failing the request for the other nodes.
+        unmapped = {}
+        topics = rpcapi.get_topics_for_nodes(nodes, unmapped=unmapped)
+        result.failed.update(unmapped)
+        for topic, topic_uuids in topics.items():
+            try:
+                summary = rpcapi.change_nodes_power_state(
+                        context, topic_uuids, request.target, topic)
+            except Exception as e:
+                # Report the conductor's failure against each of its
+                # nodes, so the other conductors' nodes are still changed.
+                for node_uuid in topic_uuids:
+                    result.failed[node_uuid] = six.text_type(e)
+                continue
+            result.accepted.extend(summary['accepted'])
+            result.failed.update(summary['failed'])
+        return result
+
     @wsme_pecan.wsexpose(Node, types.uuid)
     def get_one(self, node_uuid):
         """Retrieve information about the given node.
@@ -15,6 +15,7 @@
 
 import datetime
 
+from oslo.config import cfg
 import pecan
 from pecan import rest
 import six
@@ -31,6 +32,9 @@ from ironic.common import exception
 from ironic import objects
 
 
+CONF = cfg.CONF
+
+
 class PortPatchType(types.JsonPatchType):
 
     @staticmethod
@@ -38,6 +42,10 @@ class PortPatchType(types.JsonPatchType):
         return ['/address', '/node_uuid']
 
 
+# Fields of a port shown when listing ports without details.
+PORT_LIST_FIELDS = ['uuid', 'address']
+
+
 class Port(base.APIBase):
     """API representation of a port.
 
@@ -96,23 +104,30 @@ class Port(base.APIBase):
         setattr(self, 'node_uuid', kwargs.get('node_id'))
 
     @classmethod
-    def convert_with_links(cls, rpc_port, expand=True):
-        port = Port(**rpc_port.as_dict())
+    def _convert_with_links(cls, port, url, expand=True):
         if not expand:
-            port.unset_fields_except(['uuid', 'address'])
+            port.unset_fields_except(PORT_LIST_FIELDS)
 
         # never expose the node_id attribute
         port.node_id = wtypes.Unset
 
-        port.links = [link.Link.make_link('self', pecan.request.host_url,
+        port.links = [link.Link.make_link('self', url,
                                           'ports', port.uuid),
-                      link.Link.make_link('bookmark',
-                                          pecan.request.host_url,
+                      link.Link.make_link('bookmark', url,
                                           'ports', port.uuid,
                                           bookmark=True)
                      ]
         return port
 
+    @classmethod
+    def convert_with_links(cls, rpc_port, expand=True):
+        if isinstance(rpc_port, dict):
+            # A row of a port list, holding only PORT_LIST_FIELDS.
+            port = Port(**rpc_port)
+        else:
+            port = Port(**rpc_port.as_dict())
+        return cls._convert_with_links(port, pecan.request.host_url, expand)
+
     @classmethod
     def sample(cls):
         sample = cls(uuid='27e3153e-d5bf-4b7e-b517-fb518e17f34c',
@@ -141,7 +156,21 @@ class PortCollection(collection.Collection):
         collection = PortCollection()
         collection.ports = [Port.convert_with_links(p, expand)
                             for p in rpc_ports]
-        collection.next = collection.get_next(limit, url=url, **kwargs)
+        collection.next = collection.get_next(limit, url=url,
+                                              items=rpc_ports, **kwargs)
+        return collection
+
+    @classmethod
+    def stream_rows_with_links(cls, rows, limit, url=None, **kwargs):
+        """Stream a list of ports, given as rows of PORT_LIST_FIELDS."""
+        host_url = pecan.request.host_url
+
+        def convert(row):
+            return Port._convert_with_links(Port(**row), host_url,
+                                            expand=False)
+
+        collection = PortCollection()
+        collection.stream(rows, Port, convert, limit, url=url, **kwargs)
         return collection
 
     @classmethod
@@ -172,23 +201,39 @@ class PortsController(rest.RestController):
         limit = api_utils.validate_limit(limit)
         sort_dir = api_utils.validate_sort_dir(sort_dir)
 
-        marker_obj = None
-        if marker:
-            marker_obj = objects.Port.get_by_uuid(pecan.request.context,
-                                                  marker)
+        marker_obj = api_utils.decode_marker(marker, sort_key, objects.Port)
 
+        filters = {}
         if node_uuid:
             # FIXME(comstud): Since all we need is the node ID, we can
             #                 make this more efficient by only querying
             #                 for that column. This will get cleaned up
             #                 as we move to the object interface.
             node = objects.Node.get_by_uuid(pecan.request.context, node_uuid)
+            filters['node_id'] = node.id
+
+        if address and not node_uuid:
+            ports = self._get_ports_by_address(address)
+        elif not expand:
+            # Only read the columns which are shown, rather than
+            # loading and decoding whole ports, plus the ones the
+            # marker of the next page is made of.
+            columns = PORT_LIST_FIELDS + ['id']
+            if sort_key not in columns:
+                columns.append(sort_key)
+            rows = pecan.request.dbapi.get_portinfo_list(
+                    columns=columns, filters=filters, limit=limit,
+                    marker=marker_obj, sort_key=sort_key, sort_dir=sort_dir)
+            ports = [dict(zip(columns, row)) for row in rows]
+            if CONF.api.stream_collections:
+                return PortCollection.stream_rows_with_links(
+                        ports, limit, url=resource_url, sort_key=sort_key,
+                        sort_dir=sort_dir)
+        elif node_uuid:
             ports = pecan.request.dbapi.get_ports_by_node_id(node.id, limit,
                                                              marker_obj,
                                                              sort_key=sort_key,
                                                              sort_dir=sort_dir)
-        elif address:
-            ports = self._get_ports_by_address(address)
         else:
             ports = pecan.request.dbapi.get_port_list(limit, marker_obj,
                                                       sort_key=sort_key,
@@ -215,7 +260,7 @@ class PortsController(rest.RestController):
             return []
 
     @wsme_pecan.wsexpose(PortCollection, types.uuid, types.macaddress,
-                         types.uuid, int, wtypes.text, wtypes.text)
+                         wtypes.text, int, wtypes.text, wtypes.text)
     def get_all(self, node_uuid=None, address=None, marker=None, limit=None,
                 sort_key='id', sort_dir='asc'):
         """Retrieve a list of ports.
@@ -232,7 +277,7 @@ class PortsController(rest.RestController):
                                           sort_key, sort_dir)
 
     @wsme_pecan.wsexpose(PortCollection, types.uuid, types.macaddress,
-                         types.uuid, int, wtypes.text, wtypes.text)
+                         wtypes.text, int, wtypes.text, wtypes.text)
     def detail(self, node_uuid=None, address=None, marker=None, limit=None,
                 sort_key='id', sort_dir='asc'):
         """Retrieve a list of ports with detail.
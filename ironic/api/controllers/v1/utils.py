@@ -13,11 +13,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
+
 import jsonpatch
+import pecan
 import wsme
 
 from oslo.config import cfg
 
+from ironic.common import utils
+from ironic.objects import utils as obj_utils
+from ironic.openstack.common import jsonutils
+from ironic.openstack.common import timeutils
+
 CONF = cfg.CONF
 
 
@@ -41,6 +49,59 @@ def validate_sort_dir(sort_dir):
     return sort_dir
 
 
+def encode_marker(item, sort_key):
+    """Return the pagination marker of the page following an item.
+
+    The marker is an opaque token holding the sort key and id values of
+    the item, so that the next page can be read with a single range
+    query rather than loading the item from the database first.
+
+    :param item: the last item of a page, an object or a dict.
+    :param sort_key: the attribute by which the page is sorted.
+    """
+    token = jsonutils.dumps([sort_key, item[sort_key], item['id']])
+    return base64.urlsafe_b64encode(token).rstrip('=')
+
+
+def decode_marker(marker, sort_key, obj_cls):
+    """Return the marker to pass to the DB API list methods.
+
+    :param marker: the marker query parameter, either a token made by
+                   encode_marker() or the UUID of the last item of the
+                   previous page.
+    :param sort_key: the attribute by which the page is sorted.
+    :param obj_cls: the class of the objects being listed, used to load
+                    the item a UUID marker refers to and to convert the
+                    sort key value of a token.
+    :returns: None, a dict of the sort key and id values, or an object.
+    """
+    if not marker:
+        return None
+    if utils.is_uuid_like(marker):
+        return obj_cls.get_by_uuid(pecan.request.context, marker)
+
+    try:
+        padded = str(marker) + '=' * (-len(marker) % 4)
+        key, value, item_id = jsonutils.loads(
+                                    base64.urlsafe_b64decode(padded))
+    except (TypeError, ValueError, UnicodeError):
+        raise wsme.exc.ClientSideError(_("Invalid marker: %s") % marker)
+    if key != sort_key:
+        raise wsme.exc.ClientSideError(_("The marker %(marker)s can not "
+                                         "be used with sort key "
+                                         "%(sort_key)s.") %
+                                       {'marker': marker,
+                                        'sort_key': sort_key})
+    if (value is not None and
+            obj_cls.fields.get(key) in (obj_utils.datetime_or_none,
+                                        obj_utils.datetime_or_str_or_none)):
+        try:
+            value = timeutils.parse_strtime(value)
+        except (TypeError, ValueError):
+            raise wsme.exc.ClientSideError(_("Invalid marker: %s") % marker)
+    return {key: value, 'id': item_id}
+
+
 def apply_jsonpatch(doc, patch):
     for p in patch:
         if p['op'] == 'add' and p['path'].count('/') == 1:
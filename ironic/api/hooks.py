@@ -16,11 +16,14 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import threading
+
 from oslo.config import cfg
 from pecan import hooks
 from webob import exc
 
 from ironic.common import context
+from ironic.common import hash_ring
 from ironic.conductor import rpcapi
 from ironic.db import api as dbapi
 from ironic.openstack.common import policy
@@ -88,10 +91,31 @@ class ContextHook(hooks.PecanHook):
 
 
 class RPCHook(hooks.PecanHook):
-    """Attach the rpcapi object to the request so controllers can get to it."""
+    """Attach the rpcapi object to the request so controllers can get to it.
+
+    A single ConductorAPI, and so a single RPC client and set of hash rings,
+    is shared by all the requests. It is created on the first request. The
+    hash rings are refreshed in the background once loaded, so requests do
+    not wait on the conductor list or on ring rebuilds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rpcapi = None
+        super(RPCHook, self).__init__()
+
+    def _get_rpcapi(self):
+        if self._rpcapi is None:
+            with self._lock:
+                if self._rpcapi is None:
+                    ring_manager = hash_ring.HashRingManager(
+                            background_refresh=True)
+                    self._rpcapi = rpcapi.ConductorAPI(
+                            ring_manager=ring_manager)
+        return self._rpcapi
 
     def before(self, state):
-        state.request.rpcapi = rpcapi.ConductorAPI()
+        state.request.rpcapi = self._get_rpcapi()
 
 
 class AdminAuthHook(hooks.PecanHook):
@@ -109,6 +133,23 @@ class AdminAuthHook(hooks.PecanHook):
             raise exc.HTTPForbidden()
 
 
+class StreamingHook(hooks.PecanHook):
+    """Send the response body a controller streams.
+
+    wsme renders the whole result of a controller at once. A controller
+    streaming its result instead, see Collection.stream(), sets
+    request.streamed_body to an iterable of body chunks, which replaces
+    the body wsme rendered.
+
+    """
+    def after(self, state):
+        chunks = getattr(state.request, 'streamed_body', None)
+        if chunks is None or not 200 <= state.response.status_int < 300:
+            return
+        state.response.app_iter = chunks
+        state.response.content_length = None
+
+
 class NoExceptionTracebackHook(hooks.PecanHook):
     """Workaround rpc.common: deserialize_remote_exception.
 
@@ -158,6 +158,11 @@ class ImageConvertFailed(IronicException):
     message = _("Image %(image_id)s is unacceptable: %(reason)s")
 
 
+class ImageDownloadFailed(IronicException):
+    message = _("Failed to download image %(image_href)s, reason: "
+                "%(reason)s")
+
+
 # Cannot be templated as the error syntax varies.
 # msg needs to be constructed when raised.
 class InvalidParameterValue(Invalid):
@@ -340,11 +345,21 @@ class ConfigNotFound(IronicException):
     message = _("Could not find config at %(path)s")
 
 
+class NodeUpdateConflict(Conflict):
+    message = _("Node %(node)s was modified by another process, please "
+                "reload it and retry.")
+
+
 class NodeLocked(Conflict):
     message = _("Node %(node)s is locked by host %(host)s, please retry "
                 "after the current operation is completed.")
 
 
+class NodeConstraintsNotMet(Conflict):
+    message = _("Node %(node)s could not be reserved because it does not "
+                "match the constraints %(filters)s.")
+
+
 class NodeNotLocked(Invalid):
     message = _("Node %(node)s found not to be locked on release")
 
@@ -355,6 +370,11 @@ class NoFreeConductorWorker(TemporaryFailure):
     code = 503  # Service Unavailable (temporary).
 
 
+class PowerStateSyncTimeout(IronicException):
+    message = _("Timed out after %(timeout)s seconds while getting the "
+                "power state of node %(node)s.")
+
+
 class VendorPassthruException(IronicException):
     pass
 
@@ -17,11 +17,16 @@ import array
 import hashlib
 import struct
 import threading
+import time
 
 from oslo.config import cfg
 
 from ironic.common import exception
 from ironic.db import api as dbapi
+from ironic.openstack.common.gettextutils import _LE
+from ironic.openstack.common import log
+
+LOG = log.getLogger(__name__)
 
 hash_opts = [
     cfg.IntOpt('hash_partition_exponent',
@@ -39,6 +44,11 @@ hash_opts = [
                     'conductor services to prepare deployment environments '
                     'and potentially allow the Ironic cluster to recover '
                     'more quickly if a conductor instance is terminated.'),
+    cfg.IntOpt('hash_ring_reset_interval',
+               default=60,
+               help='Interval (in seconds) between checks of whether the set '
+                    'of active conductors has changed. When it has, the '
+                    'hash rings of the affected drivers are rebuilt.'),
 ]
 
 CONF = cfg.CONF
@@ -65,11 +75,25 @@ class HashRing(object):
         except TypeError:
             raise exception.Invalid(
                     _("Invalid hosts supplied when building HashRing."))
+        if not self.hosts:
+            raise exception.Invalid(
+                    _("Invalid hosts supplied when building HashRing."))
 
         self.partition_shift = 32 - CONF.hash_partition_exponent
-        self.part2host = array.array('H')
-        for p in range(2 ** CONF.hash_partition_exponent):
-            self.part2host.append(p % len(hosts))
+
+        # Partition p is assigned to host p % len(hosts), so the table is
+        # one cycle of host ids repeated, rather than being built one
+        # entry at a time.
+        num_partitions = 2 ** CONF.hash_partition_exponent
+        cycle = array.array('H', range(len(self.hosts)))
+        self.part2host = cycle * (num_partitions // len(self.hosts))
+        self.part2host.extend(cycle[:num_partitions % len(self.hosts)])
+
+        self._host_ids = dict((h, i) for i, h in enumerate(self.hosts))
+        # Hosts for each partition, filled in on first use when no hosts
+        # are ignored. The ring never changes once built, so this is
+        # bounded by the number of partitions.
+        self._part2hosts = {}
 
     def _get_partition(self, data):
         try:
@@ -79,6 +103,52 @@ class HashRing(object):
             raise exception.Invalid(
                     _("Invalid data supplied to HashRing.get_hosts."))
 
+    def get_slice(self, data, slices):
+        """Get which of several equal slices of the ring data falls into.
+
+        The partitions are split into `slices` contiguous ranges. As
+        partitions are spread over the hosts in turn, every slice holds
+        about the same share of the data mapped to each host.
+
+        :param data: A string identifier to be mapped across the ring.
+        :param slices: the number of slices.
+        :returns: an integer between 0 and slices - 1.
+        """
+        return self._get_partition(data) * slices // len(self.part2host)
+
+    def _get_ignored_host_ids(self, ignore_hosts):
+        if not ignore_hosts:
+            return set()
+        return set(self._host_ids[h] for h in ignore_hosts
+                   if h in self._host_ids)
+
+    def _get_hosts_for_partition(self, partition, ignore_host_ids):
+        if not ignore_host_ids:
+            try:
+                return self._part2hosts[partition]
+            except KeyError:
+                pass
+
+        skip = set(ignore_host_ids)
+        host_ids = []
+        part = partition
+        num_partitions = len(self.part2host)
+        for replica in range(0, self.replicas):
+            if len(skip) == len(self.hosts):
+                # prevent infinite loop
+                break
+            while self.part2host[part] in skip:
+                part += 1
+                if part >= num_partitions:
+                    part = 0
+            host_ids.append(self.part2host[part])
+            skip.add(self.part2host[part])
+        hosts = tuple(self.hosts[h] for h in host_ids)
+
+        if not ignore_host_ids:
+            self._part2hosts[partition] = hosts
+        return hosts
+
     def get_hosts(self, data, ignore_hosts=None):
         """Get the list of hosts which the supplied data maps onto.
 
@@ -92,49 +162,120 @@ class HashRing(object):
                   this `HashRing` was created with. It may be less than this
                   if ignore_hosts is not None.
         """
-        host_ids = []
-        if ignore_hosts is None:
-            ignore_host_ids = []
-        else:
-            ignore_host_ids = [self.hosts.index(h)
-                               for h in ignore_hosts if h in self.hosts]
-
+        ignore_host_ids = self._get_ignored_host_ids(ignore_hosts)
         partition = self._get_partition(data)
-        for replica in range(0, self.replicas):
-            if len(host_ids + ignore_host_ids) == len(self.hosts):
-                # prevent infinite loop
-                break
-            while self.part2host[partition] in host_ids + ignore_host_ids:
-                partition += 1
-                if partition >= len(self.part2host):
-                    partition = 0
-            host_ids.append(self.part2host[partition])
-        return [self.hosts[h] for h in host_ids]
+        return list(self._get_hosts_for_partition(partition,
+                                                  ignore_host_ids))
+
+    def get_hosts_many(self, data_list, ignore_hosts=None):
+        """Get the hosts which each of several identifiers maps onto.
+
+        This is equivalent to calling get_hosts() for each item, but the
+        ignored hosts are only resolved once.
+
+        :param data_list: An iterable of string identifiers to be mapped
+                          across the ring.
+        :param ignore_hosts: A list of hosts to skip when performing the hash.
+                             Default: None.
+        :returns: a dict mapping each identifier to its list of hosts.
+        """
+        ignore_host_ids = self._get_ignored_host_ids(ignore_hosts)
+        result = {}
+        for data in data_list:
+            partition = self._get_partition(data)
+            result[data] = list(self._get_hosts_for_partition(
+                    partition, ignore_host_ids))
+        return result
 
 
 class HashRingManager(object):
-    def __init__(self):
+    def __init__(self, background_refresh=False):
+        """Create a manager of the hash rings of the active drivers.
+
+        :param background_refresh: once the rings are loaded, refresh them
+                                   in a separate thread when they are out of
+                                   date, and keep serving the current rings
+                                   meanwhile. By default, the caller which
+                                   finds them out of date refreshes them,
+                                   and other callers wait for it.
+        """
         self._lock = threading.Lock()
         self.dbapi = dbapi.get_instance()
         self.hash_rings = None
+        self._conductor_ids = None
+        self._last_checked = 0
+        self._background_refresh = background_refresh
 
-    def _load_hash_rings(self):
+    def _load_hash_rings(self, old_rings):
         rings = {}
         d2c = self.dbapi.get_active_driver_dict()
 
         for driver_name, hosts in d2c.iteritems():
-            rings[driver_name] = HashRing(hosts)
+            # Rings are expensive to build; keep those whose hosts have
+            # not changed.
+            ring = old_rings.get(driver_name)
+            if ring is None or set(ring.hosts) != set(hosts):
+                ring = HashRing(hosts)
+            rings[driver_name] = ring
         return rings
 
+    def _refresh(self):
+        # Must be called with self._lock held.
+        conductor_ids = self.dbapi.get_active_conductor_ids()
+        self._last_checked = time.time()
+        if (self.hash_rings is not None and
+                conductor_ids == self._conductor_ids):
+            return set()
+
+        old_rings = self.hash_rings or {}
+        rings = self._load_hash_rings(old_rings)
+        changed = set(name for name in set(old_rings) | set(rings)
+                      if old_rings.get(name) is not rings.get(name))
+        # Only swap the rings in once they have all been built, so
+        # readers never see a partial set.
+        self.hash_rings = rings
+        self._conductor_ids = conductor_ids
+        return changed
+
+    def _is_fresh(self):
+        return (self.hash_rings is not None and
+                time.time() - self._last_checked <
+                    CONF.hash_ring_reset_interval)
+
+    def _refresh_and_release(self):
+        # Runs in its own thread, with self._lock acquired by the caller.
+        try:
+            self._refresh()
+        except Exception:
+            LOG.exception(_LE('Failed to refresh the hash rings.'))
+        finally:
+            self._lock.release()
+
     def _ensure_rings_fresh(self):
         # Hot path, no lock
-        # TODO(russell_h): Consider adding time-based invalidation of rings
-        if self.hash_rings is not None:
+        if self._is_fresh():
+            return
+
+        if self._background_refresh and self.hash_rings is not None:
+            # Don't wait; if no refresh is running yet, start one.
+            if self._lock.acquire(False):
+                thread = threading.Thread(target=self._refresh_and_release)
+                thread.daemon = True
+                thread.start()
             return
 
         with self._lock:
-            if self.hash_rings is None:
-                self.hash_rings = self._load_hash_rings()
+            if not self._is_fresh():
+                self._refresh()
+
+    def refresh(self):
+        """Check now whether the conductor set changed, updating the rings.
+
+        :returns: the set of names of drivers whose ring was rebuilt,
+                  added or removed.
+        """
+        with self._lock:
+            return self._refresh()
 
     def get_hash_ring(self, driver_name):
         self._ensure_rings_fresh()
@@ -19,6 +19,7 @@
 Handling of VM disk images.
 """
 
+import hashlib
 import os
 import re
 
@@ -42,6 +43,82 @@ image_opts = [
 CONF = cfg.CONF
 CONF.register_opts(image_opts)
 
+# Signatures of non-raw formats qemu-img probes for, with their offset.
+_FORMAT_MAGIC = [
+    (0, b'QFI\xfb'),                    # qcow, qcow2
+    (0, b'QED\x00'),                    # qed
+    (0, b'KDMV'),                       # vmdk
+    (0, b'COWD'),                       # vmdk3
+    (0, b'# Disk DescriptorFile'),      # vmdk descriptor
+    (0, b'conectix'),                   # vpc
+    (0, b'vhdxfile'),                   # vhdx
+    (0, b'Bochs Virtual HD Image'),     # bochs
+    (0, b'#!/bin/sh\n#V2.0 Format\n'),  # cloop
+    (0, b'WithoutFreeSpace'),           # parallels
+    (0, b'WithouFreSpacExt'),           # parallels
+    (0, b'LUKS\xba\xbe'),               # luks
+    (0x40, b'\x7f\x10\xda\xbe'),         # vdi
+]
+
+# Boot signature ending the MBR of a whole disk image, including the
+# protective MBR of a GPT disk.
+_MBR_SIGNATURE_OFFSET = 510
+_MBR_SIGNATURE = b'\x55\xaa'
+
+_HEADER_SIZE = max([_MBR_SIGNATURE_OFFSET + len(_MBR_SIGNATURE)] +
+                   [offset + len(magic) for offset, magic in _FORMAT_MAGIC])
+
+
+def _is_raw_header(header):
+    """Whether an image's first bytes show it to be a raw disk image.
+
+    Only an image starting with a partition table, and with none of the
+    signatures above, is taken to be raw. qemu-img probes for more formats
+    than are listed here, so any other image must still be inspected by it.
+    """
+    if len(header) < _HEADER_SIZE:
+        return False
+    signature = header[_MBR_SIGNATURE_OFFSET:
+                       _MBR_SIGNATURE_OFFSET + len(_MBR_SIGNATURE)]
+    if signature != _MBR_SIGNATURE:
+        return False
+    return not any(header[offset:offset + len(magic)] == magic
+                   for offset, magic in _FORMAT_MAGIC)
+
+
+class _ImageWriter(object):
+    """File-like object which checksums and sniffs the image written to it.
+
+    The checksum and the header are computed from the chunks as they are
+    downloaded, so the image does not have to be read back from disk.
+    """
+
+    def __init__(self, image_file):
+        self._file = image_file
+        self._md5 = hashlib.md5()
+        self._header = b''
+        self.bytes_written = 0
+
+    def write(self, chunk):
+        if len(self._header) < _HEADER_SIZE:
+            self._header += chunk[:_HEADER_SIZE - len(self._header)]
+        self._md5.update(chunk)
+        self._file.write(chunk)
+        self.bytes_written += len(chunk)
+
+    def fileno(self):
+        # NOTE: the glance v2 service copies file:// locations with
+        # sendfile(), which bypasses write().
+        return self._file.fileno()
+
+    @property
+    def checksum(self):
+        return self._md5.hexdigest()
+
+    @property
+    def is_raw(self):
+        return _is_raw_header(self._header)
+
 
 class QemuImgInfo(object):
     BACKING_FILE_RE = re.compile((r"^(.*?)\s*\(actual\s+path\s*:"
@@ -175,6 +252,16 @@ def convert_image(source, dest, out_format, run_as_root=False):
 
 
 def fetch(context, image_href, path, image_service=None):
+    """Download an image to a file.
+
+    The image is checksummed while it is written, and the checksum is
+    verified against the one Glance recorded for the image.
+
+    :returns: True if the image is known to be a raw disk image, False if
+              it may be in another format and must be inspected with
+              qemu-img.
+    :raises: ImageDownloadFailed if the checksum does not match.
+    """
     # TODO(vish): Improve context handling and add owner and auth data
     #             when it is added to glance.  Right now there is no
     #             auth checking in glance, so we assume that access was
@@ -184,12 +271,29 @@ def fetch(context, image_href, path, image_service=None):
 
     with fileutils.remove_path_on_error(path):
         with open(path, "wb") as image_file:
-            image_service.download(image_href, image_file)
+            writer = _ImageWriter(image_file)
+            image_service.download(image_href, writer)
+
+        if not writer.bytes_written:
+            # Copied without going through the writer.
+            return False
+
+        expected = image_service.show(image_href).get('checksum')
+        if expected and expected != writer.checksum:
+            raise exception.ImageDownloadFailed(image_href=image_href,
+                reason=_("checksum %(actual)s does not match the expected "
+                         "%(expected)s") % {'actual': writer.checksum,
+                                            'expected': expected})
+        return writer.is_raw
 
 
 def fetch_to_raw(context, image_href, path, image_service=None):
     path_tmp = "%s.part" % path
-    fetch(context, image_href, path_tmp, image_service)
+    if fetch(context, image_href, path_tmp, image_service):
+        # A raw disk image has no backing file and needs no conversion,
+        # so there is no need to read it again with qemu-img.
+        os.rename(path_tmp, path)
+        return
     image_to_raw(image_href, path, path_tmp)
 
 
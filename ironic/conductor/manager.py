@@ -42,10 +42,15 @@ a change, etc.
 """
 
 import collections
+import heapq
+import itertools
 import threading
+import time
 
 import eventlet
+from eventlet import event
 from eventlet import greenpool
+from eventlet import semaphore
 
 from oslo.config import cfg
 from oslo import messaging
@@ -55,18 +60,27 @@ from ironic.common import exception
 from ironic.common import hash_ring as hash
 from ironic.common import neutron
 from ironic.common import states
+from ironic.conductor import periodic
 from ironic.conductor import task_manager
 from ironic.conductor import utils
 from ironic.db import api as dbapi
-from ironic import objects
 from ironic.openstack.common import excutils
 from ironic.openstack.common.gettextutils import _LI
-from ironic.openstack.common import lockutils
+from ironic.openstack.common.gettextutils import _LW
 from ironic.openstack.common import log
 from ironic.openstack.common import periodic_task
 
 MANAGER_TOPIC = 'ironic.conductor_manager'
-WORKER_SPAWN_lOCK = "conductor_worker_spawn"
+
+# Priorities of the work waiting for a free worker; lower values are
+# started first.
+WORKER_PRIORITY_RPC = 0
+WORKER_PRIORITY_PERIODIC = 1
+
+# Constraints a node must meet, when it is reserved, to have its power
+# state synced.
+SYNC_POWER_STATE_FILTERS = {'maintenance': False,
+                            'provision_state_not_in': [states.DEPLOYWAIT]}
 
 LOG = log.getLogger(__name__)
 
@@ -106,6 +120,27 @@ conductor_opts = [
                         'number of times Ironic should try syncing the '
                         'hardware node power state with the node power state '
                         'in DB'),
+        cfg.IntOpt('sync_power_state_workers',
+                   default=8,
+                   help='Maximum number of nodes whose power state is '
+                        'synced concurrently by the sync_power_state '
+                        'periodic task. Workers are taken from the '
+                        'conductor worker pool.'),
+        cfg.IntOpt('sync_power_state_slices',
+                   default=1,
+                   help='Number of slices the nodes mapped to a conductor '
+                        'are split into when syncing power state. The '
+                        'slices are synced in turn, one every '
+                        'sync_power_state_interval / '
+                        'sync_power_state_slices '
+                        'seconds, so that each node is still synced once per '
+                        'interval but the requests to the BMCs are spread '
+                        'evenly over it. 1 - sync all nodes at once.'),
+        cfg.IntOpt('sync_power_state_timeout',
+                   default=60,
+                   help='Timeout (seconds) for getting the power state of a '
+                        'single node during sync_power_state. A timeout '
+                        'counts as a failed sync attempt. 0 - unlimited.'),
         cfg.IntOpt('periodic_max_workers',
                    default=8,
                    help='Maximum number of worker threads that can be started '
@@ -114,6 +149,18 @@ conductor_opts = [
         cfg.IntOpt('workers_pool_size',
                    default=100,
                    help='The size of the workers greenthread pool.'),
+        cfg.IntOpt('workers_queue_size',
+                   default=100,
+                   help='Maximum number of tasks which wait for a free '
+                        'worker when the workers greenthread pool is full. '
+                        'Tasks of RPC requests are started before those of '
+                        'periodic tasks. Once the queue is full, requests '
+                        'fail with NoFreeConductorWorker. 0 - do not queue.'),
+        cfg.IntOpt('bulk_power_max_workers',
+                   default=8,
+                   help='Maximum number of nodes of a single bulk power '
+                        'request whose power state is changed at the same '
+                        'time.'),
 ]
 
 CONF = cfg.CONF
@@ -124,7 +171,7 @@ class ConductorManager(periodic_task.PeriodicTasks):
     """Ironic Conductor manager main class."""
 
     # NOTE(rloo): This must be in sync with rpcapi.ConductorAPI's.
-    RPC_API_VERSION = '1.15'
+    RPC_API_VERSION = '1.16'
 
     target = messaging.Target(version=RPC_API_VERSION)
 
@@ -134,6 +181,24 @@ class ConductorManager(periodic_task.PeriodicTasks):
         self.host = host
         self.topic = topic
         self.power_state_sync_count = collections.defaultdict(int)
+        self._power_sync_slice = 0
+
+        self._worker_queue = []
+        """Heap of the tasks waiting for a free worker."""
+
+        self._worker_queue_seq = itertools.count()
+        self._worker_slots_promised = set()
+        """Turns of the queued tasks which were given a free worker."""
+
+        self.worker_queue_stats = {'queued': 0, 'rejected': 0,
+                                   'max_depth': 0, 'total_wait': 0.0,
+                                   'max_wait': 0.0}
+        """Counters of the tasks which had to wait for a free worker."""
+
+        self._worker_queue_stats_logged = (0, 0)
+
+        self._periodic_scheduler = None
+        """Scheduler running each periodic task on its own greenthread."""
 
     def init_host(self):
         self.dbapi = dbapi.get_instance()
@@ -142,6 +207,19 @@ class ConductorManager(periodic_task.PeriodicTasks):
         self.drivers = self.driver_factory.names
         """List of driver names which this conductor supports."""
 
+        self.ring_manager = hash.HashRingManager()
+        """Consistent hash ring which maps drivers to conductors."""
+
+        # Rebalance against the rings as they were before this conductor
+        # registered, so a restart only takes over the nodes that other
+        # conductors managed meanwhile, not every node mapped here.
+        self.ring_manager.refresh()
+        self._rebalanced_rings = dict(self.ring_manager.hash_rings)
+        """Hash rings as of the last rebalance_node_ring, by driver name."""
+
+        self._take_over_retries = {}
+        """Uuids of the nodes to take over again, by driver name."""
+
         try:
             self.dbapi.register_conductor({'hostname': self.host,
                                            'drivers': self.drivers})
@@ -153,8 +231,8 @@ class ConductorManager(periodic_task.PeriodicTasks):
             self.dbapi.register_conductor({'hostname': self.host,
                                            'drivers': self.drivers})
 
-        self.ring_manager = hash.HashRingManager()
-        """Consistent hash ring which maps drivers to conductors."""
+        # Now map nodes to this conductor as well.
+        self.ring_manager.refresh()
 
         self._worker_pool = greenpool.GreenPool(
                                 size=CONF.conductor.workers_pool_size)
@@ -174,6 +252,8 @@ class ConductorManager(periodic_task.PeriodicTasks):
 
     def del_host(self):
         self._keepalive_evt.set()
+        if self._periodic_scheduler:
+            self._periodic_scheduler.stop()
         try:
             self.dbapi.unregister_conductor(self.host)
             LOG.info(_LI('Successfully stopped conductor with hostname '
@@ -183,8 +263,18 @@ class ConductorManager(periodic_task.PeriodicTasks):
             pass
 
     def periodic_tasks(self, context, raise_on_error=False):
-        """Periodic tasks are run at pre-specified interval."""
-        return self.run_periodic_tasks(context, raise_on_error=raise_on_error)
+        """Start running the periodic tasks, if not already started.
+
+        Each periodic task runs on its own greenthread and schedule, so
+        a long power state sync does not hold back the other tasks.
+
+        :returns: seconds until this needs to be called again.
+        """
+        if self._periodic_scheduler is None:
+            self._periodic_scheduler = periodic.PeriodicTaskScheduler(
+                    self, context)
+        self._periodic_scheduler.start()
+        return periodic_task.DEFAULT_INTERVAL
 
     @messaging.expected_exceptions(exception.InvalidParameterValue,
                                    exception.NodeLocked,
@@ -254,9 +344,78 @@ class ConductorManager(periodic_task.PeriodicTasks):
 
         with task_manager.acquire(context, node_id, shared=False) as task:
             task.driver.power.validate(task)
+            task.defer_node_saves()
             task.spawn_after(self._spawn_worker, utils.node_power_action,
                              task, new_state)
 
+    @messaging.expected_exceptions(exception.NoFreeConductorWorker)
+    def change_nodes_power_state(self, context, node_ids, new_state):
+        """RPC method to change the power state of several nodes.
+
+        All the nodes which are not locked are reserved with a single DB
+        call and their power interface is validated synchronously. The power
+        actions are then performed by a single background task, at most
+        CONF.conductor.bulk_power_max_workers nodes at a time.
+
+        :param context: an admin context.
+        :param node_ids: a list of node uuids.
+        :param new_state: the desired power state of the nodes.
+        :returns: a dict with the uuids of the nodes whose power action was
+                  started under 'accepted', and a dict mapping the uuids of
+                  the other nodes to the reason under 'failed'.
+        :raises: NoFreeConductorWorker when there is no free worker to start
+                 async task.
+
+        """
+        LOG.debug("RPC change_nodes_power_state called for %(count)d nodes. "
+                  "The desired new state is %(state)s."
+                  % {'count': len(node_ids), 'state': new_state})
+
+        accepted = []
+        failed = {}
+        with task_manager.acquire_batch(context, node_ids) as tasks:
+            for task in list(tasks):
+                try:
+                    task.driver.power.validate(task)
+                except exception.InvalidParameterValue as e:
+                    failed[task.node.uuid] = str(e)
+                    tasks.release(task)
+                else:
+                    accepted.append(task.node.uuid)
+            if accepted:
+                tasks.spawn_after(self._spawn_worker,
+                                  self._do_change_nodes_power_state,
+                                  list(tasks), new_state)
+
+        for node_id in node_ids:
+            if node_id not in accepted and node_id not in failed:
+                failed[node_id] = _('Node is locked by another process or '
+                                    'does not exist.')
+        return {'accepted': accepted, 'failed': failed}
+
+    def _do_change_nodes_power_state(self, tasks, new_state):
+        """Perform the power actions of a bulk power request."""
+        # NOTE: the power actions run on a pool of this worker's own, as
+        # conductor workers spawned from a worker could be queued behind
+        # the very tasks which are waiting for them.
+        pool = greenpool.GreenPool(CONF.conductor.bulk_power_max_workers)
+        for task in tasks:
+            pool.spawn_n(self._do_bulk_power_action, task, new_state)
+        pool.waitall()
+
+    def _do_bulk_power_action(self, task, new_state):
+        node_uuid = task.node.uuid
+        try:
+            task.defer_node_saves()
+            utils.node_power_action(task, new_state)
+        except Exception as e:
+            # node_power_action has recorded the error in node.last_error
+            LOG.warning(_LW('Bulk power action %(state)s failed on node '
+                            '%(node)s: %(err)s'),
+                        {'state': new_state, 'node': node_uuid, 'err': e})
+        finally:
+            task.release_resources()
+
     @messaging.expected_exceptions(exception.NoFreeConductorWorker,
                                    exception.NodeLocked,
                                    exception.InvalidParameterValue,
@@ -499,8 +658,27 @@ class ConductorManager(periodic_task.PeriodicTasks):
     def _conductor_service_record_keepalive(self):
         while not self._keepalive_evt.is_set():
             self.dbapi.touch_conductor(self.host)
+            self._log_worker_queue_stats()
             self._keepalive_evt.wait(CONF.conductor.heartbeat_interval)
 
+    def _log_worker_queue_stats(self):
+        """Log the worker queue counters if they changed since last time.
+
+        Nothing is logged while every task gets a free worker right away.
+        """
+        stats = self.worker_queue_stats
+        counts = (stats['queued'], stats['rejected'])
+        if counts == self._worker_queue_stats_logged:
+            return
+        self._worker_queue_stats_logged = counts
+        LOG.info(_LI('%(depth)d tasks are waiting for a free conductor '
+                     'worker. So far %(queued)d tasks were queued, at most '
+                     '%(max_depth)d at once, and %(rejected)d were '
+                     'rejected. Queued tasks waited %(total_wait).1f '
+                     'seconds in total, and at most %(max_wait).1f '
+                     'seconds.'),
+                 dict(stats, depth=len(self._worker_queue)))
+
     def _handle_sync_power_state_max_retries_exceeded(self, task,
                                                       actual_power_state):
         node = task.node
@@ -529,8 +707,11 @@ class ConductorManager(periodic_task.PeriodicTasks):
             except exception.InvalidParameterValue:
                 return
 
+        timeout = CONF.conductor.sync_power_state_timeout or None
         try:
-            power_state = task.driver.power.get_power_state(task)
+            with eventlet.Timeout(timeout, exception.PowerStateSyncTimeout(
+                    node=node.uuid, timeout=timeout)):
+                power_state = task.driver.power.get_power_state(task)
         except Exception as e:
             # TODO(rloo): change to IronicException, after
             #             https://bugs.launchpad.net/ironic/+bug/1267693
@@ -601,7 +782,8 @@ class ConductorManager(periodic_task.PeriodicTasks):
             self.power_state_sync_count[node.uuid] += 1
 
     @periodic_task.periodic_task(
-            spacing=CONF.conductor.sync_power_state_interval)
+            spacing=(CONF.conductor.sync_power_state_interval /
+                     float(max(1, CONF.conductor.sync_power_state_slices))))
     def _sync_power_states(self, context):
         """Periodic task to sync power states for the nodes.
 
@@ -612,6 +794,8 @@ class ConductorManager(periodic_task.PeriodicTasks):
         2) Node is not in maintenance mode.
         3) Node is not in DEPLOYWAIT provision state.
         4) Node doesn't have a reservation
+        5) Node is in the slice due on this run, when the nodes are
+           split into sync_power_state_slices slices.
 
         NOTE: Grabbing a lock here can cause other methods to fail to
         grab it. We want to avoid trying to grab a lock while a
@@ -620,46 +804,114 @@ class ConductorManager(periodic_task.PeriodicTasks):
         here to avoid failing a brand new deploy to a node that we've
         locked here, though.
         """
-        # FIXME(comstud): Since our initial state checks are outside
-        # of the lock (to try to avoid the lock), some checks are
-        # repeated after grabbing the lock so we can unlock quickly.
-        # The node mapping is not re-checked because it doesn't much
-        # matter if things happened to re-balance.
-        #
-        # This is inefficient and racey. We end up with calling DB API's
-        # get_node() twice (once here, and once in acquire(). Ideally we
-        # add a way to pass constraints to task_manager.acquire()
-        # (through to its DB API call) so that we can eliminate our call
-        # and first set of checks below.
-
+        # The maintenance and provision_state checks are passed to
+        # task_manager.acquire() so they are applied atomically when the
+        # reservation is taken. The node mapping is not re-checked because
+        # it doesn't much matter if things happened to re-balance.
         filters = {'reserved': False, 'maintenance': False}
         columns = ['id', 'uuid', 'driver']
         node_list = self.dbapi.get_nodeinfo_list(columns=columns,
                                                  filters=filters)
+
+        # Nodes are synced concurrently on the worker pool; the semaphore
+        # caps the number of BMCs being polled at once so that a single
+        # pass can not exhaust the pool.
+        sem = semaphore.Semaphore(CONF.conductor.sync_power_state_workers)
+        threads = []
+        start = time.time()
+        synced = 0
+
+        # Runs happen at fixed times, one spacing apart, so taking the
+        # slices in turn syncs each node at the same offset in every
+        # interval.
+        slices = max(1, CONF.conductor.sync_power_state_slices)
+        spacing = (self._periodic_spacing['_sync_power_states'] or
+                   periodic_task.DEFAULT_INTERVAL)
+        current_slice = self._power_sync_slice % slices
+        self._power_sync_slice = current_slice + 1
+
         for (node_id, node_uuid, driver) in node_list:
             try:
                 if not self._mapped_to_this_conductor(node_uuid, driver):
                     continue
-                node = objects.Node.get_by_id(context, node_id)
-                if (node.provision_state == states.DEPLOYWAIT or
-                        node.maintenance or node.reservation is not None):
-                    continue
-                with task_manager.acquire(context, node_id) as task:
-                    if (task.node.provision_state != states.DEPLOYWAIT and
-                            not task.node.maintenance):
-                        self._do_sync_power_state(task)
-            except exception.NodeNotFound:
-                LOG.info(_("During sync_power_state, node %(node)s was not "
-                           "found and presumed deleted by another process.") %
-                           {'node': node_uuid})
-            except exception.NodeLocked:
-                LOG.info(_("During sync_power_state, node %(node)s was "
-                           "already locked by another process. Skip.") %
-                           {'node': node_uuid})
+                if slices > 1:
+                    ring = self.ring_manager.get_hash_ring(driver)
+                    if ring.get_slice(node_uuid, slices) != current_slice:
+                        continue
+                synced += 1
+                sem.acquire()
+                try:
+                    threads.append(self._spawn_periodic_worker(
+                            self._sync_power_state_for_node, context,
+                            node_id, node_uuid, sem))
+                except exception.NoFreeConductorWorker:
+                    # Pool is busy; do the work in this greenthread
+                    # rather than skipping the node for a whole interval.
+                    self._sync_power_state_for_node(context, node_id,
+                                                    node_uuid, sem)
             finally:
                 # Yield on every iteration
                 eventlet.sleep(0)
 
+        self._wait_for_workers(threads, 'sync_power_state')
+
+        elapsed = time.time() - start
+        LOG.debug("sync_power_state pass checked %(count)d nodes in "
+                  "%(elapsed).2f seconds.",
+                  {'count': synced, 'elapsed': elapsed})
+        if elapsed > spacing:
+            LOG.warning(_("sync_power_state pass for %(count)d nodes took "
+                          "%(elapsed).2f seconds, which is longer than "
+                          "the %(spacing).2f seconds between passes. "
+                          "Consider increasing sync_power_state_workers."),
+                        {'count': synced, 'elapsed': elapsed,
+                         'spacing': spacing})
+
+    def _wait_for_workers(self, threads, task_name):
+        """Wait for all of the workers started by a task.
+
+        An exception raised by one worker is logged so that the remaining
+        workers are still waited for.
+
+        :param threads: the GreenThreads to wait for.
+        :param task_name: the name of the task, used for logging.
+        """
+        for thread in threads:
+            try:
+                thread.wait()
+            except Exception:
+                LOG.exception(_("A worker of %(task)s failed."),
+                              {'task': task_name})
+
+    def _sync_power_state_for_node(self, context, node_id, node_uuid, sem):
+        """Lock a single node and sync its power state.
+
+        :param context: an admin context.
+        :param node_id: the id of the node.
+        :param node_uuid: the uuid of the node, used for logging.
+        :param sem: semaphore to release once the node has been handled.
+        """
+        try:
+            with task_manager.acquire(
+                    context, node_id,
+                    filters=SYNC_POWER_STATE_FILTERS) as task:
+                task.defer_node_saves()
+                self._do_sync_power_state(task)
+        except exception.NodeConstraintsNotMet:
+            # The node entered maintenance or DEPLOYWAIT after it was
+            # listed; leave it alone.
+            pass
+        except exception.NodeNotFound:
+            LOG.info(_("During sync_power_state, node %(node)s was not "
+                       "found and presumed deleted by another process.") %
+                       {'node': node_uuid})
+        except exception.NodeLocked:
+            LOG.info(_("During sync_power_state, node %(node)s was "
+                       "already locked by another process. Skip.") %
+                       {'node': node_uuid})
+        finally:
+            sem.release()
+
     @periodic_task.periodic_task(
             spacing=CONF.conductor.check_provision_state_interval)
     def _check_deploy_timeouts(self, context):
@@ -678,39 +930,149 @@ class ConductorManager(periodic_task.PeriodicTasks):
                                     sort_key='provision_updated_at',
                                     sort_dir='asc')
 
-        workers_count = 0
-        for node_uuid, driver in node_list:
-            if not self._mapped_to_this_conductor(node_uuid, driver):
+        node_uuids = [node_uuid for node_uuid, driver in node_list
+                      if self._mapped_to_this_conductor(node_uuid, driver)]
+        if not node_uuids:
+            return
+
+        # Lock up to periodic_max_workers nodes with a single DB call. The
+        # filters are applied again when reserving, so nodes which were
+        # taken out of DEPLOYWAIT or put in maintenance since they were
+        # listed are skipped.
+        lock_filters = {'provision_state': states.DEPLOYWAIT,
+                        'maintenance': False,
+                        'provisioned_before': callback_timeout}
+        try:
+            with task_manager.acquire_batch(
+                    context, node_uuids,
+                    limit=CONF.conductor.periodic_max_workers,
+                    filters=lock_filters) as tasks:
+                for task in tasks:
+                    task.spawn_after(self._spawn_periodic_worker,
+                                     utils.cleanup_after_timeout, task)
+        except exception.NoFreeConductorWorker:
+            pass
+
+    @periodic_task.periodic_task(spacing=CONF.hash_ring_reset_interval)
+    def _check_hash_ring(self, context):
+        self.rebalance_node_ring(context)
+
+    def rebalance_node_ring(self, context):
+        """Perform any actions necessary when rebalancing the consistent hash.
+
+        Rebuild the hash rings of any drivers whose set of conductors has
+        changed, then compare each new ring with the one this conductor last
+        rebalanced against and call driver.deploy.prepare and
+        driver.deploy.take_over for only those nodes which are now mapped
+        to this conductor but were not before.
+
+        :param context: an admin context.
+        """
+        changed = self.ring_manager.refresh()
+        if changed:
+            LOG.info(_LI('The set of active conductors changed, rebuilt the '
+                         'hash ring for drivers: %(drivers)s.'),
+                     {'drivers': ', '.join(sorted(changed))})
+
+        rings = self.ring_manager.hash_rings
+        for driver_name in self.drivers:
+            new_ring = rings.get(driver_name)
+            old_ring = self._rebalanced_rings.get(driver_name)
+            if new_ring is None:
+                self._rebalanced_rings.pop(driver_name, None)
+                self._take_over_retries.pop(driver_name, None)
+                continue
+            retry = self._take_over_retries.get(driver_name, set())
+            if new_ring is old_ring and not retry:
                 continue
+            # The new ring is remembered even if some nodes could not be
+            # taken over; only those nodes are retried on the next pass.
+            failed = self._take_over_moved_nodes(context, driver_name,
+                                                 old_ring, new_ring, retry)
+            self._rebalanced_rings[driver_name] = new_ring
+            if failed:
+                self._take_over_retries[driver_name] = failed
+            else:
+                self._take_over_retries.pop(driver_name, None)
+
+    def _take_over_moved_nodes(self, context, driver_name, old_ring,
+                               new_ring, retry):
+        """Take over the nodes which moved to this conductor.
+
+        :param context: an admin context.
+        :param driver_name: the name of the driver whose ring changed.
+        :param old_ring: the HashRing this conductor last rebalanced against,
+                         or None if there was none.
+        :param new_ring: the current HashRing for the driver.
+        :param retry: uuids of nodes which failed to be taken over before,
+                      to take over again if they are still mapped here.
+        :returns: the set of uuids of the nodes which were not taken over.
+        """
+        filters = {'driver': driver_name, 'associated': True}
+        columns = ['id', 'uuid']
+        node_list = self.dbapi.get_nodeinfo_list(columns=columns,
+                                                 filters=filters)
+        node_uuids = [node_uuid for node_id, node_uuid in node_list]
+        new_hosts = new_ring.get_hosts_many(node_uuids)
+        old_hosts = old_ring.get_hosts_many(node_uuids) if old_ring else {}
+        moved = [(node_id, node_uuid) for node_id, node_uuid in node_list
+                 if new_hosts[node_uuid][:1] == [self.host] and
+                    (node_uuid in retry or
+                     old_hosts.get(node_uuid, [])[:1] != [self.host])]
+        if not moved:
+            return set()
+
+        LOG.info(_LI('Taking over %(count)d of %(total)d nodes with driver '
+                     '%(driver)s after the hash ring changed.'),
+                 {'count': len(moved), 'total': len(node_list),
+                  'driver': driver_name})
+
+        sem = semaphore.Semaphore(CONF.conductor.periodic_max_workers)
+        threads = []
+        failed = []
+        for (node_id, node_uuid) in moved:
+            sem.acquire()
             try:
-                with task_manager.acquire(context, node_uuid) as task:
-                    # NOTE(comstud): Recheck maintenance and provision_state
-                    # now that we have the lock. We don't need to re-check
-                    # updated_at unless we expect the state to have flipped
-                    # to something else and then back to DEPLOYWAIT between
-                    # the call to get_nodeinfo_list and now.
-                    if (task.node.maintenance or
-                            task.node.provision_state != states.DEPLOYWAIT):
-                        continue
-                    task.spawn_after(self._spawn_worker,
-                                     utils.cleanup_after_timeout, task)
+                threads.append(self._spawn_periodic_worker(
+                        self._take_over_node, context, node_id, node_uuid,
+                        sem, failed))
             except exception.NoFreeConductorWorker:
-                break
-            except (exception.NodeLocked, exception.NodeNotFound):
-                continue
-            workers_count += 1
-            if workers_count == CONF.conductor.periodic_max_workers:
-                break
+                self._take_over_node(context, node_id, node_uuid, sem,
+                                     failed)
 
-    def rebalance_node_ring(self):
-        """Perform any actions necessary when rebalancing the consistent hash.
+        self._wait_for_workers(threads, 'rebalance_node_ring')
 
-        This may trigger several actions, such as calling driver.deploy.prepare
-        for nodes which are now mapped to this conductor.
+        return set(failed)
 
+    def _take_over_node(self, context, node_id, node_uuid, sem, failed):
+        """Lock a single node and take over its management.
+
+        :param context: an admin context.
+        :param node_id: the id of the node.
+        :param node_uuid: the uuid of the node, used for logging.
+        :param sem: semaphore to release once the node has been handled.
+        :param failed: list to which node_uuid is appended if the node
+                       could not be taken over.
         """
-        # TODO(deva): implement this
-        pass
+        try:
+            with task_manager.acquire(context, node_id) as task:
+                task.driver.deploy.prepare(task)
+                task.driver.deploy.take_over(task)
+        except exception.NodeNotFound:
+            LOG.info(_("During rebalance_node_ring, node %(node)s was not "
+                       "found and presumed deleted by another process."),
+                     {'node': node_uuid})
+        except exception.NodeLocked:
+            LOG.info(_("During rebalance_node_ring, node %(node)s was "
+                       "already locked by another process. It will be "
+                       "retried on the next pass."), {'node': node_uuid})
+            failed.append(node_uuid)
+        except Exception:
+            LOG.exception(_("Failed to take over node %(node)s. It will be "
+                            "retried on the next pass."), {'node': node_uuid})
+            failed.append(node_uuid)
+        finally:
+            sem.release()
 
     def _mapped_to_this_conductor(self, node_uuid, driver):
         """Check that node is mapped to this conductor.
@@ -790,23 +1152,88 @@ class ConductorManager(periodic_task.PeriodicTasks):
 
             return node
 
-    @lockutils.synchronized(WORKER_SPAWN_lOCK, 'ironic-')
     def _spawn_worker(self, func, *args, **kwargs):
 
         """Create a greenthread to run func(*args, **kwargs).
 
-        Spawns a greenthread if there are free slots in pool, otherwise raises
-        exception. Execution control returns immediately to the caller.
+        Spawns a greenthread if there are free slots in pool, otherwise
+        queues the work until a worker finishes, ahead of any queued
+        periodic work. Execution control returns immediately to the caller.
 
         :returns: GreenThread object.
-        :raises: NoFreeConductorWorker if worker pool is currently full.
+        :raises: NoFreeConductorWorker if worker pool and queue are full.
 
         """
-        if self._worker_pool.free():
-            return self._worker_pool.spawn(func, *args, **kwargs)
-        else:
+        return self._spawn_worker_with_priority(WORKER_PRIORITY_RPC,
+                                                func, *args, **kwargs)
+
+    def _spawn_periodic_worker(self, func, *args, **kwargs):
+        """Like _spawn_worker, but queued behind the work of RPC requests."""
+        return self._spawn_worker_with_priority(WORKER_PRIORITY_PERIODIC,
+                                                func, *args, **kwargs)
+
+    def _spawn_worker_with_priority(self, priority, func, *args, **kwargs):
+        # NOTE: nothing below yields to another greenthread, so checking
+        # for a free slot and taking it needs no lock.
+        if (not self._worker_queue and
+                self._worker_pool.free() > len(self._worker_slots_promised)):
+            thread = self._worker_pool.spawn(func, *args, **kwargs)
+            thread.link(self._dispatch_queued_workers)
+            return thread
+
+        stats = self.worker_queue_stats
+        if len(self._worker_queue) >= CONF.conductor.workers_queue_size:
+            stats['rejected'] += 1
             raise exception.NoFreeConductorWorker()
 
+        turn = event.Event()
+        thread = eventlet.spawn(self._run_queued_worker, turn,
+                                func, args, kwargs)
+        thread.link(self._release_worker_slot, turn)
+        heapq.heappush(self._worker_queue,
+                       [priority, next(self._worker_queue_seq), time.time(),
+                        turn, thread])
+        stats['queued'] += 1
+        stats['max_depth'] = max(stats['max_depth'], len(self._worker_queue))
+        return thread
+
+    def _run_queued_worker(self, turn, func, args, kwargs):
+        """Wait until a worker is free, then run func on it."""
+        turn.wait()
+        thread = self._worker_pool.spawn(func, *args, **kwargs)
+        self._worker_slots_promised.discard(turn)
+        thread.link(self._dispatch_queued_workers)
+        return thread.wait()
+
+    def _release_worker_slot(self, waiter, turn):
+        """Thread.link() callback of the greenthread of a queued task.
+
+        If the greenthread was killed or failed after it was given a
+        worker but before it spawned one, the worker is handed to the
+        next queued task instead.
+        """
+        if turn in self._worker_slots_promised:
+            self._worker_slots_promised.discard(turn)
+            self._dispatch_queued_workers(waiter)
+
+    def _dispatch_queued_workers(self, finished_thread):
+        """Thread.link() callback handing free workers to queued tasks."""
+        stats = self.worker_queue_stats
+        while (self._worker_queue and
+               self._worker_pool.free() > len(self._worker_slots_promised)):
+            priority, seq, queued_at, turn, waiter = heapq.heappop(
+                    self._worker_queue)
+            if waiter.dead:
+                continue
+            self._worker_slots_promised.add(turn)
+            waited = time.time() - queued_at
+            stats['total_wait'] += waited
+            stats['max_wait'] = max(stats['max_wait'], waited)
+            LOG.debug('Task waited %(wait).2f seconds for a free worker; '
+                      '%(depth)d tasks are still queued.',
+                      {'wait': waited, 'depth': len(self._worker_queue)})
+            turn.send()
+
     @messaging.expected_exceptions(exception.NodeLocked,
                                    exception.NodeAssociated,
                                    exception.NodeInWrongPowerState)
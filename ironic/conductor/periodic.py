@@ -0,0 +1,131 @@
+# coding=utf-8
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Scheduler running each periodic task of a manager on its own greenthread.
+
+openstack.common.periodic_task runs all the periodic tasks of a manager one
+after the other, so a slow task delays every task behind it. Here each task
+decorated with @periodic_task.periodic_task gets its own greenthread and
+runs at fixed points in time: start + N * spacing, whatever the previous
+runs took. A run is never started while the previous run of the same task
+is still going; the runs which were due meanwhile are skipped and counted
+as overruns.
+"""
+
+import time
+
+import eventlet
+
+from ironic.openstack.common.gettextutils import _LE
+from ironic.openstack.common.gettextutils import _LW
+from ironic.openstack.common import log
+from ironic.openstack.common import periodic_task
+
+LOG = log.getLogger(__name__)
+
+# Upper bounds, in seconds, of the buckets of the task duration histograms.
+DURATION_BUCKETS = (1, 5, 10, 30, 60, 300, 600, float('inf'))
+
+
+def _now():
+    """Return the scheduler's current time, in seconds."""
+    return time.time()
+
+
+class PeriodicTaskScheduler(object):
+    """Runs the periodic tasks of a PeriodicTasks object independently."""
+
+    def __init__(self, manager, context):
+        """Create a scheduler for the periodic tasks of a manager.
+
+        :param manager: a PeriodicTasks instance.
+        :param context: request context passed to each task.
+        """
+        self._manager = manager
+        self._context = context
+        self._threads = {}
+
+        self.stats = {}
+        """Per task counters and duration histogram, by task name."""
+
+    @property
+    def running(self):
+        return bool(self._threads)
+
+    def start(self):
+        """Spawn one greenthread per enabled periodic task."""
+        if self.running:
+            return
+        now = _now()
+        for name, task in self._manager._periodic_tasks:
+            spacing = (self._manager._periodic_spacing[name] or
+                       periodic_task.DEFAULT_INTERVAL)
+            first_run = now if task._periodic_immediate else now + spacing
+            self.stats[name] = {'runs': 0, 'failures': 0, 'overruns': 0,
+                                'skipped': 0, 'last_duration': None,
+                                'histogram': dict.fromkeys(DURATION_BUCKETS,
+                                                           0)}
+            self._threads[name] = eventlet.spawn(self._run_task, name, task,
+                                                 spacing, first_run)
+
+    def stop(self):
+        """Kill the greenthreads of all the periodic tasks."""
+        threads, self._threads = self._threads, {}
+        for thread in threads.values():
+            thread.kill()
+
+    def _run_task(self, name, task, spacing, next_run):
+        while True:
+            delay = next_run - _now()
+            if delay > 0:
+                eventlet.sleep(delay)
+            next_run = self._run_once(name, task, spacing, next_run)
+
+    def _run_once(self, name, task, spacing, scheduled):
+        """Run a task once and return the time of its next run."""
+        full_task_name = '.'.join([self._manager.__class__.__name__, name])
+        stats = self.stats[name]
+
+        LOG.debug("Running periodic task %(task)s",
+                  {'task': full_task_name})
+        start = _now()
+        try:
+            task(self._manager, self._context)
+        except Exception as e:
+            stats['failures'] += 1
+            LOG.exception(_LE("Error during %(task)s: %(e)s"),
+                          {'task': full_task_name, 'e': e})
+        end = _now()
+
+        duration = end - start
+        stats['runs'] += 1
+        stats['last_duration'] = duration
+        for bound in DURATION_BUCKETS:
+            if duration <= bound:
+                stats['histogram'][bound] += 1
+                break
+
+        next_run = scheduled + spacing
+        if end > next_run:
+            missed = int((end - next_run) // spacing) + 1
+            next_run += missed * spacing
+            stats['overruns'] += 1
+            stats['skipped'] += missed
+            LOG.warning(_LW("Periodic task %(task)s took %(duration).1f "
+                            "seconds, longer than its %(spacing)s seconds "
+                            "interval; skipping %(missed)d run(s)."),
+                        {'task': full_task_name, 'duration': duration,
+                         'spacing': spacing, 'missed': missed})
+        return next_run
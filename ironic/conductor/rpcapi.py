@@ -18,6 +18,7 @@
 Client side of the conductor RPC API.
 """
 
+import collections
 import random
 
 from oslo import messaging
@@ -53,13 +54,14 @@ class ConductorAPI(object):
         1.13 - Added update_port.
         1.14 - Added driver_vendor_passthru.
         1.15 - Added rebuild parameter to do_node_deploy.
+        1.16 - Added change_nodes_power_state.
 
     """
 
     # NOTE(rloo): This must be in sync with manager.ConductorManager's.
-    RPC_API_VERSION = '1.15'
+    RPC_API_VERSION = '1.16'
 
-    def __init__(self, topic=None):
+    def __init__(self, topic=None, ring_manager=None):
         super(ConductorAPI, self).__init__()
         self.topic = topic
         if self.topic is None:
@@ -71,7 +73,7 @@ class ConductorAPI(object):
         self.client = rpc.get_client(target,
                                      version_cap=self.RPC_API_VERSION,
                                      serializer=serializer)
-        self.ring_manager = hash.HashRingManager()
+        self.ring_manager = ring_manager or hash.HashRingManager()
 
     def get_topic_for(self, node):
         """Get the RPC topic for the conductor service which the node
@@ -91,6 +93,40 @@ class ConductorAPI(object):
                         'driver %s.') % node.driver)
             raise exception.NoValidHost(reason=reason)
 
+    def get_topics_for_nodes(self, nodes, unmapped=None):
+        """Group nodes by the RPC topic of the conductor service which
+        each of them is mapped to.
+
+        :param nodes: a list of (node uuid, driver name) tuples.
+        :param unmapped: a dict to which the uuids of the nodes whose driver
+                         no conductor supports are added, mapped to the
+                         reason, rather than raising NoValidHost.
+        :returns: a dict mapping RPC topic strings to lists of node uuids.
+        :raises: NoValidHost
+
+        """
+        uuids_by_driver = collections.defaultdict(list)
+        for node_uuid, driver_name in nodes:
+            uuids_by_driver[driver_name].append(node_uuid)
+
+        topics = collections.defaultdict(list)
+        for driver_name, node_uuids in uuids_by_driver.items():
+            try:
+                ring = self.ring_manager.get_hash_ring(driver_name)
+            except exception.DriverNotFound:
+                reason = (_('No conductor service registered which supports '
+                            'driver %s.') % driver_name)
+                if unmapped is None:
+                    raise exception.NoValidHost(reason=reason)
+                for node_uuid in node_uuids:
+                    unmapped[node_uuid] = reason
+                continue
+            hosts = ring.get_hosts_many(node_uuids)
+            for node_uuid in node_uuids:
+                topics[self.topic + "." + hosts[node_uuid][0]].append(
+                        node_uuid)
+        return dict(topics)
+
     def get_topic_for_driver(self, driver_name):
         """Get an RPC topic which will route messages to a conductor which
         supports the specified driver. A conductor is selected at
@@ -142,6 +178,29 @@ class ConductorAPI(object):
         return cctxt.call(context, 'change_node_power_state', node_id=node_id,
                           new_state=new_state)
 
+    def change_nodes_power_state(self, context, node_ids, new_state,
+                                 topic=None):
+        """Synchronously, lock several nodes and start a single conductor
+        background task to change their power state.
+
+        All the nodes should be mapped to the conductor serving topic; see
+        get_topics_for_nodes.
+
+        :param context: request context.
+        :param node_ids: a list of node uuids.
+        :param new_state: one of ironic.common.states power state values
+        :param topic: RPC topic. Defaults to self.topic.
+        :returns: a dict with the list of node uuids whose power action was
+                  started under 'accepted', and a dict mapping the uuids of
+                  the other nodes to the reason under 'failed'.
+        :raises: NoFreeConductorWorker when there is no free worker to start
+                 async task.
+
+        """
+        cctxt = self.client.prepare(topic=topic or self.topic, version='1.16')
+        return cctxt.call(context, 'change_nodes_power_state',
+                          node_ids=node_ids, new_state=new_state)
+
     def vendor_passthru(self, context, node_id, driver_method, info,
                         topic=None):
         """Synchronously, acquire lock, validate given parameters and start
@@ -45,7 +45,8 @@ attributes that you may access:
     task.shared -- False if Node is locked, True if it is not locked. (The
                    'shared' kwarg arg of TaskManager())
     task.node -- The Node object
-    task.ports -- Ports belonging to the Node
+    task.ports -- Ports belonging to the Node. These are loaded from the
+                  database the first time they are accessed.
     task.driver -- The Driver for the Node, or the Driver based on the
                    'driver_name' kwarg of TaskManager().
 
@@ -83,8 +84,23 @@ code when the spawned task generates an exception:
                          utils.node_power_action, task, task.node,
                          new_state)
 
+Several nodes may be locked at once with :func:`acquire_batch`, which
+reserves them with a single DB API call and releases them together. Nodes
+that are already locked, or which don't match the supplied filters, are
+skipped rather than causing an error:
+
+    with task_manager.acquire_batch(context, node_ids, limit=10) as tasks:
+        for task in tasks:
+            <do some work>
+
+Each member of the batch is a :class:`TaskManager`, so spawn_after() may
+be used on it; such a node is released when its thread finishes instead
+of with the rest of the batch.
+
 """
 
+import functools
+
 from oslo.config import cfg
 
 from ironic.openstack.common import excutils
@@ -93,6 +109,7 @@ from ironic.common import driver_factory
 from ironic.common import exception
 from ironic.db import api as dbapi
 from ironic import objects
+from ironic.openstack.common.gettextutils import _LE
 from ironic.openstack.common.gettextutils import _LW
 from ironic.openstack.common import log as logging
 
@@ -117,7 +134,7 @@ def require_exclusive_lock(f):
     return wrapper
 
 
-def acquire(context, node_id, shared=False, driver_name=None):
+def acquire(context, node_id, shared=False, driver_name=None, filters=None):
     """Shortcut for acquiring a lock on a Node.
 
     :param context: Request context.
@@ -125,11 +142,28 @@ def acquire(context, node_id, shared=False, driver_name=None):
     :param shared: Boolean indicating whether to take a shared or exclusive
                    lock. Default: False.
     :param driver_name: Name of Driver. Default: None.
+    :param filters: Constraints the node must satisfy for an exclusive
+                    lock to be taken. See :meth:`TaskManager.__init__`.
+                    Default: None.
     :returns: An instance of :class:`TaskManager`.
 
     """
     return TaskManager(context, node_id, shared=shared,
-                       driver_name=driver_name)
+                       driver_name=driver_name, filters=filters)
+
+
+def acquire_batch(context, node_ids, limit=None, filters=None):
+    """Shortcut for acquiring exclusive locks on several Nodes.
+
+    :param context: Request context.
+    :param node_ids: List of IDs or UUIDs of nodes to lock.
+    :param limit: Maximum number of nodes to lock. Default: None.
+    :param filters: Constraints the nodes must satisfy to be locked.
+                    Default: None.
+    :returns: An instance of :class:`BatchTaskManager`.
+
+    """
+    return BatchTaskManager(context, node_ids, limit=limit, filters=filters)
 
 
 class TaskManager(object):
@@ -140,7 +174,8 @@ class TaskManager(object):
 
     """
 
-    def __init__(self, context, node_id, shared=False, driver_name=None):
+    def __init__(self, context, node_id, shared=False, driver_name=None,
+                 filters=None):
         """Create a new TaskManager.
 
         Acquire a lock on a node. The lock can be either shared or
@@ -154,38 +189,98 @@ class TaskManager(object):
                        lock. Default: False.
         :param driver_name: The name of the driver to load, if different
                             from the Node's current driver.
+        :param filters: A dict of constraints, as accepted by the DB API's
+                        get_node_list(), that the node must satisfy for the
+                        exclusive lock to be taken. They are checked in the
+                        same statement that reserves the node. Ignored for
+                        shared locks.
         :raises: DriverNotFound
         :raises: NodeNotFound
         :raises: NodeLocked
+        :raises: NodeConstraintsNotMet
 
         """
 
-        self._dbapi = dbapi.get_instance()
-        self._spawn_method = None
-        self._on_error_method = None
-
-        self.context = context
-        self.node = None
-        self.shared = shared
+        self._init_state(context, shared)
 
         try:
             if not self.shared:
-                self.node = self._dbapi.reserve_node(CONF.host, node_id)
+                self.node = self._dbapi.reserve_node(CONF.host, node_id,
+                                                     filters=filters)
             else:
                 self.node = objects.Node.get(context, node_id)
-            self.ports = self._dbapi.get_ports_by_node_id(self.node.id)
             self.driver = driver_factory.get_driver(driver_name or
                                                     self.node.driver)
         except Exception:
             with excutils.save_and_reraise_exception():
                 self.release_resources()
 
+    def _init_state(self, context, shared):
+        """Set up the attributes of a task which holds no node yet."""
+        self._dbapi = dbapi.get_instance()
+        self._spawn_method = None
+        self._on_error_method = None
+        self._ports = None
+        self._node_saves_deferred = False
+
+        self.context = context
+        self.node = None
+        self.driver = None
+        self.shared = shared
+
+    @property
+    def ports(self):
+        """Ports belonging to the node, loaded on first access."""
+        if self._ports is None and self.node is not None:
+            self._ports = self._dbapi.get_ports_by_node_id(self.node.id)
+        return self._ports
+
     def spawn_after(self, _spawn_method, *args, **kwargs):
         """Call this to spawn a thread to complete the task."""
         self._spawn_method = _spawn_method
         self._spawn_args = args
         self._spawn_kwargs = kwargs
 
+    def defer_node_saves(self):
+        """Hold back saves of the node until the task is released.
+
+        The changes passed to node.save() meanwhile are written with a
+        single update when the task releases its resources, or when the
+        thread started by spawn_after() finishes its work. node.flush()
+        writes them earlier where other processes must see them.
+        """
+        self._node_saves_deferred = True
+        self.node.defer_saves()
+
+    def _flush_node_saves(self):
+        if not self._node_saves_deferred:
+            return
+        self._node_saves_deferred = False
+        try:
+            self.node.flush(self.context)
+        except exception.NodeNotFound:
+            # the node was deleted within the task's context.
+            pass
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                LOG.error(_LE("Failed to save the deferred changes of "
+                              "node %s."), self.node.uuid)
+
+    def _call_and_flush_node_saves(self, func, *args, **kwargs):
+        """Call func, then save the node's deferred changes."""
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                try:
+                    self._flush_node_saves()
+                except Exception:
+                    # Don't hide func's exception; the failure to save
+                    # was logged already.
+                    pass
+        self._flush_node_saves()
+        return result
+
     def set_spawn_error_hook(self, _on_error_method, *args, **kwargs):
         """Create a hook that gets called when the task generates an exception.
 
@@ -208,23 +303,35 @@ class TaskManager(object):
         If an exclusive lock is held, unlock the node. Reset attributes
         to make it clear that this instance of TaskManager should no
         longer be accessed.
+
+        :raises: any exception from saving the node's deferred changes,
+                 once the node is unlocked.
         """
 
-        if not self.shared:
-            try:
-                if self.node:
-                    self._dbapi.release_node(CONF.host, self.node.id)
-            except exception.NodeNotFound:
-                # squelch the exception if the node was deleted
-                # within the task's context.
-                pass
-        self.node = None
-        self.driver = None
-        self.ports = None
+        try:
+            if not self.shared and self.node:
+                try:
+                    self._flush_node_saves()
+                finally:
+                    try:
+                        self._dbapi.release_node(CONF.host, self.node.id)
+                    except exception.NodeNotFound:
+                        # squelch the exception if the node was deleted
+                        # within the task's context.
+                        pass
+        finally:
+            self.node = None
+            self.driver = None
+            self._ports = None
 
     def _thread_release_resources(self, t):
         """Thread.link() callback to release resources."""
-        self.release_resources()
+        try:
+            self.release_resources()
+        except Exception:
+            # There is no caller left to report the failure to, and it
+            # was logged already.
+            pass
 
     def __enter__(self):
         return self
@@ -242,8 +349,16 @@ class TaskManager(object):
             # All of the above are asserted in tests such that we'll
             # catch if eventlet ever changes this behavior.
             thread = None
+            spawn_args = self._spawn_args
+            if self._node_saves_deferred:
+                # Save the node's deferred changes on the worker itself,
+                # so they are written by the time it is seen to have
+                # finished; the callback below only unlocks the node.
+                func = functools.partial(self._call_and_flush_node_saves,
+                                         spawn_args[0])
+                spawn_args = (func,) + spawn_args[1:]
             try:
-                thread = self._spawn_method(*self._spawn_args,
+                thread = self._spawn_method(*spawn_args,
                                             **self._spawn_kwargs)
 
                 # NOTE(comstud): Trying to use a lambda here causes
@@ -271,4 +386,165 @@ class TaskManager(object):
                         # reason. Nuke the thread.
                         thread.cancel()
                     self.release_resources()
-        self.release_resources()
+        try:
+            self.release_resources()
+        except Exception:
+            # Don't hide the exception raised within the context; the
+            # failure to save was logged already.
+            if exc_type is None:
+                raise
+
+
+class _BatchMemberTask(TaskManager):
+    """A :class:`TaskManager` for a node locked by a BatchTaskManager."""
+
+    def __init__(self, context, node):
+        # The node was already reserved by the batch, so only the state
+        # shared with TaskManager is set up here.
+        self._init_state(context, shared=False)
+        self.node = node
+        self.driver = driver_factory.get_driver(node.driver)
+
+
+class BatchTaskManager(object):
+    """Context manager for tasks on a set of nodes.
+
+    Exclusively locks as many of the requested nodes as are available
+    with a single DB API call, and releases those which are not handed
+    to a background thread with a single call as well.
+
+    """
+
+    def __init__(self, context, node_ids, limit=None, filters=None):
+        """Create a new BatchTaskManager.
+
+        :param context: request context
+        :param node_ids: list of IDs or UUIDs of nodes to lock.
+        :param limit: maximum number of nodes to lock.
+        :param filters: a dict of constraints, as accepted by the DB API's
+                        get_node_list(), that nodes must satisfy in order
+                        to be locked.
+        :raises: DriverNotFound
+
+        """
+        self._dbapi = dbapi.get_instance()
+        self._spawn_method = None
+        self.context = context
+        self.tasks = []
+
+        nodes = self._dbapi.reserve_nodes(CONF.host, node_ids, limit=limit,
+                                          filters=filters)
+        try:
+            for node in nodes:
+                self.tasks.append(_BatchMemberTask(context, node))
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self.tasks = []
+                self._dbapi.release_nodes(CONF.host,
+                                          [node.id for node in nodes])
+
+    def __iter__(self):
+        return iter(self.tasks)
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def spawn_after(self, _spawn_method, *args, **kwargs):
+        """Call this to spawn a single thread to complete the whole batch.
+
+        The thread takes over every node still held by the batch when the
+        context manager exits. Nodes it does not release itself are
+        released once it finishes.
+        """
+        self._spawn_method = _spawn_method
+        self._spawn_args = args
+        self._spawn_kwargs = kwargs
+
+    def release(self, task):
+        """Unlock a single node and drop it from the batch."""
+        self.tasks.remove(task)
+        task.release_resources()
+
+    def release_resources(self):
+        """Unlock every node in the batch which is still held.
+
+        :raises: the first exception from saving the deferred changes of
+                 a node, once all of the nodes are unlocked.
+        """
+        error = None
+        node_ids = []
+        for task in self.tasks:
+            if task.node is not None:
+                try:
+                    task._flush_node_saves()
+                except Exception as e:
+                    error = error or e
+                node_ids.append(task.node.id)
+        try:
+            if node_ids:
+                self._dbapi.release_nodes(CONF.host, node_ids)
+        finally:
+            for task in self.tasks:
+                task.node = None
+                task.driver = None
+                task._ports = None
+            self.tasks = []
+        if error is not None:
+            raise error
+
+    def _thread_release_resources(self, t):
+        """Thread.link() callback to release resources."""
+        try:
+            self.release_resources()
+        except Exception:
+            # There is no caller left to report the failure to, and it
+            # was logged already.
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        error = None
+        if exc_type is None:
+            # Start any background work that was requested. These tasks
+            # take care of releasing their own node, whether or not the
+            # spawn succeeds, so they are dropped from the batch.
+            remaining = []
+            for task in self.tasks:
+                if task._spawn_method is None:
+                    remaining.append(task)
+                    continue
+                node_uuid = task.node.uuid
+                try:
+                    task.__exit__(None, None, None)
+                except Exception as e:
+                    # Keep going so the remaining nodes are still started
+                    # or released, then re-raise the first error.
+                    error = error or e
+                    LOG.warning(_LW("Failed to start the task for node "
+                                    "%(node)s: %(err)s"),
+                                {'node': node_uuid, 'err': e})
+            self.tasks = remaining
+
+            if (error is None and self._spawn_method is not None and
+                    self.tasks):
+                thread = None
+                try:
+                    thread = self._spawn_method(*self._spawn_args,
+                                                **self._spawn_kwargs)
+                    thread.link(self._thread_release_resources)
+                    # The nodes are released when the thread finishes.
+                    return
+                except Exception:
+                    with excutils.save_and_reraise_exception():
+                        if thread is not None:
+                            thread.cancel()
+                        self.release_resources()
+        try:
+            self.release_resources()
+        except Exception as e:
+            if exc_type is None:
+                error = error or e
+        if error is not None:
+            raise error
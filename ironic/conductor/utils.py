@@ -93,10 +93,11 @@ def node_power_action(task, state):
 
     # Set the target_power_state and clear any last_error, since we're
     # starting a new operation. This will expose to other processes
-    # and clients that work is in progress.
+    # and clients that work is in progress, so it is written even if
+    # the task defers saving the node.
     node['target_power_state'] = new_state
     node['last_error'] = None
-    node.save(context)
+    node.flush(context)
 
     # take power action
     try:
@@ -61,10 +61,15 @@ class Connection(object):
                         'chassis_uuid': uuid of chassis
                         'driver': driver's name
                         'provision_state': provision state of node
+                        'provision_state_not_in': list of provision states
+                         the node must not be in
                         'provisioned_before': nodes with provision_updated_at
                          field before this interval in seconds
+                        'uuid_in': list of uuids the node must have; can
+                         not be combined with limit or marker
         :param limit: Maximum number of nodes to return.
-        :param marker: the last item of the previous page; we return the next
+        :param marker: the last item of the previous page, or a dict of
+                       its sort key and id values; we return the next
                        result set.
         :param sort_key: Attribute by which results should be sorted.
         :param sort_dir: direction in which results should be sorted.
@@ -84,10 +89,15 @@ class Connection(object):
                         'chassis_uuid': uuid of chassis
                         'driver': driver's name
                         'provision_state': provision state of node
+                        'provision_state_not_in': list of provision states
+                         the node must not be in
                         'provisioned_before': nodes with provision_updated_at
                          field before this interval in seconds
+                        'uuid_in': list of uuids the node must have; can
+                         not be combined with limit or marker
         :param limit: Maximum number of nodes to return.
-        :param marker: the last item of the previous page; we return the next
+        :param marker: the last item of the previous page, or a dict of
+                       its sort key and id values; we return the next
                        result set.
         :param sort_key: Attribute by which results should be sorted.
         :param sort_dir: direction in which results should be sorted.
@@ -95,7 +105,7 @@ class Connection(object):
         """
 
     @abc.abstractmethod
-    def reserve_node(self, tag, node_id):
+    def reserve_node(self, tag, node_id, filters=None):
         """Reserve a node.
 
         To prevent other ManagerServices from manipulating the given
@@ -103,9 +113,42 @@ class Connection(object):
 
         :param tag: A string uniquely identifying the reservation holder.
         :param node_id: A node id or uuid.
+        :param filters: Constraints the node must satisfy to be reserved,
+                        checked atomically with taking the reservation.
+                        Accepts the same filters as get_node_list().
+                        Defaults to None.
         :returns: A Node object.
         :raises: NodeNotFound if the node is not found.
         :raises: NodeLocked if the node is already reserved.
+        :raises: NodeConstraintsNotMet if the node does not match filters.
+        """
+
+    @abc.abstractmethod
+    def reserve_nodes(self, tag, node_ids, limit=None, filters=None):
+        """Reserve several nodes at once.
+
+        Nodes which are already reserved, or which do not match the
+        filters, are skipped rather than raising an exception.
+
+        :param tag: A string uniquely identifying the reservation holder.
+        :param node_ids: A list of node ids and/or uuids.
+        :param limit: Maximum number of nodes to reserve. Defaults to None,
+                      which reserves every available node.
+        :param filters: Constraints the nodes must satisfy to be reserved.
+                        Accepts the same filters as get_node_list().
+                        Defaults to None.
+        :returns: A list of the Node objects which were reserved.
+        """
+
+    @abc.abstractmethod
+    def release_nodes(self, tag, node_ids):
+        """Release the reservations on several nodes at once.
+
+        Nodes which are not reserved by the given tag, or which no longer
+        exist, are silently skipped.
+
+        :param tag: A string uniquely identifying the reservation holder.
+        :param node_ids: A list of node ids and/or uuids.
         """
 
     @abc.abstractmethod
@@ -173,7 +216,7 @@ class Connection(object):
         """
 
     @abc.abstractmethod
-    def update_node(self, node_id, values):
+    def update_node(self, node_id, values, expected_updated_at=None):
         """Update properties of a node.
 
         :param node_id: The id or uuid of a node.
@@ -188,9 +231,12 @@ class Connection(object):
                              'my-field-2': val2,
                             }
                        }
+        :param expected_updated_at: If given, the node is only updated if
+                                    its updated_at still has this value.
         :returns: A node.
         :raises: NodeAssociated
         :raises: NodeNotFound
+        :raises: NodeUpdateConflict if expected_updated_at does not match.
         """
 
     @abc.abstractmethod
@@ -209,13 +255,34 @@ class Connection(object):
         :returns: A port.
         """
 
+    @abc.abstractmethod
+    def get_portinfo_list(self, columns=None, filters=None, limit=None,
+                          marker=None, sort_key=None, sort_dir=None):
+        """Return a list of the specified columns for all ports that match
+        the specified filters.
+
+        :param columns: List of column names to return.
+                        Defaults to 'id' column when columns == None.
+        :param filters: Filters to apply. Defaults to None.
+                        'node_id': id of the node the ports belong to
+        :param limit: Maximum number of ports to return.
+        :param marker: the last item of the previous page, or a dict of
+                       its sort key and id values; we return the next
+                       result set.
+        :param sort_key: Attribute by which results should be sorted.
+        :param sort_dir: direction in which results should be sorted.
+                         (asc, desc)
+        :returns: A list of tuples of the specified columns.
+        """
+
     @abc.abstractmethod
     def get_port_list(self, limit=None, marker=None,
                       sort_key=None, sort_dir=None):
         """Return a list of ports.
 
         :param limit: Maximum number of ports to return.
-        :param marker: the last item of the previous page; we return the next
+        :param marker: the last item of the previous page, or a dict of
+                       its sort key and id values; we return the next
                        result set.
         :param sort_key: Attribute by which results should be sorted.
         :param sort_dir: direction in which results should be sorted.
@@ -229,7 +296,8 @@ class Connection(object):
 
         :param node_id: The integer node ID.
         :param limit: Maximum number of ports to return.
-        :param marker: the last item of the previous page; we return the next
+        :param marker: the last item of the previous page, or a dict of
+                       its sort key and id values; we return the next
                        result set.
         :param sort_key: Attribute by which results should be sorted
         :param sort_dir: direction in which results should be sorted
@@ -281,7 +349,8 @@ class Connection(object):
         """Return a list of chassis.
 
         :param limit: Maximum number of chassis to return.
-        :param marker: the last item of the previous page; we return the next
+        :param marker: the last item of the previous page, or a dict of
+                       its sort key and id values; we return the next
                        result set.
         :param sort_key: Attribute by which results should be sorted.
         :param sort_dir: direction in which results should be sorted.
@@ -343,6 +412,19 @@ class Connection(object):
         :raises: ConductorNotFound
         """
 
+    @abc.abstractmethod
+    def get_active_conductor_ids(self, interval=None):
+        """Retrieve the ids of the registered and active conductors.
+
+        This is a cheap way of telling whether the set of active conductors
+        or the drivers they support has changed: a conductor gets a new id
+        whenever it registers, so the result only changes when a conductor
+        joins, leaves or stops checking in.
+
+        :param interval: Seconds since last check-in of a conductor.
+        :returns: A frozenset of conductor ids.
+        """
+
     @abc.abstractmethod
     def get_active_driver_dict(self, interval):
         """Retrieve drivers for the registered and active conductors.
@@ -0,0 +1,46 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""add indexes for periodic task and API filter queries
+
+Revision ID: 4f399b21ae71
+Revises: 3bea56f25597
+Create Date: 2014-06-20 10:12:44.385213
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4f399b21ae71'
+down_revision = '3bea56f25597'
+
+from alembic import op
+
+
+INDEXES = (
+    ('nodes_provision_state_idx', 'nodes',
+     ['provision_state', 'maintenance', 'provision_updated_at']),
+    ('nodes_reservation_idx', 'nodes', ['reservation', 'maintenance']),
+    ('nodes_driver_idx', 'nodes', ['driver', 'maintenance']),
+    ('nodes_chassis_id_idx', 'nodes', ['chassis_id']),
+    ('ports_node_id_idx', 'ports', ['node_id']),
+    ('conductors_updated_at_idx', 'conductors', ['updated_at']),
+)
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table)
@@ -18,8 +18,12 @@
 
 import collections
 import datetime
+import operator
 
 from oslo.config import cfg
+import six
+from sqlalchemy import DateTime
+from sqlalchemy import or_
 from sqlalchemy.orm.exc import NoResultFound
 
 from ironic.common import exception
@@ -52,6 +56,10 @@ db_options.set_defaults(_DEFAULT_SQL_CONNECTION, 'ironic.sqlite')
 
 _FACADE = None
 
+# Maximum number of values in a single IN clause. SQLite limits the number
+# of bound parameters in a statement to 999.
+_MAX_IN_ITEMS = 500
+
 
 def _create_facade_lazily():
     global _FACADE
@@ -107,6 +115,36 @@ def add_identity_filter(query, value):
         raise exception.InvalidIdentity(identity=value)
 
 
+def add_identity_list_filter(query, values):
+    """Adds a filter matching any of several identities to a node query.
+
+    :param query: Initial query to add filter to.
+    :param values: An iterable of node ids and/or uuids.
+    :return: Modified query.
+    """
+    ids = []
+    uuids = []
+    for value in values:
+        if utils.is_int_like(value):
+            ids.append(value)
+        elif utils.is_uuid_like(value):
+            uuids.append(value)
+        else:
+            raise exception.InvalidIdentity(identity=value)
+    conditions = []
+    if ids:
+        conditions.append(models.Node.id.in_(ids))
+    if uuids:
+        conditions.append(models.Node.uuid.in_(uuids))
+    return query.filter(or_(*conditions))
+
+
+def _chunks(values, size):
+    """Split a list into successive chunks of at most `size` items."""
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
 def add_port_filter(query, value):
     """Adds a port-specific filter to a query.
 
@@ -159,11 +197,63 @@ def _paginate_query(model, limit=None, marker=None, sort_key=None,
     sort_keys = ['id']
     if sort_key and sort_key not in sort_keys:
         sort_keys.insert(0, sort_key)
+    if marker is not None:
+        query = _add_marker_filter(query, model, sort_keys, sort_dir, marker)
     query = db_utils.paginate_query(query, model, limit, sort_keys,
-                                    marker=marker, sort_dir=sort_dir)
+                                    sort_dir=sort_dir)
     return query.all()
 
 
+def _add_marker_filter(query, model, sort_keys, sort_dir, marker):
+    """Filter a query down to the rows which follow the marker.
+
+    Rather than the OR-chain of comparisons built by
+    db_utils.paginate_query(), the condition is::
+
+        key >= X AND (key > X OR id > Y)
+
+    so that the database can serve it with a single range scan of an
+    index on the sort key, however deep the page is.
+
+    :param marker: the last item of the previous page, or a dict of its
+                   sort key values. DateTime values may be given as
+                   strings in timeutils.PERFECT_TIME_FORMAT.
+    """
+    columns = []
+    values = []
+    for key in sort_keys:
+        try:
+            column = getattr(model, key)
+        except AttributeError:
+            raise db_utils.InvalidSortKey()
+        if isinstance(marker, dict):
+            value = marker[key]
+        else:
+            value = getattr(marker, key)
+        if (isinstance(value, six.string_types) and
+                isinstance(model.__table__.c[key].type, DateTime)):
+            value = timeutils.parse_strtime(value)
+        columns.append(column)
+        values.append(value)
+
+    if sort_dir == 'desc':
+        after, after_or_at = operator.lt, operator.le
+    else:
+        after, after_or_at = operator.gt, operator.ge
+
+    if len(sort_keys) == 1:
+        return query.filter(after(columns[0], values[0]))
+    if values[0] is None:
+        # NULL does not compare to anything, so as with
+        # db_utils.paginate_query() only the rows sharing the NULL sort
+        # key follow the marker.
+        return query.filter(columns[0] == None,
+                            after(columns[1], values[1]))
+    return query.filter(after_or_at(columns[0], values[0]),
+                        or_(after(columns[0], values[0]),
+                            after(columns[1], values[1])))
+
+
 class Connection(api.Connection):
     """SqlAlchemy connection."""
 
@@ -194,13 +284,44 @@ class Connection(api.Connection):
             query = query.filter_by(driver=filters['driver'])
         if 'provision_state' in filters:
             query = query.filter_by(provision_state=filters['provision_state'])
+        if 'provision_state_not_in' in filters:
+            # NOSTATE is stored as NULL, which never compares unequal
+            # to anything, so it has to be matched explicitly.
+            query = query.filter(or_(
+                models.Node.provision_state == None,
+                ~models.Node.provision_state.in_(
+                    filters['provision_state_not_in'])))
         if 'provisioned_before' in filters:
             limit = timeutils.utcnow() - datetime.timedelta(
                                          seconds=filters['provisioned_before'])
             query = query.filter(models.Node.provision_updated_at < limit)
-
         return query
 
+    def _get_nodes(self, columns, filters, limit, marker, sort_key,
+                   sort_dir):
+        filters = dict(filters or {})
+        node_uuids = filters.pop('uuid_in', None)
+        if node_uuids is None:
+            query = model_query(*columns, base_model=models.Node)
+            query = self._add_nodes_filters(query, filters)
+            return _paginate_query(models.Node, limit, marker,
+                                   sort_key, sort_dir, query)
+
+        # The nodes are looked up in chunks to keep each IN clause within
+        # the database's limit of bound parameters, so the results can
+        # not be paginated.
+        if limit is not None or marker is not None:
+            msg = _("The 'uuid_in' filter can not be paginated.")
+            raise exception.InvalidParameterValue(err=msg)
+        nodes = []
+        for chunk in _chunks(list(node_uuids), _MAX_IN_ITEMS):
+            query = model_query(*columns, base_model=models.Node)
+            query = add_identity_list_filter(query, chunk)
+            query = self._add_nodes_filters(query, filters)
+            nodes.extend(_paginate_query(models.Node, None, None,
+                                         sort_key, sort_dir, query))
+        return nodes
+
     def get_nodeinfo_list(self, columns=None, filters=None, limit=None,
                           marker=None, sort_key=None, sort_dir=None):
         # list-ify columns default values because it is bad form
@@ -210,38 +331,90 @@ class Connection(api.Connection):
         else:
             columns = [getattr(models.Node, c) for c in columns]
 
-        query = model_query(*columns, base_model=models.Node)
-        query = self._add_nodes_filters(query, filters)
-        return _paginate_query(models.Node, limit, marker,
-                               sort_key, sort_dir, query)
+        return self._get_nodes(columns, filters, limit, marker,
+                               sort_key, sort_dir)
 
     @objects.objectify(objects.Node)
     def get_node_list(self, filters=None, limit=None, marker=None,
                       sort_key=None, sort_dir=None):
-        query = model_query(models.Node)
-        query = self._add_nodes_filters(query, filters)
-        return _paginate_query(models.Node, limit, marker,
-                               sort_key, sort_dir, query)
+        return self._get_nodes([models.Node], filters, limit, marker,
+                               sort_key, sort_dir)
 
     @objects.objectify(objects.Node)
-    def reserve_node(self, tag, node_id):
+    def reserve_node(self, tag, node_id, filters=None):
         session = get_session()
         with session.begin():
             query = model_query(models.Node, session=session)
             query = add_identity_filter(query, node_id)
+            # apply the constraints in the UPDATE itself so that checking
+            # them and taking the reservation is a single atomic step.
+            update_query = self._add_nodes_filters(query, filters)
             # be optimistic and assume we usually create a reservation
-            count = query.filter_by(reservation=None).update(
+            count = update_query.filter_by(reservation=None).update(
                         {'reservation': tag}, synchronize_session=False)
             try:
                 node = query.one()
-                if count != 1:
-                    # Nothing updated and node exists. Must already be
-                    # locked.
-                    raise exception.NodeLocked(node=node_id,
-                                               host=node['reservation'])
-                return node
             except NoResultFound:
                 raise exception.NodeNotFound(node_id)
+            if count != 1:
+                # Nothing updated and node exists. Either it is already
+                # locked or it does not match the requested filters.
+                if node['reservation'] is not None:
+                    raise exception.NodeLocked(node=node_id,
+                                               host=node['reservation'])
+                raise exception.NodeConstraintsNotMet(node=node_id,
+                                                      filters=filters)
+            return node
+
+    @objects.objectify(objects.Node)
+    def reserve_nodes(self, tag, node_ids, limit=None, filters=None):
+        node_ids = list(node_ids)
+        # Rows are first claimed with a tag unique to this call, so that
+        # nodes won here can be told apart from nodes that were already
+        # reserved with the same tag, eg. by another thread of this host.
+        claim = '%s:%s' % (tag, utils.generate_uuid())
+        reserved = []
+        for chunk in _chunks(node_ids, _MAX_IN_ITEMS):
+            if limit is not None and len(reserved) >= limit:
+                break
+            session = get_session()
+            with session.begin():
+                query = model_query(models.Node.id, base_model=models.Node,
+                                    session=session)
+                query = add_identity_list_filter(query, chunk)
+                query = self._add_nodes_filters(query, filters)
+                query = query.filter_by(reservation=None)
+                if limit is not None:
+                    query = query.limit(limit - len(reserved))
+                candidates = [row[0] for row in query.all()]
+                if not candidates:
+                    continue
+
+                query = model_query(models.Node, session=session)
+                query = query.filter(models.Node.id.in_(candidates))
+                query = self._add_nodes_filters(query, filters)
+                count = query.filter_by(reservation=None).update(
+                            {'reservation': claim}, synchronize_session=False)
+                if not count:
+                    continue
+
+                query = model_query(models.Node, session=session).\
+                            filter_by(reservation=claim)
+                nodes = query.all()
+                query.update({'reservation': tag},
+                             synchronize_session='evaluate')
+                reserved.extend(nodes)
+        return reserved
+
+    def release_nodes(self, tag, node_ids):
+        node_ids = list(node_ids)
+        for chunk in _chunks(node_ids, _MAX_IN_ITEMS):
+            session = get_session()
+            with session.begin():
+                query = model_query(models.Node, session=session)
+                query = add_identity_list_filter(query, chunk)
+                query.filter_by(reservation=tag).update(
+                        {'reservation': None}, synchronize_session=False)
 
     def release_node(self, tag, node_id):
         session = get_session()
@@ -328,30 +501,54 @@ class Connection(api.Connection):
             query.delete()
 
     @objects.objectify(objects.Node)
-    def update_node(self, node_id, values):
+    def update_node(self, node_id, values, expected_updated_at=None):
         # NOTE(dtantsur): this can lead to very strange errors
         if 'uuid' in values:
             msg = _("Cannot overwrite UUID for an existing Node.")
             raise exception.InvalidParameterValue(err=msg)
 
+        if 'provision_state' in values:
+            values['provision_updated_at'] = timeutils.utcnow()
+
         session = get_session()
         with session.begin():
             query = model_query(models.Node, session=session)
             query = add_identity_filter(query, node_id)
-            try:
-                ref = query.with_lockmode('update').one()
-            except NoResultFound:
-                raise exception.NodeNotFound(node=node_id)
 
+            # The checks are part of the UPDATE itself, rather than being
+            # made on a row read beforehand with SELECT ... FOR UPDATE.
+            update_query = query
             # Prevent instance_uuid overwriting
-            if values.get("instance_uuid") and ref.instance_uuid:
-                raise exception.NodeAssociated(node=node_id,
-                                instance=ref.instance_uuid)
-
-            if 'provision_state' in values:
-                values['provision_updated_at'] = timeutils.utcnow()
-
-            ref.update(values)
+            if values.get('instance_uuid'):
+                update_query = update_query.filter_by(instance_uuid=None)
+            if expected_updated_at is not None:
+                update_query = update_query.filter_by(
+                        updated_at=expected_updated_at)
+
+            ref = None
+            if session.bind.dialect.implicit_returning:
+                table = models.Node.__table__
+                stmt = table.update().\
+                            where(update_query.whereclause).\
+                            values(**values).\
+                            returning(*table.c)
+                ref = session.execute(stmt).first()
+                count = 0 if ref is None else 1
+            else:
+                count = update_query.update(values,
+                                            synchronize_session=False)
+
+            if count != 1 or ref is None:
+                try:
+                    ref = query.one()
+                except NoResultFound:
+                    raise exception.NodeNotFound(node=node_id)
+            if count != 1:
+                # Nothing updated and node exists, find out why.
+                if values.get('instance_uuid') and ref.instance_uuid:
+                    raise exception.NodeAssociated(node=node_id,
+                                    instance=ref.instance_uuid)
+                raise exception.NodeUpdateConflict(node=node_id)
         return ref
 
     @objects.objectify(objects.Port)
@@ -370,6 +567,19 @@ class Connection(api.Connection):
     def get_port_by_vif(self, vif):
         pass
 
+    def get_portinfo_list(self, columns=None, filters=None, limit=None,
+                          marker=None, sort_key=None, sort_dir=None):
+        if columns is None:
+            columns = [models.Port.id]
+        else:
+            columns = [getattr(models.Port, c) for c in columns]
+
+        query = model_query(*columns, base_model=models.Port)
+        if filters and 'node_id' in filters:
+            query = query.filter(models.Port.node_id == filters['node_id'])
+        return _paginate_query(models.Port, limit, marker,
+                               sort_key, sort_dir, query)
+
     @objects.objectify(objects.Port)
     def get_port_list(self, limit=None, marker=None,
                       sort_key=None, sort_dir=None):
@@ -536,6 +746,17 @@ class Connection(api.Connection):
             if count == 0:
                 raise exception.ConductorNotFound(conductor=hostname)
 
+    def get_active_conductor_ids(self, interval=None):
+        if interval is None:
+            interval = CONF.conductor.heartbeat_timeout
+
+        limit = timeutils.utcnow() - datetime.timedelta(seconds=interval)
+        result = model_query(models.Conductor.id,
+                             base_model=models.Conductor).\
+                    filter(models.Conductor.updated_at >= limit).\
+                    all()
+        return frozenset(row[0] for row in result)
+
     def get_active_driver_dict(self, interval=None):
         if interval is None:
             interval = CONF.conductor.heartbeat_timeout
@@ -123,6 +123,7 @@ class Conductor(Base):
     __tablename__ = 'conductors'
     __table_args__ = (
         schema.UniqueConstraint('hostname', name='uniq_conductors0hostname'),
+        schema.Index('conductors_updated_at_idx', 'updated_at'),
         )
     id = Column(Integer, primary_key=True)
     hostname = Column(String(255), nullable=False)
@@ -136,7 +137,15 @@ class Node(Base):
     __table_args__ = (
         schema.UniqueConstraint('uuid', name='uniq_nodes0uuid'),
         schema.UniqueConstraint('instance_uuid',
-                                name='uniq_nodes0instance_uuid'))
+                                name='uniq_nodes0instance_uuid'),
+        # Indexes matching the filters of the conductor periodic tasks
+        # and of the API node list.
+        schema.Index('nodes_provision_state_idx', 'provision_state',
+                     'maintenance', 'provision_updated_at'),
+        schema.Index('nodes_reservation_idx', 'reservation',
+                     'maintenance'),
+        schema.Index('nodes_driver_idx', 'driver', 'maintenance'),
+        schema.Index('nodes_chassis_id_idx', 'chassis_id'))
     id = Column(Integer, primary_key=True)
     uuid = Column(String(36))
     # NOTE(deva): we store instance_uuid directly on the node so that we can
@@ -166,7 +175,8 @@ class Port(Base):
     __tablename__ = 'ports'
     __table_args__ = (
         schema.UniqueConstraint('address', name='uniq_ports0address'),
-        schema.UniqueConstraint('uuid', name='uniq_ports0uuid'))
+        schema.UniqueConstraint('uuid', name='uniq_ports0uuid'),
+        schema.Index('ports_node_id_idx', 'node_id'))
     id = Column(Integer, primary_key=True)
     uuid = Column(String(36))
     address = Column(String(18))
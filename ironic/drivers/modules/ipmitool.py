@@ -29,12 +29,15 @@ WHICH PROVIDES DIFFERENT COMMAND-LINE OPTIONS AND *IS NOT SUPPORTED* BY THIS
 DRIVER.
 """
 
-import contextlib
+import atexit
 import os
+import random
 import stat
 import tempfile
 import time
 
+import eventlet
+from eventlet import semaphore
 from oslo.config import cfg
 
 from ironic.common import exception
@@ -48,8 +51,22 @@ from ironic.openstack.common import log as logging
 from ironic.openstack.common import loopingcall
 from ironic.openstack.common import processutils
 
+opts = [
+    cfg.IntOpt('session_idle_timeout',
+               default=300,
+               help='Seconds after which an idle ipmitool session to a BMC, '
+                    'together with the password file it reuses, is '
+                    'discarded.'),
+    cfg.FloatOpt('power_poll_jitter',
+                 default=0.2,
+                 help='Fraction by which the interval between power status '
+                      'polls is randomly stretched or shrunk, so that nodes '
+                      'powered on or off together do not poll their BMCs in '
+                      'lockstep.'),
+    ]
 
 CONF = cfg.CONF
+CONF.register_opts(opts, group='ipmi')
 CONF.import_opt('retry_timeout',
                 'ironic.drivers.modules.ipminative',
                 group='ipmi')
@@ -65,9 +82,19 @@ OPTIONS = [('username', '-U'), ('local_address', '-m'),
            ('transit_channel', '-B'), ('transit_address', '-T'),
            ('target_channel', '-b'), ('target_address', '-t')]
 
-LAST_CMD_TIME = {}
+SESSIONS = {}
 TIMING_SUPPORT = None
 
+# Greenthread which discards idle sessions, while there are any.
+SESSION_SWEEPER = None
+
+# BMC address last used for each node, keyed by node uuid.
+NODE_ADDRESSES = {}
+
+# Learnt power transition latency in seconds, keyed by BMC address and
+# target power state.
+POWER_TRANSITIONS = {}
+
 
 def _is_timing_supported(is_supported=None):
     # shim to allow module variable to be mocked in unit tests
@@ -114,25 +141,174 @@ def _console_pwfile_path(uuid):
     return os.path.join(tempfile.gettempdir(), file_name)
 
 
-@contextlib.contextmanager
-def _make_password_file(password):
-    """Makes a temporary file that contains the password.
+def _write_password_file(password):
+    """Writes the password to a new temporary file readable only by us.
 
     :param password: the password
     :returns: the absolute pathname of the temporary file
     :raises: Exception from creating or writing to the temporary file
     """
+    fd, path = tempfile.mkstemp()
     try:
-        fd, path = tempfile.mkstemp()
         os.fchmod(fd, stat.S_IRUSR | stat.S_IWUSR)
         with os.fdopen(fd, "w") as f:
             f.write(password)
-
-        yield path
-        utils.delete_if_exists(path)
     except Exception:
         with excutils.save_and_reraise_exception():
             utils.delete_if_exists(path)
+    return path
+
+
+class IPMISession(object):
+    """Queue of the ipmitool commands sent to a single BMC.
+
+    Commands for the same BMC are queued on the session and run one at a
+    time, at most once every CONF.ipmi.min_command_interval seconds. A
+    greenthread waiting for its turn yields to the others instead of
+    blocking the conductor. The password file is written when the session
+    is first used and reused until the password changes or the session is
+    closed.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self.last_cmd_time = 0
+        self.last_used = time.time()
+        self._lock = semaphore.Semaphore()
+        self._waiting = 0
+        self._password = None
+        self._pw_file = None
+
+    @property
+    def busy(self):
+        return self._waiting > 0 or self._lock.locked()
+
+    def _get_password_file(self, password):
+        if self._pw_file is None or password != self._password:
+            self._delete_password_file()
+            self._pw_file = _write_password_file(password)
+            self._password = password
+        return self._pw_file
+
+    def _delete_password_file(self):
+        if self._pw_file is not None:
+            utils.delete_if_exists(self._pw_file)
+        self._pw_file = None
+        self._password = None
+
+    def _wait_for_interval(self):
+        # NOTE(deva): ensure that no communications are sent to a BMC more
+        #             often than once every min_command_interval seconds.
+        time_till_next_poll = CONF.ipmi.min_command_interval - (
+                time.time() - self.last_cmd_time)
+        if time_till_next_poll > 0:
+            eventlet.sleep(time_till_next_poll)
+
+    def execute(self, args, password, command):
+        """Run an ipmitool command once it is this session's turn.
+
+        :param args: the ipmitool arguments which precede the password file.
+        :param password: the password of the BMC.
+        :param command: the list of ipmitool command arguments.
+        :returns: (stdout, stderr) from executing the command.
+        :raises: some Exception from making the password file or from
+            executing the command.
+        """
+        self._waiting += 1
+        try:
+            self._lock.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            self._wait_for_interval()
+            pw_file = self._get_password_file(password)
+            try:
+                return utils.execute(*(args + ['-f', pw_file] + command))
+            finally:
+                self.last_cmd_time = self.last_used = time.time()
+        finally:
+            self._lock.release()
+
+    def close(self):
+        """Discard the session's password file."""
+        self._delete_password_file()
+
+
+def _sweep_sessions():
+    """Discard the sessions which have been idle for too long."""
+    now = time.time()
+    for addr, session in SESSIONS.items():
+        if (not session.busy and
+                now - session.last_used > CONF.ipmi.session_idle_timeout):
+            del SESSIONS[addr]
+            session.close()
+    for uuid, addr in NODE_ADDRESSES.items():
+        if addr not in SESSIONS:
+            del NODE_ADDRESSES[uuid]
+
+
+def _run_session_sweeper():
+    global SESSION_SWEEPER
+    SESSION_SWEEPER = None
+    _sweep_sessions()
+    _start_session_sweeper()
+
+
+def _start_session_sweeper():
+    """Discard idle sessions later on, unless already scheduled.
+
+    This makes sure that the password files of BMCs which are no longer
+    used, for example those of deleted nodes, don't stay on disk.
+    """
+    global SESSION_SWEEPER
+    if SESSION_SWEEPER is None and SESSIONS:
+        SESSION_SWEEPER = eventlet.spawn_after(
+                CONF.ipmi.session_idle_timeout, _run_session_sweeper)
+
+
+def _get_session(address):
+    """Return the session for a BMC, creating it if needed.
+
+    Sessions which are no longer used are discarded by the sweeper.
+
+    :param address: the address of the BMC.
+    :returns: an IPMISession.
+    """
+    session = SESSIONS.get(address)
+    if session is None:
+        session = SESSIONS[address] = IPMISession(address)
+    session.last_used = time.time()
+    _start_session_sweeper()
+    return session
+
+
+def _get_node_session(driver_info):
+    """Return the session for a node's BMC.
+
+    If the node's BMC address changed, the session of its previous address
+    is closed, unless it is in use, so that the old password file does not
+    outlive the credentials.
+
+    :param driver_info: the ipmitool parameters for accessing a node.
+    :returns: an IPMISession.
+    """
+    address = driver_info['address']
+    old_address = NODE_ADDRESSES.get(driver_info['uuid'])
+    NODE_ADDRESSES[driver_info['uuid']] = address
+    if old_address is not None and old_address != address:
+        old_session = SESSIONS.get(old_address)
+        if old_session is not None and not old_session.busy:
+            del SESSIONS[old_address]
+            old_session.close()
+    return _get_session(address)
+
+
+@atexit.register
+def _close_sessions():
+    for session in SESSIONS.values():
+        session.close()
+    SESSIONS.clear()
+    NODE_ADDRESSES.clear()
 
 
 def _parse_driver_info(node):
@@ -229,21 +405,9 @@ def _exec_ipmitool(driver_info, command):
 
     # 'ipmitool' command will prompt password if there is no '-f' option,
     # we set it to '\0' to write a password file to support empty password
-    with _make_password_file(driver_info['password'] or '\0') as pw_file:
-        args.append('-f')
-        args.append(pw_file)
-        args.extend(command.split(" "))
-        # NOTE(deva): ensure that no communications are sent to a BMC more
-        #             often than once every min_command_interval seconds.
-        time_till_next_poll = CONF.ipmi.min_command_interval - (
-                time.time() - LAST_CMD_TIME.get(driver_info['address'], 0))
-        if time_till_next_poll > 0:
-            time.sleep(time_till_next_poll)
-        try:
-            out, err = utils.execute(*args)
-        finally:
-            LAST_CMD_TIME[driver_info['address']] = time.time()
-        return out, err
+    session = _get_node_session(driver_info)
+    return session.execute(args, driver_info['password'] or '\0',
+                           command.split(" "))
 
 
 def _sleep_time(iter):
@@ -259,12 +423,70 @@ def _sleep_time(iter):
     return iter ** 2
 
 
+def _jitter(seconds):
+    """Randomly stretch or shrink an interval by CONF.ipmi.power_poll_jitter.
+
+    :param seconds: the interval to spread.
+    :returns: number of seconds to sleep
+
+    """
+    jitter = CONF.ipmi.power_poll_jitter
+    return seconds * random.uniform(1 - jitter, 1 + jitter)
+
+
+def _first_poll_time(driver_info, target_state):
+    """Return how long to wait before the first power status poll.
+
+    If the BMC has been seen reaching target_state before, the first poll
+    is scheduled just after the learnt transition time, otherwise after the
+    usual first retry interval.
+
+    :param driver_info: the ipmitool parameters for accessing a node.
+    :param target_state: desired power state
+    :returns: number of seconds to sleep
+
+    """
+    expected = POWER_TRANSITIONS.get((driver_info['address'], target_state))
+    if expected is None:
+        return _jitter(_sleep_time(0))
+    expected *= 1 + random.uniform(0, CONF.ipmi.power_poll_jitter)
+    return min(expected, CONF.ipmi.retry_timeout)
+
+
+def _record_transition_time(driver_info, target_state, low, high):
+    """Update the learnt transition time of a BMC.
+
+    The transition finished some time between the last poll which did not
+    see target_state (low) and the one which did (high); the midpoint is
+    averaged with what was learnt before. If the first poll already saw
+    target_state, high is only an upper bound of the transition time, so
+    it can lower what was learnt before but not raise it.
+
+    :param driver_info: the ipmitool parameters for accessing a node.
+    :param target_state: the power state which was reached.
+    :param low: seconds after the power command of the last missed poll,
+                or None if no poll missed target_state.
+    :param high: seconds after the power command of the successful poll.
+
+    """
+    key = (driver_info['address'], target_state)
+    previous = POWER_TRANSITIONS.get(key)
+    if low is None:
+        observed = high if previous is None else min(previous, high)
+    else:
+        observed = (low + high) / 2.0
+        if previous is not None:
+            observed = (previous + observed) / 2.0
+    POWER_TRANSITIONS[key] = observed
+
+
 def _set_and_wait(target_state, driver_info):
     """Helper function for DynamicLoopingCall.
 
     This method changes the power state and polls the BMCuntil the desired
     power state is reached, or CONF.ipmi.retry_timeout would be exceeded by the
-    next iteration.
+    next iteration. The first poll is timed from how long the BMC took to
+    reach the same state before, and every interval is jittered.
 
     This method assumes the caller knows the current power state and does not
     check it prior to changing the power state. Most BMCs should be fine, but
@@ -287,6 +509,7 @@ def _set_and_wait(target_state, driver_info):
             # Only issue power change command once
             if mutable['iter'] < 0:
                 _exec_ipmitool(driver_info, "power %s" % state_name)
+                mutable['start'] = time.time()
             else:
                 mutable['power'] = _power_status(driver_info)
         except Exception:
@@ -297,9 +520,18 @@ def _set_and_wait(target_state, driver_info):
             mutable['iter'] += 1
 
         if mutable['power'] == target_state:
+            if mutable['start'] is not None:
+                _record_transition_time(driver_info, target_state,
+                                        mutable['last_miss'],
+                                        time.time() - mutable['start'])
             raise loopingcall.LoopingCallDone()
 
-        sleep_time = _sleep_time(mutable['iter'])
+        if mutable['iter'] == 0:
+            sleep_time = _first_poll_time(driver_info, target_state)
+        else:
+            if mutable['start'] is not None:
+                mutable['last_miss'] = time.time() - mutable['start']
+            sleep_time = _jitter(_sleep_time(mutable['iter']))
         if (sleep_time + mutable['total_time']) > CONF.ipmi.retry_timeout:
             # Stop if the next loop would exceed maximum retry_timeout
             LOG.error(_('IPMI power %(state)s timed out after '
@@ -313,8 +545,10 @@ def _set_and_wait(target_state, driver_info):
             return sleep_time
 
     # Use mutable objects so the looped method can change them.
-    # Start 'iter' from -1 so that the first two checks are one second apart.
-    status = {'power': None, 'iter': -1, 'total_time': 0}
+    # Start 'iter' from -1 so that the power command is sent first and the
+    # first status poll is timed by _first_poll_time.
+    status = {'power': None, 'iter': -1, 'total_time': 0,
+              'start': None, 'last_miss': None}
 
     timer = loopingcall.DynamicLoopingCall(_wait, status)
     timer.start().wait()
@@ -26,6 +26,7 @@ Currently supported environments are:
 """
 
 import os
+import time
 
 from oslo.config import cfg
 
@@ -35,6 +36,8 @@ from ironic.common import utils
 from ironic.conductor import task_manager
 from ironic.drivers import base
 from ironic.drivers import utils as driver_utils
+from ironic.openstack.common import excutils
+from ironic.openstack.common import lockutils
 from ironic.openstack.common import log as logging
 from ironic.openstack.common import processutils
 
@@ -44,11 +47,34 @@ libvirt_opts = [
                help='libvirt uri')
 ]
 
+ssh_opts = [
+    cfg.IntOpt('power_state_cache_timeout',
+               default=10,
+               help='Seconds for which the running VMs listed from a host '
+                    'are reused to answer power state queries for every '
+                    'node on that host. 0 - disable the cache.'),
+    cfg.IntOpt('mac_cache_timeout',
+               default=300,
+               help='Seconds for which the MAC addresses of the VMs on a '
+                    'host are cached to find the VM of a node. The cache '
+                    'is refreshed early when a MAC address is not found '
+                    'or a command on the VM fails. 0 - disable the '
+                    'cache.'),
+]
+
 CONF = cfg.CONF
 CONF.register_opts(libvirt_opts, group='ssh')
+CONF.register_opts(ssh_opts, group='ssh')
 
 LOG = logging.getLogger(__name__)
 
+# Active SSH connections, by (host, username, port).
+SSH_CONNECTIONS = {}
+# (timestamp, running VMs), by (host, username, port).
+RUNNING_VMS = {}
+# (timestamp, {MAC: VM name}), by (host, username, port).
+MAC_INVENTORIES = {}
+
 
 def _get_command_sets(virt_type):
     if virt_type == 'vbox':
@@ -205,19 +231,24 @@ def _parse_driver_info(node):
     return res
 
 
-def _get_power_status(ssh_obj, driver_info):
+def _get_power_status(ssh_obj, driver_info, use_cache=False):
     """Returns a node's current power state.
 
     :param ssh_obj: paramiko.SSHClient, an active ssh connection.
     :param driver_info: information for accessing the node.
+    :param use_cache: whether the VMs running on the host may be taken
+        from a recent listing. Default: False.
     :returns: one of ironic.common.states POWER_OFF, POWER_ON.
     :raises: NodeNotFound
 
     """
     power_state = None
-    cmd_to_exec = "%s %s" % (driver_info['cmd_set']['base_cmd'],
-                             driver_info['cmd_set']['list_running'])
-    running_list = _ssh_execute(ssh_obj, cmd_to_exec)
+    if use_cache:
+        running_list = _get_cached_running_list(ssh_obj, driver_info)
+    else:
+        cmd_to_exec = "%s %s" % (driver_info['cmd_set']['base_cmd'],
+                                 driver_info['cmd_set']['list_running'])
+        running_list = _ssh_execute(ssh_obj, cmd_to_exec)
     # Command should return a list of running vms. If the current node is
     # not listed then we can assume it is not powered on.
     node_name = _get_hosts_name_for_node(ssh_obj, driver_info)
@@ -240,58 +271,183 @@ def _get_power_status(ssh_obj, driver_info):
     return power_state
 
 
+def _get_host_key(driver_info):
+    return (driver_info['host'], driver_info['username'], driver_info['port'])
+
+
 def _get_connection(node):
     """Returns an SSH client connected to a node.
 
+    Connections are shared by all the nodes on the same host and reused for
+    as long as they stay active.
+
     :param node: the Node.
     :returns: paramiko.SSHClient, an active ssh connection.
 
     """
-    return utils.ssh_connect(_parse_driver_info(node))
+    driver_info = _parse_driver_info(node)
+    key = _get_host_key(driver_info)
+    ssh_obj = SSH_CONNECTIONS.get(key)
+    if ssh_obj is not None:
+        transport = ssh_obj.get_transport()
+        if transport is not None and transport.is_active():
+            return ssh_obj
+        del SSH_CONNECTIONS[key]
+        ssh_obj.close()
 
+    ssh_obj = utils.ssh_connect(driver_info)
+    SSH_CONNECTIONS[key] = ssh_obj
+    return ssh_obj
 
-def _get_hosts_name_for_node(ssh_obj, driver_info):
-    """Get the name the host uses to reference the node.
+
+def _get_mac_inventory(ssh_obj, driver_info):
+    """Get the MAC addresses of every VM on the host with one command.
 
     :param ssh_obj: paramiko.SSHClient, an active ssh connection.
     :param driver_info: information for accessing the node.
-    :returns: the name or None if not found.
+    :returns: a dict mapping each normalized MAC address to the name of
+        the VM it belongs to.
+    :raises: SSHCommandFailed on an error from ssh.
 
     """
-    matched_name = None
-    cmd_to_exec = "%s %s" % (driver_info['cmd_set']['base_cmd'],
-                             driver_info['cmd_set']['list_all'])
-    full_node_list = _ssh_execute(ssh_obj, cmd_to_exec)
-    LOG.debug("Retrieved Node List: %s" % repr(full_node_list))
-    # for each node check Mac Addresses
-    for node in full_node_list:
-        if not node:
+    cmd_set = driver_info['cmd_set']
+    get_node_macs = cmd_set['get_node_macs'].replace('{_NodeName_}',
+                                                     '"$name"')
+    cmd_to_exec = ('%(base)s %(list_all)s | while read -r name; do '
+                   '{ %(base)s %(get_node_macs)s; } </dev/null | '
+                   'while read -r mac; do echo "$mac $name"; done; done'
+                   % {'base': cmd_set['base_cmd'],
+                      'list_all': cmd_set['list_all'],
+                      'get_node_macs': get_node_macs})
+    inventory = {}
+    for line in _ssh_execute(ssh_obj, cmd_to_exec):
+        try:
+            mac, name = line.split(' ', 1)
+        except ValueError:
             continue
-        LOG.debug("Checking Node: %s's Mac address." % node)
+        if mac and name:
+            inventory[_normalize_mac(mac)] = name
+    return inventory
+
+
+def _get_cached_running_list(ssh_obj, driver_info):
+    """Get the VMs running on the node's host, reusing a recent listing.
+
+    One 'list_running' command is sent to each host per
+    CONF.ssh.power_state_cache_timeout seconds; concurrent callers for the
+    same host wait for and share a single listing.
+
+    :param ssh_obj: paramiko.SSHClient, an active ssh connection.
+    :param driver_info: information for accessing the node.
+    :returns: list of the lines listing the running VMs.
+    :raises: SSHCommandFailed on an error from ssh.
+
+    """
+    key = _get_host_key(driver_info)
+    with lockutils.lock('ssh-running-vms-%s@%s:%s' % (key[1], key[0],
+                                                      key[2])):
+        cached = RUNNING_VMS.get(key)
+        if (cached is not None and time.time() - cached[0] <
+                CONF.ssh.power_state_cache_timeout):
+            return cached[1]
+
         cmd_to_exec = "%s %s" % (driver_info['cmd_set']['base_cmd'],
-                                 driver_info['cmd_set']['get_node_macs'])
-        cmd_to_exec = cmd_to_exec.replace('{_NodeName_}', node)
-        hosts_node_mac_list = _ssh_execute(ssh_obj, cmd_to_exec)
+                                 driver_info['cmd_set']['list_running'])
+        running_list = _ssh_execute(ssh_obj, cmd_to_exec)
+        RUNNING_VMS[key] = (time.time(), running_list)
+        return running_list
+
+
+def _invalidate_running_list(driver_info):
+    RUNNING_VMS.pop(_get_host_key(driver_info), None)
 
-        for host_mac in hosts_node_mac_list:
-            if not host_mac:
-                continue
-            for node_mac in driver_info['macs']:
-                if not node_mac:
-                    continue
-                if _normalize_mac(host_mac) in _normalize_mac(node_mac):
-                    LOG.debug("Found Mac address: %s" % node_mac)
-                    matched_name = node
-                    break
-
-            if matched_name:
-                break
-        if matched_name:
-            break
 
+def _get_cached_mac_inventory(ssh_obj, driver_info, stale=None):
+    """Get the MAC inventory of the node's host, reusing a recent one.
+
+    :param ssh_obj: paramiko.SSHClient, an active ssh connection.
+    :param driver_info: information for accessing the node.
+    :param stale: an inventory previously returned by this function which
+        is known to be out of date, and must not be returned again.
+    :returns: a tuple of the inventory, see _get_mac_inventory(), and
+        whether it was just fetched from the host.
+    :raises: SSHCommandFailed on an error from ssh.
+
+    """
+    key = _get_host_key(driver_info)
+    with lockutils.lock('ssh-mac-inventory-%s@%s:%s' % (key[1], key[0],
+                                                        key[2])):
+        cached = MAC_INVENTORIES.get(key)
+        if (cached is not None and cached[1] is not stale and
+                time.time() - cached[0] < CONF.ssh.mac_cache_timeout):
+            return cached[1], False
+
+        inventory = _get_mac_inventory(ssh_obj, driver_info)
+        MAC_INVENTORIES[key] = (time.time(), inventory)
+        return inventory, True
+
+
+def _invalidate_mac_inventory(driver_info):
+    MAC_INVENTORIES.pop(_get_host_key(driver_info), None)
+
+
+def _find_name_in_inventory(inventory, macs):
+    for node_mac in macs:
+        if not node_mac:
+            continue
+        name = inventory.get(_normalize_mac(node_mac))
+        if name:
+            LOG.debug("Found Mac address: %s" % node_mac)
+            return name
+    return None
+
+
+def _get_hosts_name_for_node(ssh_obj, driver_info):
+    """Get the name the host uses to reference the node.
+
+    The node's MAC addresses are looked up in the host's MAC inventory,
+    which is cached for CONF.ssh.mac_cache_timeout seconds. If none of
+    them is found in a cached inventory, it is fetched again in case the
+    VM was defined since.
+
+    :param ssh_obj: paramiko.SSHClient, an active ssh connection.
+    :param driver_info: information for accessing the node.
+    :returns: the name or None if not found.
+
+    """
+    inventory, fetched = _get_cached_mac_inventory(ssh_obj, driver_info)
+    matched_name = _find_name_in_inventory(inventory, driver_info['macs'])
+    if matched_name is None and not fetched:
+        inventory, fetched = _get_cached_mac_inventory(ssh_obj, driver_info,
+                                                       stale=inventory)
+        matched_name = _find_name_in_inventory(inventory,
+                                               driver_info['macs'])
     return matched_name
 
 
+def _exec_on_node(ssh_obj, driver_info, node_name, cmd_name):
+    """Run one of the command set's commands against the node's VM.
+
+    If the command fails the host's cached MAC inventory is dropped, since
+    the VM may have been renamed or removed.
+
+    :param ssh_obj: paramiko.SSHClient, an active ssh connection.
+    :param driver_info: information for accessing the node.
+    :param node_name: the name the host uses to reference the node.
+    :param cmd_name: the key of the command in driver_info['cmd_set'].
+    :raises: SSHCommandFailed on an error from ssh.
+
+    """
+    cmd_to_exec = "%s %s" % (driver_info['cmd_set']['base_cmd'],
+                             driver_info['cmd_set'][cmd_name])
+    cmd_to_exec = cmd_to_exec.replace('{_NodeName_}', node_name)
+    try:
+        _ssh_execute(ssh_obj, cmd_to_exec)
+    except exception.SSHCommandFailed:
+        with excutils.save_and_reraise_exception():
+            _invalidate_mac_inventory(driver_info)
+
+
 def _power_on(ssh_obj, driver_info):
     """Power ON this node.
 
@@ -305,11 +461,7 @@ def _power_on(ssh_obj, driver_info):
         _power_off(ssh_obj, driver_info)
 
     node_name = _get_hosts_name_for_node(ssh_obj, driver_info)
-    cmd_to_power_on = "%s %s" % (driver_info['cmd_set']['base_cmd'],
-                                 driver_info['cmd_set']['start_cmd'])
-    cmd_to_power_on = cmd_to_power_on.replace('{_NodeName_}', node_name)
-
-    _ssh_execute(ssh_obj, cmd_to_power_on)
+    _exec_on_node(ssh_obj, driver_info, node_name, 'start_cmd')
 
     current_pstate = _get_power_status(ssh_obj, driver_info)
     if current_pstate == states.POWER_ON:
@@ -331,11 +483,7 @@ def _power_off(ssh_obj, driver_info):
         return current_pstate
 
     node_name = _get_hosts_name_for_node(ssh_obj, driver_info)
-    cmd_to_power_off = "%s %s" % (driver_info['cmd_set']['base_cmd'],
-                                  driver_info['cmd_set']['stop_cmd'])
-    cmd_to_power_off = cmd_to_power_off.replace('{_NodeName_}', node_name)
-
-    _ssh_execute(ssh_obj, cmd_to_power_off)
+    _exec_on_node(ssh_obj, driver_info, node_name, 'stop_cmd')
 
     current_pstate = _get_power_status(ssh_obj, driver_info)
     if current_pstate == states.POWER_OFF:
@@ -389,7 +537,12 @@ class SSHPower(base.PowerInterface):
         driver_info = _parse_driver_info(task.node)
         driver_info['macs'] = driver_utils.get_node_mac_addresses(task)
         ssh_obj = _get_connection(task.node)
-        return _get_power_status(ssh_obj, driver_info)
+        # NOTE: vmware's list_running only reports on a single VM, so the
+        #       running VMs of the whole host can not be listed at once.
+        use_cache = bool(CONF.ssh.power_state_cache_timeout and
+                         '{_NodeName_}' not in
+                             driver_info['cmd_set']['list_running'])
+        return _get_power_status(ssh_obj, driver_info, use_cache=use_cache)
 
     @task_manager.require_exclusive_lock
     def set_power_state(self, task, pstate):
@@ -411,14 +564,18 @@ class SSHPower(base.PowerInterface):
         driver_info['macs'] = driver_utils.get_node_mac_addresses(task)
         ssh_obj = _get_connection(task.node)
 
-        if pstate == states.POWER_ON:
-            state = _power_on(ssh_obj, driver_info)
-        elif pstate == states.POWER_OFF:
-            state = _power_off(ssh_obj, driver_info)
-        else:
+        if pstate not in (states.POWER_ON, states.POWER_OFF):
             raise exception.InvalidParameterValue(_("set_power_state called "
                     "with invalid power state %s.") % pstate)
 
+        try:
+            if pstate == states.POWER_ON:
+                state = _power_on(ssh_obj, driver_info)
+            else:
+                state = _power_off(ssh_obj, driver_info)
+        finally:
+            _invalidate_running_list(driver_info)
+
         if state != pstate:
             raise exception.PowerStateFailure(pstate=pstate)
 
@@ -439,11 +596,14 @@ class SSHPower(base.PowerInterface):
         driver_info = _parse_driver_info(task.node)
         driver_info['macs'] = driver_utils.get_node_mac_addresses(task)
         ssh_obj = _get_connection(task.node)
-        current_pstate = _get_power_status(ssh_obj, driver_info)
-        if current_pstate == states.POWER_ON:
-            _power_off(ssh_obj, driver_info)
+        try:
+            current_pstate = _get_power_status(ssh_obj, driver_info)
+            if current_pstate == states.POWER_ON:
+                _power_off(ssh_obj, driver_info)
 
-        state = _power_on(ssh_obj, driver_info)
+            state = _power_on(ssh_obj, driver_info)
+        finally:
+            _invalidate_running_list(driver_info)
 
         if state != states.POWER_ON:
             raise exception.PowerStateFailure(pstate=states.POWER_ON)
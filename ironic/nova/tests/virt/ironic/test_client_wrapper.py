@@ -36,6 +36,15 @@ class IronicClientWrapperTestCase(test.NoDBTestCase):
         self.icli = client_wrapper.IronicClientWrapper()
         # Do not waste time sleeping
         cfg.CONF.set_override('api_retry_interval', 0, 'ironic')
+        self._reset_client_cache()
+        self.addCleanup(self._reset_client_cache)
+
+    @staticmethod
+    def _reset_client_cache():
+        client_wrapper.IronicClientWrapper._client = None
+        client_wrapper.IronicClientWrapper._client_kwargs = None
+        client_wrapper.IronicClientWrapper.cache_hits = 0
+        client_wrapper.IronicClientWrapper.cache_misses = 0
 
     @mock.patch.object(client_wrapper.IronicClientWrapper, '_multi_getattr')
     @mock.patch.object(client_wrapper.IronicClientWrapper, '_get_client')
@@ -122,3 +131,45 @@ class IronicClientWrapperTestCase(test.NoDBTestCase):
     def test__multi_getattr_fail(self):
         self.assertRaises(AttributeError, self.icli._multi_getattr,
                           FAKE_CLIENT, "nonexistent")
+
+    @mock.patch.object(ironic_client, 'get_client')
+    def test__get_client_cached(self, mock_ir_cli):
+        self.flags(admin_auth_token='fake-token', group='ironic')
+        client = client_wrapper.IronicClientWrapper()._get_client()
+        self.assertEqual(client,
+                         client_wrapper.IronicClientWrapper()._get_client())
+        self.assertEqual(1, mock_ir_cli.call_count)
+        self.assertEqual(1, client_wrapper.IronicClientWrapper.cache_misses)
+        self.assertEqual(1, client_wrapper.IronicClientWrapper.cache_hits)
+
+    @mock.patch.object(ironic_client, 'get_client')
+    def test__get_client_config_changed(self, mock_ir_cli):
+        mock_ir_cli.side_effect = [mock.sentinel.cli1, mock.sentinel.cli2]
+        self.flags(admin_auth_token='fake-token', group='ironic')
+        self.assertEqual(mock.sentinel.cli1, self.icli._get_client())
+        self.flags(admin_auth_token='other-token', group='ironic')
+        self.assertEqual(mock.sentinel.cli2, self.icli._get_client())
+        self.assertEqual(2, client_wrapper.IronicClientWrapper.cache_misses)
+
+    @mock.patch.object(ironic_client, 'get_client')
+    def test_call_reauthenticates_on_unauthorized(self, mock_ir_cli):
+        cli1 = mock.Mock()
+        cli1.node.list.side_effect = ironic_exception.Unauthorized
+        cli2 = mock.Mock()
+        cli2.node.list.return_value = ['node']
+        mock_ir_cli.side_effect = [cli1, cli2]
+
+        self.assertEqual(['node'], self.icli.call("node.list"))
+
+        self.assertEqual(2, mock_ir_cli.call_count)
+        self.assertEqual(cli2, self.icli._get_client())
+
+    @mock.patch.object(ironic_client, 'get_client')
+    def test_call_unauthorized_twice(self, mock_ir_cli):
+        cli = mock.Mock()
+        cli.node.list.side_effect = ironic_exception.Unauthorized
+        mock_ir_cli.return_value = cli
+
+        self.assertRaises(ironic_exception.Unauthorized,
+                          self.icli.call, "node.list")
+        self.assertEqual(2, mock_ir_cli.call_count)
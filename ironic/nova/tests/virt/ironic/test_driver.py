@@ -17,10 +17,12 @@
 
 """Tests for the ironic driver."""
 
+import eventlet
 from ironicclient import client as ironic_client
 from ironicclient import exc as ironic_exception
 import mock
 from oslo.config import cfg
+import time
 
 from ironic.nova.virt.ironic import client_wrapper as cw
 from ironic.nova.tests.virt.ironic import utils as ironic_utils
@@ -59,13 +61,6 @@ class FakeClientWrapper(cw.IronicClientWrapper):
         return FAKE_CLIENT
 
 
-class FakeLoopingCall(object):
-    def __init__(self):
-        self.wait = mock.MagicMock()
-        self.start = mock.MagicMock()
-        self.start.return_value = self
-
-
 def _get_properties():
     return {'cpus': 2,
             'memory_mb': 512,
@@ -257,8 +252,8 @@ class IronicDriverTestCase(test.NoDBTestCase):
                                           instance_uuid)
 
     @mock.patch.object(cw.IronicClientWrapper, 'call')
-    @mock.patch.object(instance_obj.Instance, 'get_by_uuid')
-    def test_list_instances(self, mock_inst_by_uuid, mock_call):
+    @mock.patch.object(instance_obj.InstanceList, 'get_by_filters')
+    def test_list_instances(self, mock_inst_by_filters, mock_call):
         nodes = []
         instances = []
         for i in range(2):
@@ -266,32 +261,63 @@ class IronicDriverTestCase(test.NoDBTestCase):
             instances.append(fake_instance.fake_instance_obj(self.ctx,
                                                              id=i,
                                                              uuid=uuid))
-            nodes.append(ironic_utils.get_test_node(instance_uuid=uuid))
+            nodes.append(ironic_utils.get_test_node(
+                                      uuid=uuidutils.generate_uuid(),
+                                      instance_uuid=uuid))
 
-        mock_inst_by_uuid.side_effect = instances
+        mock_inst_by_filters.return_value = instances
         mock_call.return_value = nodes
 
         response = self.driver.list_instances()
-        mock_call.assert_called_with("node.list", associated=True)
-        expected_calls = [mock.call(mock.ANY, instances[0].uuid),
-                          mock.call(mock.ANY, instances[1].uuid)]
-        mock_inst_by_uuid.assert_has_calls(expected_calls)
+        mock_call.assert_called_once_with("node.list", associated=True,
+                                          limit=0)
+        mock_inst_by_filters.assert_called_once_with(mock.ANY,
+                                                     {'uuid': mock.ANY})
+        filters = mock_inst_by_filters.call_args[0][1]
+        self.assertEqual(sorted(i.uuid for i in instances),
+                         sorted(filters['uuid']))
         self.assertEqual(['instance-00000000', 'instance-00000001'],
                           sorted(response))
 
+    @mock.patch.object(cw.IronicClientWrapper, 'call')
+    @mock.patch.object(instance_obj.InstanceList, 'get_by_filters')
+    def test_list_instances_none(self, mock_inst_by_filters, mock_call):
+        mock_call.return_value = []
+        self.assertEqual([], self.driver.list_instances())
+        self.assertFalse(mock_inst_by_filters.called)
+
     @mock.patch.object(cw.IronicClientWrapper, 'call')
     def test_list_instance_uuids(self, mock_call):
         num_nodes = 2
         nodes = []
         for n in range(num_nodes):
             nodes.append(ironic_utils.get_test_node(
+                                      uuid=uuidutils.generate_uuid(),
                                       instance_uuid=uuidutils.generate_uuid()))
 
         mock_call.return_value = nodes
         uuids = self.driver.list_instance_uuids()
-        mock_call.assert_called_with('node.list', associated=True)
+        mock_call.assert_called_once_with('node.list', associated=True,
+                                          limit=0)
         expected = [n.instance_uuid for n in nodes]
         self.assertEqual(sorted(expected), sorted(uuids))
+        # The associated nodes are not kept as the node snapshot
+        self.assertEqual({}, self.driver.node_cache)
+
+    @mock.patch.object(cw.IronicClientWrapper, 'call')
+    def test_list_instance_uuids_cached(self, mock_call):
+        nodes = [ironic_utils.get_test_node(
+                                  uuid=uuidutils.generate_uuid(),
+                                  instance_uuid=uuidutils.generate_uuid()),
+                 ironic_utils.get_test_node(uuid=uuidutils.generate_uuid())]
+        self.driver.node_cache = dict((n.uuid, n) for n in nodes)
+        self.driver.node_cache_time = time.time()
+
+        uuids = self.driver.list_instance_uuids()
+
+        # The snapshot is used while it is within node_cache_timeout
+        self.assertFalse(mock_call.called)
+        self.assertEqual([nodes[0].instance_uuid], uuids)
 
     @mock.patch.object(FAKE_CLIENT.node, 'get')
     def test_node_is_available(self, mock_get):
@@ -303,6 +329,15 @@ class IronicDriverTestCase(test.NoDBTestCase):
         mock_get.side_effect = ironic_exception.NotFound
         self.assertFalse(self.driver.node_is_available(node.uuid))
 
+    @mock.patch.object(FAKE_CLIENT.node, 'get')
+    @mock.patch.object(FAKE_CLIENT.node, 'list')
+    def test_node_is_available_cached(self, mock_list, mock_get):
+        node = ironic_utils.get_test_node()
+        mock_list.return_value = [node]
+        self.driver.get_available_nodes()
+        self.assertTrue(self.driver.node_is_available(node.uuid))
+        self.assertFalse(mock_get.called)
+
     def test__node_resources_unavailable(self):
         node_dicts = [
             # a node in maintenance /w no instance and power OFF
@@ -345,6 +380,9 @@ class IronicDriverTestCase(test.NoDBTestCase):
         available_nodes = self.driver.get_available_nodes()
         expected_uuids = [n['uuid'] for n in node_dicts]
         self.assertEqual(sorted(expected_uuids), sorted(available_nodes))
+        mock_list.assert_called_once_with(detail=True, limit=0)
+        self.assertEqual(dict((n.uuid, n) for n in nodes),
+                         self.driver.node_cache)
 
     @mock.patch.object(FAKE_CLIENT.node, 'get')
     @mock.patch.object(ironic_driver.IronicDriver, '_node_resource')
@@ -357,6 +395,32 @@ class IronicDriverTestCase(test.NoDBTestCase):
         self.assertEqual(fake_resource, result)
         mock_nr.assert_called_once_with(node)
 
+    @mock.patch.object(FAKE_CLIENT.node, 'get')
+    @mock.patch.object(FAKE_CLIENT.node, 'list')
+    @mock.patch.object(ironic_driver.IronicDriver, '_node_resource')
+    def test_get_available_resource_cached(self, mock_nr, mock_list,
+                                           mock_get):
+        node = ironic_utils.get_test_node()
+        mock_list.return_value = [node]
+        self.driver.get_available_nodes()
+        self.driver.get_available_resource(node.uuid)
+        mock_nr.assert_called_once_with(node)
+        self.assertFalse(mock_get.called)
+
+    @mock.patch.object(FAKE_CLIENT.node, 'get')
+    @mock.patch.object(FAKE_CLIENT.node, 'list')
+    @mock.patch.object(ironic_driver.IronicDriver, '_node_resource')
+    def test_get_available_resource_stale_cache(self, mock_nr, mock_list,
+                                                mock_get):
+        self.flags(node_cache_timeout=0, group='ironic')
+        node = ironic_utils.get_test_node()
+        mock_list.return_value = [node]
+        mock_get.return_value = node
+        self.driver.get_available_nodes()
+        self.driver.get_available_resource(node.uuid)
+        mock_get.assert_called_once_with(node.uuid)
+        mock_nr.assert_called_once_with(node)
+
     @mock.patch.object(FAKE_CLIENT.node, 'get_by_instance_uuid')
     def test_get_info(self, mock_gbiu):
         instance_uuid = 'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'
@@ -381,6 +445,41 @@ class IronicDriverTestCase(test.NoDBTestCase):
         result = self.driver.get_info(instance)
         self.assertEqual(expected, result)
 
+    @mock.patch.object(FAKE_CLIENT.node, 'get_by_instance_uuid')
+    @mock.patch.object(FAKE_CLIENT.node, 'list')
+    def test_get_info_cached(self, mock_list, mock_gbiu):
+        instance_uuid = 'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'
+        properties = {'memory_mb': 512, 'cpus': 2}
+        node = ironic_utils.get_test_node(instance_uuid=instance_uuid,
+                                          properties=properties,
+                                          power_state=ironic_states.POWER_OFF)
+        mock_list.return_value = [node]
+        self.driver.get_available_nodes()
+
+        instance = fake_instance.fake_instance_obj('fake-context',
+                                                   uuid=instance_uuid,
+                                                   node=node.uuid)
+        result = self.driver.get_info(instance)
+        self.assertEqual(nova_states.SHUTDOWN, result['state'])
+        self.assertFalse(mock_gbiu.called)
+
+    @mock.patch.object(FAKE_CLIENT.node, 'get_by_instance_uuid')
+    @mock.patch.object(FAKE_CLIENT.node, 'list')
+    def test_get_info_cached_other_instance(self, mock_list, mock_gbiu):
+        node = ironic_utils.get_test_node(
+                                  instance_uuid=uuidutils.generate_uuid())
+        mock_list.return_value = [node]
+        mock_gbiu.side_effect = ironic_exception.NotFound()
+        self.driver.get_available_nodes()
+
+        instance = fake_instance.fake_instance_obj(
+                                  'fake-context',
+                                  uuid=uuidutils.generate_uuid(),
+                                  node=node.uuid)
+        result = self.driver.get_info(instance)
+        self.assertEqual(nova_states.NOSTATE, result['state'])
+        mock_gbiu.assert_called_once_with(instance['uuid'])
+
     @mock.patch.object(FAKE_CLIENT.node, 'get_by_instance_uuid')
     def test_get_info_http_not_found(self, mock_gbiu):
         mock_gbiu.side_effect = ironic_exception.NotFound()
@@ -417,7 +516,7 @@ class IronicDriverTestCase(test.NoDBTestCase):
         self.assertEqual([], result)
 
     @mock.patch.object(instance_obj.Instance, 'save')
-    @mock.patch.object(loopingcall, 'FixedIntervalLoopingCall')
+    @mock.patch.object(ironic_driver.NodeStateWaiter, 'wait')
     @mock.patch.object(FAKE_CLIENT, 'node')
     @mock.patch.object(flavor_obj.Flavor, 'get_by_id')
     @mock.patch.object(ironic_driver.IronicDriver, '_wait_for_active')
@@ -425,7 +524,7 @@ class IronicDriverTestCase(test.NoDBTestCase):
     @mock.patch.object(ironic_driver.IronicDriver, '_plug_vifs')
     @mock.patch.object(ironic_driver.IronicDriver, '_start_firewall')
     def test_spawn(self, mock_sf, mock_pvifs, mock_adf, mock_wait_active,
-                   mock_fg_bid, mock_node, mock_looping, mock_save):
+                   mock_fg_bid, mock_node, mock_waiter, mock_save):
         node_uuid = 'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'
         node = ironic_utils.get_test_node(driver='fake', uuid=node_uuid)
         instance = fake_instance.fake_instance_obj(self.ctx, node=node_uuid)
@@ -437,9 +536,6 @@ class IronicDriverTestCase(test.NoDBTestCase):
         mock_node.set_provision_state.return_value = mock.MagicMock()
         mock_fg_bid.return_value = fake_flavor
 
-        fake_looping_call = FakeLoopingCall()
-        mock_looping.return_value = fake_looping_call
-
         self.driver.spawn(self.ctx, instance, None, [], None)
 
         mock_node.get.assert_called_once_with(node_uuid)
@@ -455,14 +551,10 @@ class IronicDriverTestCase(test.NoDBTestCase):
         self.assertIsNone(instance['default_ephemeral_device'])
         self.assertFalse(mock_save.called)
 
-        mock_looping.assert_called_once_with(mock_wait_active,
-                                             FAKE_CLIENT_WRAPPER,
-                                             instance)
-        fake_looping_call.start.assert_called_once_with(
-            interval=CONF.ironic.api_retry_interval)
-        fake_looping_call.wait.assert_called_once()
+        mock_waiter.assert_called_once_with(node_uuid, instance,
+                                            mock_wait_active)
 
-    @mock.patch.object(loopingcall, 'FixedIntervalLoopingCall')
+    @mock.patch.object(ironic_driver.NodeStateWaiter, 'wait')
     @mock.patch.object(FAKE_CLIENT, 'node')
     @mock.patch.object(flavor_obj.Flavor, 'get_by_id')
     @mock.patch.object(ironic_driver.IronicDriver, 'destroy')
@@ -473,7 +565,7 @@ class IronicDriverTestCase(test.NoDBTestCase):
     def test_spawn_destroyed_after_failure(self, mock_sf, mock_pvifs, mock_adf,
                                            mock_wait_active, mock_destroy,
                                            mock_fg_bid, mock_node,
-                                           mock_looping):
+                                           mock_waiter):
         node_uuid = 'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'
         node = ironic_utils.get_test_node(driver='fake', uuid=node_uuid)
         instance = fake_instance.fake_instance_obj(self.ctx, node=node_uuid)
@@ -485,11 +577,8 @@ class IronicDriverTestCase(test.NoDBTestCase):
         mock_node.set_provision_state.return_value = mock.MagicMock()
         mock_fg_bid.return_value = fake_flavor
 
-        fake_looping_call = FakeLoopingCall()
-        mock_looping.return_value = fake_looping_call
-
         deploy_exc = exception.InstanceDeployFailure('foo')
-        fake_looping_call.wait.side_effect = deploy_exc
+        mock_waiter.side_effect = deploy_exc
         self.assertRaises(
             exception.InstanceDeployFailure,
             self.driver.spawn, self.ctx, instance, None, [], None)
@@ -641,7 +730,7 @@ class IronicDriverTestCase(test.NoDBTestCase):
                                             instance['instance_type_id'])
         mock_cleanup_deploy.assert_called_once_with(node, instance, None)
 
-    @mock.patch.object(loopingcall, 'FixedIntervalLoopingCall')
+    @mock.patch.object(ironic_driver.NodeStateWaiter, 'wait')
     @mock.patch.object(instance_obj.Instance, 'save')
     @mock.patch.object(FAKE_CLIENT, 'node')
     @mock.patch.object(flavor_obj.Flavor, 'get_by_id')
@@ -651,7 +740,7 @@ class IronicDriverTestCase(test.NoDBTestCase):
     def test_spawn_sets_default_ephemeral_device(self, mock_sf, mock_pvifs,
                                                  mock_wait, mock_flavor,
                                                  mock_node, mock_save,
-                                                 mock_looping):
+                                                 mock_waiter):
         node_uuid = 'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'
         node = ironic_utils.get_test_node(driver='fake', uuid=node_uuid)
         instance = fake_instance.fake_instance_obj(self.ctx, node=node_uuid)
@@ -672,14 +761,16 @@ class IronicDriverTestCase(test.NoDBTestCase):
         node_uuid = 'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'
         network_info = 'foo'
 
+        instance = fake_instance.fake_instance_obj(self.ctx, node=node_uuid)
         node = ironic_utils.get_test_node(driver='fake', uuid=node_uuid,
+                                          instance_uuid=instance.uuid,
                                           provision_state=ironic_states.ACTIVE)
-        instance = fake_instance.fake_instance_obj(self.ctx, node=node_uuid)
 
         def fake_set_provision_state(*_):
             node.provision_state = None
 
         mock_node.get_by_instance_uuid.return_value = node
+        mock_node.list.return_value = [node]
         mock_node.set_provision_state.side_effect = fake_set_provision_state
         self.driver.destroy(self.ctx, instance, network_info, None)
         mock_node.set_provision_state.assert_called_once_with(node_uuid,
@@ -720,14 +811,16 @@ class IronicDriverTestCase(test.NoDBTestCase):
     @mock.patch.object(FAKE_CLIENT, 'node')
     def test_destroy_unprovision_fail(self, mock_node):
         node_uuid = 'aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee'
+        instance = fake_instance.fake_instance_obj(self.ctx, node=node_uuid)
         node = ironic_utils.get_test_node(driver='fake', uuid=node_uuid,
+                                          instance_uuid=instance.uuid,
                                           provision_state=ironic_states.ACTIVE)
-        instance = fake_instance.fake_instance_obj(self.ctx, node=node_uuid)
 
         def fake_set_provision_state(*_):
             node.provision_state = ironic_states.ERROR
 
         mock_node.get_by_instance_uuid.return_value = node
+        mock_node.list.return_value = [node]
         self.assertRaises(exception.NovaException, self.driver.destroy,
                           self.ctx, instance, None, None)
         mock_node.set_provision_state.assert_called_once_with(node_uuid,
@@ -768,9 +861,11 @@ class IronicDriverTestCase(test.NoDBTestCase):
         instance_uuid = uuidutils.generate_uuid()
         instance = fake_instance.fake_instance_obj(self.ctx,
                                                    node=instance_uuid)
+        self.driver.node_cache = {node_uuid: node}
 
         self.driver.power_off(instance)
         mock_sp.assert_called_once_with(node_uuid, 'off')
+        self.assertNotIn(node_uuid, self.driver.node_cache)
 
     @mock.patch.object(ironic_driver, 'validate_instance_and_node')
     @mock.patch.object(FAKE_CLIENT.node, 'set_power_state')
@@ -956,14 +1051,14 @@ class IronicDriverTestCase(test.NoDBTestCase):
         mock_risr.assert_called_once_with(fake_group)
 
     @mock.patch.object(ironic_driver.IronicDriver, '_wait_for_active')
-    @mock.patch.object(loopingcall, 'FixedIntervalLoopingCall')
+    @mock.patch.object(ironic_driver.NodeStateWaiter, 'wait')
     @mock.patch.object(FAKE_CLIENT.node, 'set_provision_state')
     @mock.patch.object(flavor_obj.Flavor, 'get_by_id')
     @mock.patch.object(ironic_driver.IronicDriver, '_add_driver_fields')
     @mock.patch.object(FAKE_CLIENT.node, 'get')
     @mock.patch.object(instance_obj.Instance, 'save')
     def _test_rebuild(self, mock_save, mock_get, mock_driver_fields,
-                      mock_fg_bid, mock_set_pstate, mock_looping,
+                      mock_fg_bid, mock_set_pstate, mock_waiter,
                       mock_wait_active, preserve=False):
         node_uuid = uuidutils.generate_uuid()
         instance_uuid = uuidutils.generate_uuid()
@@ -982,10 +1077,6 @@ class IronicDriverTestCase(test.NoDBTestCase):
                                                    node=node_uuid,
                                                    instance_type_id=flavor_id)
 
-
-        fake_looping_call = FakeLoopingCall()
-        mock_looping.return_value = fake_looping_call
-
         self.driver.rebuild(
             context=self.ctx, instance=instance, image_meta=image_meta,
             injected_files=None, admin_password=None, bdms=None,
@@ -998,12 +1089,8 @@ class IronicDriverTestCase(test.NoDBTestCase):
                                                    flavor, preserve)
         mock_set_pstate.assert_called_once_with(node_uuid,
                                                 ironic_states.REBUILD)
-        mock_looping.assert_called_once_with(mock_wait_active,
-                                             FAKE_CLIENT_WRAPPER,
-                                             instance)
-        fake_looping_call.start.assert_called_once_with(
-            interval=CONF.ironic.api_retry_interval)
-        fake_looping_call.wait.assert_called_once()
+        mock_waiter.assert_called_once_with(node_uuid, instance,
+                                            mock_wait_active)
 
     def test_rebuild_preserve_ephemeral(self):
         self._test_rebuild(preserve=True)
@@ -1047,3 +1134,171 @@ class IronicDriverTestCase(test.NoDBTestCase):
                 context=self.ctx, instance=instance, image_meta=image_meta,
                 injected_files=None, admin_password=None, bdms=None,
                 detach_block_devices=None, attach_block_devices=None)
+
+
+@mock.patch.object(cw, 'IronicClientWrapper', lambda *_: FAKE_CLIENT_WRAPPER)
+@mock.patch.object(FAKE_CLIENT.node, 'list')
+class NodeStateWaiterTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(NodeStateWaiterTestCase, self).setUp()
+        self.flags(api_retry_interval=0, group='ironic')
+        self.waiter = ironic_driver.NodeStateWaiter()
+        self.ctx = nova_context.get_admin_context()
+
+    def _get_node_and_instance(self, **kw):
+        instance = fake_instance.fake_instance_obj(
+                                  self.ctx, uuid=uuidutils.generate_uuid())
+        node = ironic_utils.get_test_node(uuid=uuidutils.generate_uuid(),
+                                          instance_uuid=instance.uuid, **kw)
+        return node, instance
+
+    @staticmethod
+    def _check_active(node, instance):
+        if node.provision_state == ironic_states.ACTIVE:
+            raise loopingcall.LoopingCallDone()
+
+    def test_wait(self, mock_list):
+        node, instance = self._get_node_and_instance(
+                                  provision_state=ironic_states.DEPLOYING)
+
+        def fake_list(**kw):
+            if mock_list.call_count == 2:
+                node.provision_state = ironic_states.ACTIVE
+            return [node]
+
+        mock_list.side_effect = fake_list
+        self.waiter.wait(node.uuid, instance, self._check_active)
+        self.assertEqual(2, mock_list.call_count)
+        mock_list.assert_called_with(detail=True, limit=0)
+        self.assertIsNone(self.waiter._poller)
+
+    def test_wait_shares_list_call(self, mock_list):
+        nodes = []
+        threads = []
+        for i in range(3):
+            node, instance = self._get_node_and_instance(
+                                  provision_state=ironic_states.ACTIVE)
+            nodes.append(node)
+            threads.append(eventlet.spawn(self.waiter.wait, node.uuid,
+                                          instance, self._check_active))
+        mock_list.return_value = nodes
+        for thread in threads:
+            thread.wait()
+        mock_list.assert_called_once_with(detail=True, limit=0)
+
+    @mock.patch.object(ironic_driver.time, 'time')
+    def test_poll_checks_every_wait(self, mock_time, mock_list):
+        self.flags(api_retry_interval=2, api_max_poll_interval=10,
+                   group='ironic')
+        mock_time.return_value = 100
+        node1, instance1 = self._get_node_and_instance()
+        node2, instance2 = self._get_node_and_instance()
+        mock_list.return_value = [node1, node2]
+        w1 = ironic_driver._NodeWait(node1.uuid, instance1, mock.Mock())
+        w1.interval = 10
+        w2 = ironic_driver._NodeWait(node2.uuid, instance2, mock.Mock())
+        self.waiter._waits = set([w1, w2])
+        self.waiter._last_poll = 99
+
+        def fake_sleep(seconds):
+            mock_time.return_value += seconds
+
+        with mock.patch.object(self.waiter, '_check') as mock_check:
+            mock_check.side_effect = lambda waits: self.waiter._waits.clear()
+            with mock.patch.object(self.waiter, '_sleep') as mock_sleep:
+                mock_sleep.side_effect = fake_sleep
+                self.waiter._poll()
+
+        # The poll is due after the shortest interval of any wait, and
+        # then checks all of them against the same node list.
+        mock_sleep.assert_called_once_with(1)
+        mock_check.assert_called_once_with(mock.ANY)
+        self.assertEqual(set([w1, w2]), set(mock_check.call_args[0][0]))
+
+    def test_wait_wakes_sleeping_poller(self, mock_list):
+        self.flags(api_retry_interval=1, api_max_poll_interval=3600,
+                   group='ironic')
+        node1, instance1 = self._get_node_and_instance(
+                                  provision_state=ironic_states.DEPLOYING)
+        node2, instance2 = self._get_node_and_instance(
+                                  provision_state=ironic_states.ACTIVE)
+        mock_list.return_value = [node1, node2]
+        w1 = ironic_driver._NodeWait(node1.uuid, instance1,
+                                     self._check_active)
+        w1.interval = 3600
+        self.waiter._waits.add(w1)
+        self.waiter._last_poll = time.time() - 1
+        self.waiter._poller = eventlet.spawn(self.waiter._poll)
+        eventlet.sleep(0)
+
+        self.waiter.wait(node2.uuid, instance2, self._check_active)
+
+        mock_list.assert_called_once_with(detail=True, limit=0)
+        self.waiter._poller.kill()
+
+    def test_wait_check_fails(self, mock_list):
+        node, instance = self._get_node_and_instance()
+        mock_list.return_value = [node]
+        check = mock.Mock(side_effect=exception.InstanceDeployFailure('foo'))
+        self.assertRaises(exception.InstanceDeployFailure,
+                          self.waiter.wait, node.uuid, instance, check)
+        check.assert_called_once_with(node, instance)
+
+    def test_wait_node_not_associated(self, mock_list):
+        node, instance = self._get_node_and_instance()
+        node.instance_uuid = uuidutils.generate_uuid()
+        mock_list.return_value = [node]
+        check = mock.Mock()
+        self.assertRaises(exception.InstanceNotFound,
+                          self.waiter.wait, node.uuid, instance, check)
+        self.assertFalse(check.called)
+
+    @mock.patch.object(FAKE_CLIENT.node, 'get_by_instance_uuid')
+    def test_wait_node_not_listed(self, mock_gbiu, mock_list):
+        node, instance = self._get_node_and_instance(
+                                  provision_state=ironic_states.ACTIVE)
+        mock_list.return_value = []
+        mock_gbiu.return_value = node
+        check = mock.Mock(side_effect=loopingcall.LoopingCallDone())
+
+        self.waiter.wait(node.uuid, instance, check)
+
+        mock_gbiu.assert_called_once_with(instance.uuid)
+        check.assert_called_once_with(node, instance)
+
+    @mock.patch.object(FAKE_CLIENT.node, 'get_by_instance_uuid')
+    def test_wait_node_not_found(self, mock_gbiu, mock_list):
+        node, instance = self._get_node_and_instance()
+        mock_list.return_value = []
+        mock_gbiu.side_effect = ironic_exception.NotFound()
+        check = mock.Mock()
+        self.assertRaises(exception.InstanceNotFound,
+                          self.waiter.wait, node.uuid, instance, check)
+        self.assertFalse(check.called)
+
+    def test_wait_list_fails(self, mock_list):
+        node, instance = self._get_node_and_instance()
+        mock_list.side_effect = ironic_exception.BadRequest()
+        self.assertRaises(ironic_exception.BadRequest,
+                          self.waiter.wait, node.uuid, instance,
+                          self._check_active)
+
+    @mock.patch.object(ironic_driver.time, 'time')
+    def test_reschedule_backoff(self, mock_time, mock_list):
+        self.flags(api_retry_interval=2, api_max_poll_interval=5,
+                   group='ironic')
+        mock_time.return_value = 100
+        node, instance = self._get_node_and_instance(
+                                  provision_state=ironic_states.DEPLOYWAIT)
+        w = ironic_driver._NodeWait(node.uuid, instance, None)
+
+        intervals = []
+        for i in range(4):
+            w.reschedule(node)
+            intervals.append(w.interval)
+        self.assertEqual([2, 4, 5, 5], intervals)
+
+        node.provision_state = ironic_states.DEPLOYING
+        w.reschedule(node)
+        self.assertEqual(2, w.interval)
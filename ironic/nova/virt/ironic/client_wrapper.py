@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
 import time
 
 from ironicclient import client as ironic_client
@@ -30,31 +31,81 @@ CONF = cfg.CONF
 
 
 class IronicClientWrapper(object):
-    """Ironic client wrapper class that encapsulates retry logic."""
+    """Ironic client wrapper class that encapsulates retry logic.
 
-    def _get_client(self):
-        # TODO(deva): save and reuse existing client & auth token
-        #             until it expires or is no longer valid
+    The Ironic client, and with it the auth token, is shared by every
+    wrapper in the process. It is reused until Ironic rejects the token or
+    the client configuration changes.
+    """
+
+    _client = None
+    _client_kwargs = None
+    _client_lock = threading.Lock()
+
+    cache_hits = 0
+    """Number of times the shared client was reused."""
+    cache_misses = 0
+    """Number of times a new client had to be created."""
+
+    def _get_client_kwargs(self):
         auth_token = CONF.ironic.admin_auth_token
         if auth_token is None:
-            kwargs = {'os_username': CONF.ironic.admin_username,
-                      'os_password': CONF.ironic.admin_password,
-                      'os_auth_url': CONF.ironic.admin_url,
-                      'os_tenant_name': CONF.ironic.admin_tenant_name,
-                      'os_service_type': 'baremetal',
-                      'os_endpoint_type': 'public'}
+            return {'os_username': CONF.ironic.admin_username,
+                    'os_password': CONF.ironic.admin_password,
+                    'os_auth_url': CONF.ironic.admin_url,
+                    'os_tenant_name': CONF.ironic.admin_tenant_name,
+                    'os_service_type': 'baremetal',
+                    'os_endpoint_type': 'public'}
         else:
-            kwargs = {'os_auth_token': auth_token,
-                      'ironic_url': CONF.ironic.api_endpoint}
+            return {'os_auth_token': auth_token,
+                    'ironic_url': CONF.ironic.api_endpoint}
 
+    def _get_client(self):
+        kwargs = self._get_client_kwargs()
+        cache_key = (CONF.ironic.api_version, kwargs)
+        cls = IronicClientWrapper
+
+        # NOTE: the lock is held while authenticating so that concurrent
+        #       callers wait for a single new token instead of each
+        #       requesting one.
+        with cls._client_lock:
+            if cls._client is not None and cls._client_kwargs == cache_key:
+                cls.cache_hits += 1
+                return cls._client
+
+            cls.cache_misses += 1
+            try:
+                cli = ironic_client.get_client(CONF.ironic.api_version,
+                                               **kwargs)
+            except ironic_exception.Unauthorized:
+                msg = (_("Unable to authenticate Ironic client."))
+                LOG.error(msg)
+                raise exception.NovaException(msg)
+
+            cls._client = cli
+            cls._client_kwargs = cache_key
+            return cli
+
+    def _invalidate_client(self, client):
+        """Stop sharing a client whose auth token was rejected."""
+        cls = IronicClientWrapper
+        with cls._client_lock:
+            if cls._client is client:
+                cls._client = None
+                cls._client_kwargs = None
+
+    def _call_client(self, method, *args, **kwargs):
+        client = self._get_client()
         try:
-            cli = ironic_client.get_client(CONF.ironic.api_version, **kwargs)
+            return self._multi_getattr(client, method)(*args, **kwargs)
         except ironic_exception.Unauthorized:
-            msg = (_("Unable to authenticate Ironic client."))
-            LOG.error(msg)
-            raise exception.NovaException(msg)
-
-        return cli
+            # The shared token has expired or was revoked; authenticate
+            # again and retry once.
+            LOG.debug("Ironic rejected the auth token for '%s', "
+                      "re-authenticating.", method)
+            self._invalidate_client(client)
+            client = self._get_client()
+            return self._multi_getattr(client, method)(*args, **kwargs)
 
     def _multi_getattr(self, obj, attr):
         """Support nested attribute path for getattr().
@@ -84,9 +135,8 @@ class IronicClientWrapper(object):
         num_attempts = CONF.ironic.api_max_retries
 
         for attempt in range(1, num_attempts + 1):
-            client = self._get_client()
             try:
-                return self._multi_getattr(client, method)(*args, **kwargs)
+                return self._call_client(method, *args, **kwargs)
             except retry_excs:
                 msg = (_("Error contacting Ironic server for '%(method)s'. "
                          "Attempt %(attempt)d of %(total)d")
@@ -21,7 +21,11 @@ A driver wrapping the Ironic API, such that Nova may provision
 bare metal resources.
 """
 import logging as py_logging
+import time
 
+from eventlet import event
+from eventlet import greenthread
+from eventlet import timeout
 from ironicclient import exc as ironic_exception
 from oslo.config import cfg
 
@@ -81,6 +85,19 @@ opts = [
                default=2,
                help=('How often to retry in seconds when a request '
                      'does conflict')),
+    cfg.IntOpt('api_max_poll_interval',
+               default=30,
+               help=('Upper bound in seconds for the interval at which a '
+                     'node is polled while waiting for a deploy or an '
+                     'undeploy to finish. The interval starts at '
+                     'api_retry_interval and doubles for as long as the '
+                     'node stays in the same provision state.')),
+    cfg.IntOpt('node_cache_timeout',
+               default=60,
+               help=('How long, in seconds, the detailed node list fetched '
+                     'for the resource audit is used to answer node and '
+                     'instance queries before it is fetched again. Set to 0 '
+                     'to always query the Ironic API.')),
     ]
 
 ironic_group = cfg.OptGroup(name='ironic',
@@ -158,6 +175,121 @@ def _log_ironic_polling(what, node, instance):
               instance=instance)
 
 
+class _NodeWait(object):
+    """A single wait registered with a NodeStateWaiter."""
+
+    def __init__(self, node_uuid, instance, check):
+        self.node_uuid = node_uuid
+        self.instance = instance
+        self.check = check
+        self.event = event.Event()
+        self.interval = CONF.ironic.api_retry_interval
+        self.phase = None
+
+    def reschedule(self, node):
+        """Pick the poll interval from the provision state just seen."""
+        phase = (node.provision_state, node.target_provision_state)
+        if phase == self.phase:
+            self.interval = max(min(self.interval * 2,
+                                    CONF.ironic.api_max_poll_interval),
+                                CONF.ironic.api_retry_interval)
+        else:
+            self.phase = phase
+            self.interval = CONF.ironic.api_retry_interval
+
+
+class NodeStateWaiter(object):
+    """Wait for nodes to change state, with one API query per poll.
+
+    Every deploy and undeploy in progress registers the node it waits on
+    together with a check function. A single greenthread lists the nodes
+    and hands every check its own node; the check raises LoopingCallDone
+    once the node reached the wanted state, or any other exception to fail
+    the wait. The nodes are listed again after the shortest interval any
+    of the waits asks for.
+    """
+
+    def __init__(self):
+        self._waits = set()
+        self._poller = None
+        self._wakeup = event.Event()
+        self._last_poll = 0
+
+    def wait(self, node_uuid, instance, check):
+        """Block until check() is done with the node, or raise its error.
+
+        :param node_uuid: the UUID of the node to watch.
+        :param instance: the instance object the node is associated with.
+        :param check: a callable taking (node, instance).
+        """
+        w = _NodeWait(node_uuid, instance, check)
+        self._waits.add(w)
+        if self._poller is None:
+            self._poller = greenthread.spawn(self._poll)
+        elif not self._wakeup.ready():
+            # The poller may be sleeping for longer than the new wait's
+            # interval.
+            self._wakeup.send()
+        try:
+            return w.event.wait()
+        finally:
+            self._waits.discard(w)
+
+    def _finish(self, w, exc=None):
+        self._waits.discard(w)
+        if exc is None:
+            w.event.send()
+        else:
+            w.event.send_exception(exc)
+
+    def _sleep(self, seconds):
+        """Sleep until the next poll is due, or a wait is registered."""
+        with timeout.Timeout(seconds, False):
+            self._wakeup.wait()
+        self._wakeup = event.Event()
+
+    def _poll(self):
+        try:
+            while self._waits:
+                interval = min(w.interval for w in self._waits)
+                delay = self._last_poll + interval - time.time()
+                if delay > 0:
+                    self._sleep(delay)
+                    continue
+                self._last_poll = time.time()
+                self._check(list(self._waits))
+        finally:
+            self._poller = None
+
+    def _check(self, waits):
+        icli = client_wrapper.IronicClientWrapper()
+        try:
+            node_list = icli.call('node.list', detail=True, limit=0)
+        except Exception as e:
+            for w in waits:
+                self._finish(w, exc=e)
+            return
+
+        nodes = dict((n.uuid, n) for n in node_list)
+        for w in waits:
+            instance_uuid = w.instance['uuid']
+            node = nodes.get(w.node_uuid)
+            try:
+                if node is None:
+                    # Look the node up on its own before failing the wait,
+                    # in case it was missed by the list.
+                    node = validate_instance_and_node(icli, w.instance)
+                if node.instance_uuid != instance_uuid:
+                    raise exception.InstanceNotFound(instance_id=instance_uuid)
+                w.check(node, w.instance)
+            except loopingcall.LoopingCallDone:
+                self._finish(w)
+            except Exception as e:
+                self._finish(w, exc=e)
+            else:
+                w.reschedule(node)
+
+
 class IronicDriver(virt_driver.ComputeDriver):
     """Hypervisor driver for Ironic - bare metal provisioning."""
 
@@ -184,6 +316,39 @@ class IronicDriver(virt_driver.ComputeDriver):
             logger = py_logging.getLogger('ironicclient')
             logger.setLevel(level)
 
+        # Snapshot of the detailed node list, keyed by node uuid, which is
+        # refreshed once per resource audit.
+        self.node_cache = {}
+        self.node_cache_time = 0
+
+        self.node_waiter = NodeStateWaiter()
+
+    def _refresh_cache(self):
+        icli = client_wrapper.IronicClientWrapper()
+        node_list = icli.call('node.list', detail=True, limit=0)
+        self.node_cache = dict((n.uuid, n) for n in node_list)
+        self.node_cache_time = time.time()
+
+    def _node_cache_is_fresh(self):
+        return (time.time() - self.node_cache_time <
+                CONF.ironic.node_cache_timeout)
+
+    def _get_cached_node(self, node_uuid):
+        """Return a node from the snapshot, or from Ironic on a miss.
+
+        :raises: ironicclient NotFound if the node does not exist.
+        """
+        if self._node_cache_is_fresh():
+            node = self.node_cache.get(node_uuid)
+            if node is not None:
+                return node
+        icli = client_wrapper.IronicClientWrapper()
+        return icli.call('node.get', node_uuid)
+
+    def _invalidate_cached_node(self, node_uuid):
+        """Drop a node the driver is about to change from the snapshot."""
+        self.node_cache.pop(node_uuid, None)
+
     def _node_resources_unavailable(self, node_obj):
         """Determines whether the node's resources should be presented
         to Nova for use based on the current power and maintenance state.
@@ -318,9 +483,8 @@ class IronicDriver(virt_driver.ComputeDriver):
         self._unplug_vifs(node, instance, network_info)
         self._stop_firewall(instance, network_info)
 
-    def _wait_for_active(self, icli, instance):
-        """Wait for the node to be marked as ACTIVE in Ironic."""
-        node = validate_instance_and_node(icli, instance)
+    def _wait_for_active(self, node, instance):
+        """Check whether the node has been marked as ACTIVE in Ironic."""
         if node.provision_state == ironic_states.ACTIVE:
             # job is done
             LOG.debug("Ironic node %(node)s is now ACTIVE",
@@ -382,12 +546,12 @@ class IronicDriver(virt_driver.ComputeDriver):
         :returns: a list of instance names.
 
         """
-        icli = client_wrapper.IronicClientWrapper()
-        node_list = icli.call("node.list", associated=True)
         context = nova_context.get_admin_context()
-        return [instance_obj.Instance.get_by_uuid(context,
-                                                  i.instance_uuid).name
-                for i in node_list]
+        filters = {'uuid': self.list_instance_uuids()}
+        if not filters['uuid']:
+            return []
+        instances = instance_obj.InstanceList.get_by_filters(context, filters)
+        return [i.name for i in instances]
 
     def list_instance_uuids(self):
         """Return the UUIDs of all the instances provisioned.
@@ -395,9 +559,15 @@ class IronicDriver(virt_driver.ComputeDriver):
         :returns: a list of instance UUIDs.
 
         """
-        icli = client_wrapper.IronicClientWrapper()
-        node_list = icli.call("node.list", associated=True)
-        return list(set(n.instance_uuid for n in node_list))
+        if self._node_cache_is_fresh():
+            node_list = self.node_cache.values()
+        else:
+            # Only the associated nodes are needed, so a stale snapshot
+            # is not worth refreshing with the detailed list of all nodes.
+            icli = client_wrapper.IronicClientWrapper()
+            node_list = icli.call('node.list', associated=True, limit=0)
+        return list(set(n.instance_uuid for n in node_list
+                        if n.instance_uuid))
 
     def node_is_available(self, nodename):
         """Confirms a Nova hypervisor node exists in the Ironic inventory.
@@ -406,9 +576,8 @@ class IronicDriver(virt_driver.ComputeDriver):
         :returns: True if the node exists, False if not.
 
         """
-        icli = client_wrapper.IronicClientWrapper()
         try:
-            icli.call("node.get", nodename)
+            self._get_cached_node(nodename)
             return True
         except ironic_exception.NotFound:
             return False
@@ -416,14 +585,16 @@ class IronicDriver(virt_driver.ComputeDriver):
     def get_available_nodes(self, refresh=False):
         """Returns the UUIDs of all nodes in the Ironic inventory.
 
+        This starts a resource audit, so the detailed node list is fetched
+        once here and used to serve the per-node queries which follow.
+
         :param refresh: Boolean value; If True run update first. Ignored by
             this driver.
         :returns: a list of UUIDs
 
         """
-        icli = client_wrapper.IronicClientWrapper()
-        node_list = icli.call("node.list")
-        nodes = [n.uuid for n in node_list]
+        self._refresh_cache()
+        nodes = list(self.node_cache.keys())
         LOG.debug("Returning %(num_nodes)s available node(s): %(nodes)s",
                   dict(num_nodes=len(nodes), nodes=nodes))
         return nodes
@@ -438,8 +609,7 @@ class IronicDriver(virt_driver.ComputeDriver):
         :returns: a dictionary describing resources.
 
         """
-        icli = client_wrapper.IronicClientWrapper()
-        node = icli.call("node.get", nodename)
+        node = self._get_cached_node(nodename)
         return self._node_resource(node)
 
     def get_info(self, instance):
@@ -458,9 +628,15 @@ class IronicDriver(virt_driver.ComputeDriver):
                              this driver.
 
         """
-        icli = client_wrapper.IronicClientWrapper()
+        node = None
+        if self._node_cache_is_fresh():
+            node = self.node_cache.get(instance['node'])
+            if node is not None and node.instance_uuid != instance['uuid']:
+                node = None
         try:
-            node = validate_instance_and_node(icli, instance)
+            if node is None:
+                icli = client_wrapper.IronicClientWrapper()
+                node = validate_instance_and_node(icli, instance)
         except exception.InstanceNotFound:
             return {'state': map_power_state(ironic_states.NOSTATE),
                     'max_mem': 0,
@@ -559,6 +735,7 @@ class IronicDriver(virt_driver.ComputeDriver):
                 self._cleanup_deploy(node, instance, network_info)
 
         # trigger the node deploy
+        self._invalidate_cached_node(node_uuid)
         try:
             icli.call("node.set_provision_state", node_uuid,
                       ironic_states.ACTIVE)
@@ -572,10 +749,8 @@ class IronicDriver(virt_driver.ComputeDriver):
             self._cleanup_deploy(node, instance, network_info)
             raise exception.InstanceDeployFailure(msg)
 
-        timer = loopingcall.FixedIntervalLoopingCall(self._wait_for_active,
-                                                     icli, instance)
         try:
-            timer.start(interval=CONF.ironic.api_retry_interval).wait()
+            self.node_waiter.wait(node_uuid, instance, self._wait_for_active)
         except exception.InstanceDeployFailure:
             with excutils.save_and_reraise_exception():
                 LOG.error(_("Error deploying instance %(instance)s on "
@@ -588,6 +763,7 @@ class IronicDriver(virt_driver.ComputeDriver):
         """This method is called from destroy() to unprovision
         already provisioned node after required checks.
         """
+        self._invalidate_cached_node(node.uuid)
         try:
             icli.call("node.set_provision_state", node.uuid, "deleted")
         except Exception as e:
@@ -602,8 +778,7 @@ class IronicDriver(virt_driver.ComputeDriver):
         # using a dict because this is modified in the local method
         data = {'tries': 0}
 
-        def _wait_for_provision_state():
-            node = validate_instance_and_node(icli, instance)
+        def _wait_for_provision_state(node, instance):
             if not node.provision_state:
                 LOG.debug("Ironic node %(node)s is now unprovisioned",
                           dict(node=node.uuid), instance=instance)
@@ -622,8 +797,7 @@ class IronicDriver(virt_driver.ComputeDriver):
             _log_ironic_polling('unprovision', node, instance)
 
         # wait for the state transition to finish
-        timer = loopingcall.FixedIntervalLoopingCall(_wait_for_provision_state)
-        timer.start(interval=CONF.ironic.api_retry_interval).wait()
+        self.node_waiter.wait(node.uuid, instance, _wait_for_provision_state)
 
     def destroy(self, context, instance, network_info,
                 block_device_info=None, destroy_disks=True):
@@ -676,6 +850,7 @@ class IronicDriver(virt_driver.ComputeDriver):
         """
         icli = client_wrapper.IronicClientWrapper()
         node = validate_instance_and_node(icli, instance)
+        self._invalidate_cached_node(node.uuid)
         icli.call("node.set_power_state", node.uuid, 'reboot')
 
     def power_off(self, instance):
@@ -687,6 +862,7 @@ class IronicDriver(virt_driver.ComputeDriver):
         # TODO(nobodycam): check the current power state first.
         icli = client_wrapper.IronicClientWrapper()
         node = validate_instance_and_node(icli, instance)
+        self._invalidate_cached_node(node.uuid)
         icli.call("node.set_power_state", node.uuid, 'off')
 
     def power_on(self, context, instance, network_info,
@@ -704,6 +880,7 @@ class IronicDriver(virt_driver.ComputeDriver):
         # TODO(nobodycam): check the current power state first.
         icli = client_wrapper.IronicClientWrapper()
         node = validate_instance_and_node(icli, instance)
+        self._invalidate_cached_node(node.uuid)
         icli.call("node.set_power_state", node.uuid, 'on')
 
     def get_host_stats(self, refresh=False):
@@ -911,6 +1088,7 @@ class IronicDriver(virt_driver.ComputeDriver):
                                 preserve_ephemeral)
 
         # Trigger the node rebuild/redeploy.
+        self._invalidate_cached_node(node_uuid)
         try:
             icli.call("node.set_provision_state",
                       node_uuid, ironic_states.REBUILD)
@@ -924,6 +1102,4 @@ class IronicDriver(virt_driver.ComputeDriver):
 
         # Although the target provision state is REBUILD, it will actually go
         # to ACTIVE once the redeploy is finished.
-        timer = loopingcall.FixedIntervalLoopingCall(self._wait_for_active,
-                                                     icli, instance)
-        timer.start(interval=CONF.ironic.api_retry_interval).wait()
+        self.node_waiter.wait(node_uuid, instance, self._wait_for_active)
@@ -61,15 +61,27 @@ def make_class_properties(cls):
             return getattr(self, attrname)
 
         def setter(self, value, name=name, typefn=typefn):
-            self._changed_fields.add(name)
             try:
-                return setattr(self, get_attrname(name), typefn(value))
+                value = typefn(value)
             except Exception:
+                self._changed_fields.add(name)
                 attr = "%s.%s" % (self.obj_name(), name)
                 LOG.exception(_('Error setting %(attr)s') %
                               {'attr': attr})
                 raise
 
+            # NOTE: setting a field to the value it already holds is not
+            # a change, so saving the object does not write it again.
+            # Dicts and lists may have been modified in place, so setting
+            # them always counts as a change.
+            attrname = get_attrname(name)
+            if (name in self._changed_fields or
+                    not hasattr(self, attrname) or
+                    isinstance(value, (dict, list)) or
+                    getattr(self, attrname) != value):
+                self._changed_fields.add(name)
+            return setattr(self, attrname, value)
+
         setattr(cls, name, property(getter, setter))
 
 
@@ -30,6 +30,9 @@ class Node(base.IronicObject):
 
     dbapi = db_api.get_instance()
 
+    # Set by defer_saves().
+    _saves_deferred = False
+
     fields = {
             'id': int,
 
@@ -158,15 +161,40 @@ class Node(base.IronicObject):
         Column-wise updates will be made based on the result of
         self.what_changed(). If target_power_state is provided,
         it will be checked against the in-database copy of the
-        node before updates are made.
+        node before updates are made. Nothing is written if no field
+        has changed, or while saves are deferred by defer_saves().
 
         :param context: Security context. NOTE: This is only used
                         internally by the indirection_api.
         """
+        if self._saves_deferred:
+            return
         updates = self.obj_get_changes()
+        if not updates:
+            return
         self.dbapi.update_node(self.uuid, updates)
         self.obj_reset_changes()
 
+    def defer_saves(self):
+        """Hold back the changes passed to save() until flush() is called.
+
+        Several saves of the node are then written with a single update.
+        """
+        self._saves_deferred = True
+
+    def flush(self, context):
+        """Write the changes held back since defer_saves() was called.
+
+        Later saves are still deferred.
+
+        :param context: Security context.
+        """
+        deferred, self._saves_deferred = self._saves_deferred, False
+        try:
+            self.save(context)
+        finally:
+            self._saves_deferred = deferred
+
     @base.remotable
     def refresh(self, context=None):
         """Refresh the object by re-fetching from the DB.
@@ -20,7 +20,10 @@ from oslo.config import cfg
 from oslo import messaging
 
 from ironic.api.controllers import root
+from ironic.api import hooks
+from ironic.conductor import rpcapi
 from ironic.tests.api import base
+from ironic.tests import base as tests_base
 
 
 class TestNoExceptionTracebackHook(base.FunctionalTest):
@@ -95,3 +98,54 @@ class TestNoExceptionTracebackHook(base.FunctionalTest):
         actual_msg = json.loads(
             response.json['error_message'])['faultstring']
         self.assertEqual(self.MSG_WITH_TRACE, actual_msg)
+
+
+@mock.patch.object(rpcapi, 'ConductorAPI')
+class TestRPCHook(tests_base.TestCase):
+
+    def test_rpcapi_shared(self, mock_rpcapi):
+        hook = hooks.RPCHook()
+        state1 = mock.Mock()
+        state2 = mock.Mock()
+
+        hook.before(state1)
+        hook.before(state2)
+
+        mock_rpcapi.assert_called_once_with(ring_manager=mock.ANY)
+        self.assertEqual(mock_rpcapi.return_value, state1.request.rpcapi)
+        self.assertEqual(mock_rpcapi.return_value, state2.request.rpcapi)
+
+
+class TestStreamingHook(tests_base.TestCase):
+
+    def setUp(self):
+        super(TestStreamingHook, self).setUp()
+        self.hook = hooks.StreamingHook()
+        self.state = mock.Mock()
+        self.state.response.status_int = 200
+        self.chunks = iter(['{"nodes": [', ']}'])
+
+    def test_streamed_body(self):
+        self.state.request.streamed_body = self.chunks
+
+        self.hook.after(self.state)
+
+        self.assertEqual(self.chunks, self.state.response.app_iter)
+        self.assertIsNone(self.state.response.content_length)
+
+    def test_no_streamed_body(self):
+        self.state.request = mock.Mock(spec=[])
+        app_iter = self.state.response.app_iter
+
+        self.hook.after(self.state)
+
+        self.assertEqual(app_iter, self.state.response.app_iter)
+
+    def test_error(self):
+        self.state.request.streamed_body = self.chunks
+        self.state.response.status_int = 404
+        app_iter = self.state.response.app_iter
+
+        self.hook.after(self.state)
+
+        self.assertEqual(app_iter, self.state.response.app_iter)
@@ -22,6 +22,7 @@ from oslo.config import cfg
 from six.moves.urllib import parse as urlparse
 from testtools.matchers import HasLength
 
+from ironic.api.controllers.v1 import utils as api_utils
 from ironic.common import exception
 from ironic.common import states
 from ironic.common import utils
@@ -81,7 +82,10 @@ class TestListNodes(base.FunctionalTest):
 
     def test_one(self):
         node = obj_utils.create_test_node(self.context)
-        data = self.get_json('/nodes')
+        with mock.patch.object(self.dbapi, 'get_node_list') as mock_list:
+            data = self.get_json('/nodes')
+            # Only the listed columns are read from the database.
+            self.assertFalse(mock_list.called)
         self.assertIn('instance_uuid', data['nodes'][0])
         self.assertIn('maintenance', data['nodes'][0])
         self.assertIn('power_state', data['nodes'][0])
@@ -170,8 +174,11 @@ class TestListNodes(base.FunctionalTest):
         data = self.get_json('/nodes/?limit=3')
         self.assertEqual(3, len(data['nodes']))
 
-        next_marker = data['nodes'][-1]['uuid']
-        self.assertIn(next_marker, data['next'])
+        # the next link leads to the remaining items
+        query = urlparse.urlparse(data['next']).query
+        data = self.get_json('/nodes/?' + query)
+        self.assertEqual(nodes[3:], [x['uuid'] for x in data['nodes']])
+        self.assertNotIn('next', data.keys())
 
     def test_collection_links_default_limit(self):
         cfg.CONF.set_override('max_limit', 3, 'api')
@@ -183,8 +190,55 @@ class TestListNodes(base.FunctionalTest):
         data = self.get_json('/nodes')
         self.assertEqual(3, len(data['nodes']))
 
-        next_marker = data['nodes'][-1]['uuid']
-        self.assertIn(next_marker, data['next'])
+        self.assertIn('marker=', data['next'])
+
+    def test_collection_links_sort_key(self):
+        nodes = []
+        for id in range(5):
+            node = obj_utils.create_test_node(self.context, id=id,
+                                              uuid=utils.generate_uuid())
+            nodes.append(node.uuid)
+        data = self.get_json('/nodes/?limit=3&sort_key=created_at'
+                             '&sort_dir=desc')
+        query = urlparse.urlparse(data['next']).query
+        next_data = self.get_json('/nodes/?' + query)
+        uuids = [n['uuid'] for n in data['nodes'] + next_data['nodes']]
+        self.assertEqual(nodes[::-1], uuids)
+
+    def test_collection_uuid_marker(self):
+        nodes = []
+        for id in range(5):
+            node = obj_utils.create_test_node(self.context, id=id,
+                                              uuid=utils.generate_uuid())
+            nodes.append(node.uuid)
+        data = self.get_json('/nodes/?marker=%s' % nodes[1])
+        self.assertEqual(nodes[2:], [n['uuid'] for n in data['nodes']])
+
+    def test_collection_stream(self):
+        for id in range(5):
+            obj_utils.create_test_node(self.context, id=id,
+                                       uuid=utils.generate_uuid(),
+                                       chassis_id=self.chassis.id)
+        for path in ('/nodes/?limit=3', '/nodes/detail?limit=3',
+                     '/chassis/%s/nodes?limit=3' % self.chassis.uuid):
+            cfg.CONF.set_override('stream_collections', False, 'api')
+            expected = self.get_json(path)
+            cfg.CONF.set_override('stream_collections', True, 'api')
+            self.assertEqual(expected, self.get_json(path))
+
+    def test_collection_invalid_marker(self):
+        response = self.get_json('/nodes/?marker=foo', expect_errors=True)
+        self.assertEqual(400, response.status_int)
+        self.assertEqual('application/json', response.content_type)
+        self.assertTrue(response.json['error_message'])
+
+    def test_collection_invalid_datetime_marker(self):
+        marker = api_utils.encode_marker({'id': 1, 'created_at': 'foo'},
+                                         'created_at')
+        response = self.get_json('/nodes/?sort_key=created_at&marker=%s'
+                                 % marker, expect_errors=True)
+        self.assertEqual(400, response.status_int)
+        self.assertTrue(response.json['error_message'])
 
     def test_ports_subresource_link(self):
         node = obj_utils.create_test_node(self.context)
@@ -961,6 +1015,88 @@ class TestPut(base.FunctionalTest):
                             {'target': 'not-supported'}, expect_errors=True)
         self.assertEqual(400, ret.status_code)
 
+    @mock.patch.object(rpcapi.ConductorAPI, 'change_nodes_power_state')
+    @mock.patch.object(rpcapi.ConductorAPI, 'get_topics_for_nodes')
+    def test_bulk_power_state(self, mock_gtfn, mock_cnps):
+        node2 = obj_utils.create_test_node(self.context, id=2,
+                                           uuid=utils.generate_uuid())
+        node3 = obj_utils.create_test_node(self.context, id=3,
+                                           uuid=utils.generate_uuid())
+        missing_uuid = utils.generate_uuid()
+        mock_gtfn.return_value = {'topic-1': [self.node.uuid, node2.uuid],
+                                  'topic-2': [node3.uuid]}
+
+        def fake_cnps(context, node_ids, new_state, topic):
+            if topic == 'topic-1':
+                return {'accepted': [self.node.uuid],
+                        'failed': {node2.uuid: 'locked'}}
+            raise exception.NoFreeConductorWorker()
+
+        mock_cnps.side_effect = fake_cnps
+        uuids = [self.node.uuid, node2.uuid, node3.uuid, missing_uuid]
+        ret = self.put_json('/nodes/power', {'node_uuids': uuids,
+                                             'target': states.POWER_OFF})
+        self.assertEqual(202, ret.status_code)
+        self.assertEqual([self.node.uuid], ret.json['accepted'])
+        self.assertEqual(set([node2.uuid, node3.uuid, missing_uuid]),
+                         set(ret.json['failed']))
+        self.assertEqual('locked', ret.json['failed'][node2.uuid])
+
+        nodes = mock_gtfn.call_args[0][0]
+        self.assertEqual({}, mock_gtfn.call_args[1]['unmapped'])
+        self.assertEqual(sorted([(self.node.uuid, self.node.driver),
+                                 (node2.uuid, node2.driver),
+                                 (node3.uuid, node3.driver)]),
+                         sorted(tuple(n) for n in nodes))
+        self.assertEqual(2, mock_cnps.call_count)
+        mock_cnps.assert_any_call(mock.ANY, [node3.uuid], states.POWER_OFF,
+                                  'topic-2')
+
+    @mock.patch.object(rpcapi.ConductorAPI, 'change_nodes_power_state')
+    def test_bulk_power_state_driver_not_supported(self, mock_cnps):
+        node2 = obj_utils.create_test_node(self.context, id=2,
+                                           uuid=utils.generate_uuid(),
+                                           driver='unsupported')
+
+        def fake_gtfn(nodes, unmapped):
+            unmapped[node2.uuid] = 'no conductor'
+            return {'topic-1': [self.node.uuid]}
+
+        mock_cnps.return_value = {'accepted': [self.node.uuid],
+                                  'failed': {}}
+        with mock.patch.object(rpcapi.ConductorAPI, 'get_topics_for_nodes',
+                               side_effect=fake_gtfn):
+            ret = self.put_json('/nodes/power',
+                                {'node_uuids': [self.node.uuid, node2.uuid],
+                                 'target': states.POWER_OFF})
+        self.assertEqual(202, ret.status_code)
+        self.assertEqual([self.node.uuid], ret.json['accepted'])
+        self.assertEqual({node2.uuid: 'no conductor'}, ret.json['failed'])
+        mock_cnps.assert_called_once_with(mock.ANY, [self.node.uuid],
+                                          states.POWER_OFF, 'topic-1')
+
+    @mock.patch.object(rpcapi.ConductorAPI, 'change_nodes_power_state')
+    def test_bulk_power_state_no_conductor(self, mock_cnps):
+        missing_uuid = utils.generate_uuid()
+        ret = self.put_json('/nodes/power',
+                            {'node_uuids': [self.node.uuid, missing_uuid],
+                             'target': states.POWER_ON})
+        self.assertEqual(202, ret.status_code)
+        self.assertEqual([], ret.json['accepted'])
+        self.assertEqual(set([self.node.uuid, missing_uuid]),
+                         set(ret.json['failed']))
+        self.assertIn('fake', ret.json['failed'][self.node.uuid])
+        self.assertFalse(mock_cnps.called)
+
+    @mock.patch.object(rpcapi.ConductorAPI, 'change_nodes_power_state')
+    def test_bulk_power_invalid_state_request(self, mock_cnps):
+        ret = self.put_json('/nodes/power',
+                            {'node_uuids': [self.node.uuid],
+                             'target': 'not-supported'},
+                            expect_errors=True)
+        self.assertEqual(400, ret.status_code)
+        self.assertFalse(mock_cnps.called)
+
     def test_provision_with_deploy(self):
         ret = self.put_json('/nodes/%s/states/provision' % self.node.uuid,
                             {'target': states.ACTIVE})
@@ -56,7 +56,10 @@ class TestListPorts(base.FunctionalTest):
     def test_one(self):
         ndict = dbutils.get_test_port()
         port = self.dbapi.create_port(ndict)
-        data = self.get_json('/ports')
+        with mock.patch.object(self.dbapi, 'get_port_list') as mock_list:
+            data = self.get_json('/ports')
+            # Only the listed columns are read from the database.
+            self.assertFalse(mock_list.called)
         self.assertEqual(port['uuid'], data['ports'][0]["uuid"])
         self.assertNotIn('extra', data['ports'][0])
         self.assertNotIn('node_uuid', data['ports'][0])
@@ -127,8 +130,22 @@ class TestListPorts(base.FunctionalTest):
         data = self.get_json('/ports/?limit=3')
         self.assertEqual(3, len(data['ports']))
 
-        next_marker = data['ports'][-1]['uuid']
-        self.assertIn(next_marker, data['next'])
+        # the next link leads to the remaining items
+        query = urlparse.urlparse(data['next']).query
+        data = self.get_json('/ports/?' + query)
+        self.assertEqual(ports[3:], [x['uuid'] for x in data['ports']])
+        self.assertNotIn('next', data.keys())
+
+    def test_collection_stream(self):
+        for id in range(5):
+            ndict = dbutils.get_test_port(id=id,
+                                          uuid=utils.generate_uuid(),
+                                          address='52:54:00:cf:2d:3%s' % id)
+            self.dbapi.create_port(ndict)
+        cfg.CONF.set_override('stream_collections', False, 'api')
+        expected = self.get_json('/ports/?limit=3')
+        cfg.CONF.set_override('stream_collections', True, 'api')
+        self.assertEqual(expected, self.get_json('/ports/?limit=3'))
 
     def test_collection_links_default_limit(self):
         cfg.CONF.set_override('max_limit', 3, 'api')
@@ -142,8 +159,7 @@ class TestListPorts(base.FunctionalTest):
         data = self.get_json('/ports')
         self.assertEqual(3, len(data['ports']))
 
-        next_marker = data['ports'][-1]['uuid']
-        self.assertIn(next_marker, data['next'])
+        self.assertIn('marker=', data['next'])
 
     def test_port_by_address(self):
         address_template = "aa:bb:cc:dd:ee:f%d"
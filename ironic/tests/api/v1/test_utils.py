@@ -13,9 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
+import mock
 import wsme
 
 from ironic.api.controllers.v1 import utils
+from ironic import objects
 from ironic.tests.api import base
 
 from oslo.config import cfg
@@ -47,3 +51,42 @@ class TestApiUtils(base.FunctionalTest):
         self.assertRaises(wsme.exc.ClientSideError,
                           utils.validate_sort_dir,
                           'fake-sort')
+
+    def test_encode_decode_marker(self):
+        marker = utils.encode_marker({'id': 42, 'address': 'aa:bb'},
+                                     'address')
+        self.assertEqual({'id': 42, 'address': 'aa:bb'},
+                         utils.decode_marker(marker, 'address',
+                                             objects.Port))
+
+        # marker made for another sort key
+        self.assertRaises(wsme.exc.ClientSideError,
+                          utils.decode_marker, marker, 'id', None)
+
+        # invalid marker
+        self.assertRaises(wsme.exc.ClientSideError,
+                          utils.decode_marker, 'foo', 'id', None)
+
+    def test_encode_decode_marker_datetime(self):
+        updated_at = datetime.datetime(2014, 9, 1, 12, 30, 15, 500)
+        marker = utils.encode_marker({'id': 42, 'updated_at': updated_at},
+                                     'updated_at')
+        self.assertEqual({'id': 42, 'updated_at': updated_at},
+                         utils.decode_marker(marker, 'updated_at',
+                                             objects.Node))
+
+        # malformed datetime value
+        marker = utils.encode_marker({'id': 42, 'updated_at': 'foo'},
+                                     'updated_at')
+        self.assertRaises(wsme.exc.ClientSideError,
+                          utils.decode_marker, marker, 'updated_at',
+                          objects.Node)
+
+    @mock.patch.object(utils, 'pecan')
+    def test_decode_marker_uuid(self, mock_pecan):
+        obj_cls = mock.Mock()
+        marker = '1be26c0b-03f2-4d2e-ae87-c02d7f33c123'
+        self.assertEqual(obj_cls.get_by_uuid.return_value,
+                         utils.decode_marker(marker, 'id', obj_cls))
+        obj_cls.get_by_uuid.assert_called_once_with(
+                                mock_pecan.request.context, marker)
@@ -19,15 +19,19 @@
 """Test class for Ironic ManagerService."""
 
 import eventlet
+from eventlet import event
+from eventlet import greenpool
 import mock
 from oslo.config import cfg
 from oslo import messaging
 
 from ironic.common import driver_factory
 from ironic.common import exception
+from ironic.common import hash_ring as hash
 from ironic.common import states
 from ironic.common import utils as ironic_utils
 from ironic.conductor import manager
+from ironic.conductor import periodic
 from ironic.conductor import task_manager
 from ironic.conductor import utils as conductor_utils
 from ironic.db import api as dbapi
@@ -63,7 +67,7 @@ class _CommonMixIn(object):
         if node is None:
             node = self._create_node(**node_attrs)
         task = mock.Mock(spec_set=['node', 'release_resources',
-                                   'spawn_after'])
+                                   'spawn_after', 'defer_node_saves'])
         task.node = node
         return task
 
@@ -212,6 +216,20 @@ class ManagerTestCase(tests_db_base.DbTestCase):
             self.assertTrue(mock_df.called)
             self.assertFalse(mock_reg.called)
 
+    def test_start_seeds_rebalanced_rings(self):
+        self._start_service()
+        # The rings were seeded before this conductor registered, so they
+        # don't map any node to it yet.
+        self.assertEqual({}, self.service._rebalanced_rings)
+        self.assertEqual(['fake'],
+                         list(self.service.ring_manager.hash_rings))
+
+    def test_restart_does_not_take_over_nodes(self):
+        self._start_service()
+        self.service.init_host()
+        ring = self.service.ring_manager.hash_rings['fake']
+        self.assertIs(ring, self.service._rebalanced_rings['fake'])
+
     def test__mapped_to_this_conductor(self):
         self._start_service()
         n = utils.get_test_node()
@@ -235,6 +253,24 @@ class ManagerTestCase(tests_db_base.DbTestCase):
                 self.service._conductor_service_record_keepalive()
             mock_touch.assert_called_once_with(self.hostname)
 
+    def test__conductor_service_record_keepalive_logs_queue_stats(self):
+        self.mock_keepalive_patcher.stop()
+        self.mock_keepalive = None
+
+        self._start_service()
+        CONF.set_override('heartbeat_interval', 0, 'conductor')
+        self.service.worker_queue_stats['queued'] = 3
+        with mock.patch.object(manager.LOG, 'info') as log_mock:
+            with mock.patch.object(self.service._keepalive_evt, 'is_set') \
+                    as mock_is_set:
+                mock_is_set.side_effect = [False, False, True]
+                self.service._conductor_service_record_keepalive()
+
+        # The counters are logged once, as they didn't change meanwhile.
+        log_mock.assert_called_once_with(mock.ANY, mock.ANY)
+        self.assertEqual(3, log_mock.call_args[0][1]['queued'])
+        self.assertEqual(0, log_mock.call_args[0][1]['depth'])
+
     def test_change_node_power_state_power_on(self):
         # Test change_node_power_state including integration with
         # conductor.utils.node_power_action and lower.
@@ -381,6 +417,124 @@ class ManagerTestCase(tests_db_base.DbTestCase):
             self.assertIsNone(node.target_power_state)
             self.assertIsNone(node.last_error)
 
+    def _create_power_nodes(self, count, **kwargs):
+        return [obj_utils.create_test_node(self.context, id=i,
+                                           uuid=ironic_utils.generate_uuid(),
+                                           driver='fake', **kwargs)
+                for i in range(1, count + 1)]
+
+    def test_change_nodes_power_state(self):
+        free, locked, invalid = self._create_power_nodes(
+                3, power_state=states.POWER_ON)
+        self.dbapi.reserve_node('fake-reserv', locked.uuid)
+        missing_uuid = ironic_utils.generate_uuid()
+        self._start_service()
+
+        def fake_validate(task):
+            if task.node.uuid == invalid.uuid:
+                raise exception.InvalidParameterValue('wrong info')
+
+        with mock.patch.object(self.driver.power, 'validate') \
+                as validate_mock:
+            validate_mock.side_effect = fake_validate
+            result = self.service.change_nodes_power_state(
+                    self.context,
+                    [free.uuid, locked.uuid, invalid.uuid, missing_uuid],
+                    states.POWER_OFF)
+            self.service._worker_pool.waitall()
+
+        self.assertEqual([free.uuid], result['accepted'])
+        self.assertEqual(set([locked.uuid, invalid.uuid, missing_uuid]),
+                         set(result['failed']))
+        self.assertIn('wrong info', result['failed'][invalid.uuid])
+
+        free.refresh()
+        self.assertEqual(states.POWER_OFF, free.power_state)
+        self.assertIsNone(free.reservation)
+        locked.refresh()
+        self.assertEqual(states.POWER_ON, locked.power_state)
+        self.assertEqual('fake-reserv', locked.reservation)
+        invalid.refresh()
+        self.assertEqual(states.POWER_ON, invalid.power_state)
+        self.assertIsNone(invalid.reservation)
+
+    def test_change_nodes_power_state_concurrency(self):
+        nodes = self._create_power_nodes(5, power_state=states.POWER_ON)
+        self.config(bulk_power_max_workers=2, group='conductor')
+        self._start_service()
+        running = []
+        peak = []
+
+        def fake_power_action(task, new_state):
+            running.append(task.node.uuid)
+            peak.append(len(running))
+            eventlet.sleep(0)
+            running.remove(task.node.uuid)
+
+        with mock.patch.object(conductor_utils, 'node_power_action') \
+                as pwr_act_mock:
+            pwr_act_mock.side_effect = fake_power_action
+            with mock.patch.object(self.service, '_spawn_worker',
+                                   wraps=self.service._spawn_worker) \
+                    as spawn_mock:
+                result = self.service.change_nodes_power_state(
+                        self.context, [n.uuid for n in nodes],
+                        states.POWER_OFF)
+                self.service._worker_pool.waitall()
+
+        self.assertEqual(5, pwr_act_mock.call_count)
+        self.assertEqual(2, max(peak))
+        # A single worker performs the whole request.
+        self.assertEqual(1, spawn_mock.call_count)
+        self.assertEqual(sorted(n.uuid for n in nodes),
+                         sorted(result['accepted']))
+        for node in nodes:
+            node.refresh()
+            self.assertIsNone(node.reservation)
+
+    def test_change_nodes_power_state_single_worker(self):
+        # The request's power actions need no other conductor worker than
+        # the one performing the request.
+        nodes = self._create_power_nodes(3, power_state=states.POWER_ON)
+        self.config(workers_pool_size=1, group='conductor')
+        self._start_service()
+
+        with mock.patch.object(conductor_utils, 'node_power_action') \
+                as pwr_act_mock:
+            self.service.change_nodes_power_state(
+                    self.context, [n.uuid for n in nodes], states.POWER_OFF)
+            with eventlet.Timeout(5, False):
+                self.service._worker_pool.waitall()
+
+        self.assertEqual(0, self.service._worker_pool.running())
+        self.assertEqual(3, pwr_act_mock.call_count)
+        for node in nodes:
+            node.refresh()
+            self.assertIsNone(node.reservation)
+
+    def test_change_nodes_power_state_worker_pool_full(self):
+        nodes = self._create_power_nodes(2, power_state=states.POWER_ON)
+        self._start_service()
+
+        with mock.patch.object(self.service, '_spawn_worker') \
+                as spawn_mock:
+            spawn_mock.side_effect = exception.NoFreeConductorWorker()
+
+            exc = self.assertRaises(messaging.rpc.ExpectedException,
+                                    self.service.change_nodes_power_state,
+                                    self.context,
+                                    [n.uuid for n in nodes],
+                                    states.POWER_OFF)
+            self.assertEqual(exception.NoFreeConductorWorker, exc.exc_info[0])
+            spawn_mock.assert_called_once_with(
+                    self.service._do_change_nodes_power_state, mock.ANY,
+                    states.POWER_OFF)
+
+        for node in nodes:
+            node.refresh()
+            self.assertEqual(states.POWER_ON, node.power_state)
+            self.assertIsNone(node.reservation)
+
     def test_update_node(self):
         node = obj_utils.create_test_node(self.context, driver='fake',
                                           extra={'test': 'one'})
@@ -1169,6 +1323,21 @@ class ManagerTestCase(tests_db_base.DbTestCase):
         self.assertFalse(mac_update_mock.called)
 
 
+@mock.patch.object(periodic, 'PeriodicTaskScheduler')
+class ManagerPeriodicTasksTestCase(tests_base.TestCase):
+    def setUp(self):
+        super(ManagerPeriodicTasksTestCase, self).setUp()
+        self.service = manager.ConductorManager('hostname', 'test-topic')
+        self.context = context.get_admin_context()
+
+    def test_periodic_tasks(self, scheduler_mock):
+        self.service.periodic_tasks(self.context)
+        self.service.periodic_tasks(self.context)
+
+        scheduler_mock.assert_called_once_with(self.service, self.context)
+        self.assertEqual(2, scheduler_mock.return_value.start.call_count)
+
+
 class ManagerSpawnWorkerTestCase(tests_base.TestCase):
     def setUp(self):
         super(ManagerSpawnWorkerTestCase, self).setUp()
@@ -1185,6 +1354,7 @@ class ManagerSpawnWorkerTestCase(tests_base.TestCase):
                 'fake', 1, 2, foo='bar', cat='meow')
 
     def test__spawn_worker_none_free(self):
+        self.config(workers_queue_size=0, group='conductor')
         worker_pool = mock.Mock(spec_set=['free', 'spawn'])
         worker_pool.free.return_value = False
         self.service._worker_pool = worker_pool
@@ -1193,6 +1363,63 @@ class ManagerSpawnWorkerTestCase(tests_base.TestCase):
                           self.service._spawn_worker, 'fake')
 
         self.assertFalse(worker_pool.spawn.called)
+        self.assertEqual(1, self.service.worker_queue_stats['rejected'])
+
+    def test__spawn_worker_queued(self):
+        self.service._worker_pool = greenpool.GreenPool(size=1)
+        started = []
+        blocker = event.Event()
+
+        busy = self.service._spawn_worker(blocker.wait)
+        periodic = self.service._spawn_periodic_worker(started.append,
+                                                       'periodic')
+        rpc = self.service._spawn_worker(started.append, 'rpc')
+        self.assertEqual(2, len(self.service._worker_queue))
+
+        blocker.send()
+        busy.wait()
+        rpc.wait()
+        periodic.wait()
+
+        self.assertEqual(['rpc', 'periodic'], started)
+        self.assertEqual([], self.service._worker_queue)
+        self.assertEqual(set(), self.service._worker_slots_promised)
+        self.assertEqual(2, self.service.worker_queue_stats['queued'])
+        self.assertEqual(2, self.service.worker_queue_stats['max_depth'])
+
+    def test__spawn_worker_queued_killed_after_turn(self):
+        self.service._worker_pool = greenpool.GreenPool(size=1)
+        started = []
+
+        busy = self.service._spawn_worker(eventlet.sleep, 10)
+        killed = self.service._spawn_worker(started.append, 'killed')
+        queued = self.service._spawn_worker(started.append, 'queued')
+        eventlet.sleep(0)
+
+        # Free the worker, so it is promised to the first queued task,
+        # then kill that task before it gets to run.
+        busy.kill()
+        self.assertEqual(1, len(self.service._worker_slots_promised))
+        killed.kill()
+        queued.wait()
+
+        self.assertEqual(['queued'], started)
+        self.assertEqual(set(), self.service._worker_slots_promised)
+
+    def test__spawn_worker_queue_full(self):
+        self.config(workers_queue_size=1, group='conductor')
+        self.service._worker_pool = greenpool.GreenPool(size=1)
+        blocker = event.Event()
+
+        busy = self.service._spawn_worker(blocker.wait)
+        queued = self.service._spawn_worker(lambda: 'done')
+        self.assertRaises(exception.NoFreeConductorWorker,
+                          self.service._spawn_worker, lambda: None)
+
+        blocker.send()
+        busy.wait()
+        self.assertEqual('done', queued.wait())
+        self.assertEqual(1, self.service.worker_queue_stats['rejected'])
 
 
 @mock.patch.object(conductor_utils, 'node_power_action')
@@ -1268,6 +1495,14 @@ class ManagerDoSyncPowerStateTestCase(tests_base.TestCase):
         self.assertEqual(1,
                          self.service.power_state_sync_count[self.node.uuid])
 
+    def test_get_power_state_timeout(self, node_power_action):
+        self.config(sync_power_state_timeout=30, group='conductor')
+        with mock.patch.object(eventlet, 'Timeout') as timeout_mock:
+            self._do_sync_power_state('fake', states.POWER_ON)
+
+        timeout_mock.assert_called_once_with(30, mock.ANY)
+        self.power.get_power_state.assert_called_once_with(self.task)
+
     def test_state_changed_no_sync(self, node_power_action):
         self._do_sync_power_state(states.POWER_ON, states.POWER_OFF)
 
@@ -1382,7 +1617,6 @@ class ManagerDoSyncPowerStateTestCase(tests_base.TestCase):
 @mock.patch.object(manager.ConductorManager, '_do_sync_power_state')
 @mock.patch.object(task_manager, 'acquire')
 @mock.patch.object(manager.ConductorManager, '_mapped_to_this_conductor')
-@mock.patch.object(objects.Node, 'get_by_id')
 @mock.patch.object(dbapi.IMPL, 'get_nodeinfo_list')
 class ManagerSyncPowerStatesTestCase(_CommonMixIn, tests_base.TestCase):
     def setUp(self):
@@ -1394,11 +1628,22 @@ class ManagerSyncPowerStatesTestCase(_CommonMixIn, tests_base.TestCase):
         self.node = self._create_node()
         self.filters = {'reserved': False, 'maintenance': False}
         self.columns = ['id', 'uuid', 'driver']
+        self.acquire_filters = manager.SYNC_POWER_STATE_FILTERS
+        # Run the per-node syncs inline so they can be asserted directly.
+        spawn_patcher = mock.patch.object(self.service,
+                                          '_spawn_periodic_worker',
+                                          side_effect=self._fake_spawn)
+        self.spawn_mock = spawn_patcher.start()
+        self.addCleanup(spawn_patcher.stop)
+
+    @staticmethod
+    def _fake_spawn(func, *args, **kwargs):
+        func(*args, **kwargs)
+        return mock.Mock(spec_set=['wait'])
 
-    def test_node_not_mapped(self, get_nodeinfo_mock, get_node_mock,
-                             mapped_mock, acquire_mock, sync_mock):
+    def test_node_not_mapped(self, get_nodeinfo_mock, mapped_mock,
+                             acquire_mock, sync_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
         mapped_mock.return_value = False
 
         self.service._sync_power_states(self.context)
@@ -1407,32 +1652,15 @@ class ManagerSyncPowerStatesTestCase(_CommonMixIn, tests_base.TestCase):
                 columns=self.columns, filters=self.filters)
         mapped_mock.assert_called_once_with(self.node.uuid,
                                             self.node.driver)
-        self.assertFalse(get_node_mock.called)
         self.assertFalse(acquire_mock.called)
         self.assertFalse(sync_mock.called)
 
-    def test_node_disappeared(self, get_nodeinfo_mock, get_node_mock,
-                              mapped_mock, acquire_mock, sync_mock):
+    def test_node_locked_on_acquire(self, get_nodeinfo_mock, mapped_mock,
+                                    acquire_mock, sync_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
         mapped_mock.return_value = True
-        get_node_mock.side_effect = exception.NodeNotFound(node=self.node.uuid)
-
-        self.service._sync_power_states(self.context)
-
-        get_nodeinfo_mock.assert_called_once_with(
-                columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
-                                            self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        self.assertFalse(acquire_mock.called)
-        self.assertFalse(sync_mock.called)
-
-    def test_node_in_deploywait(self, get_nodeinfo_mock, get_node_mock,
-                                mapped_mock, acquire_mock, sync_mock):
-        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
-        self.node.provision_state = states.DEPLOYWAIT
+        acquire_mock.side_effect = exception.NodeLocked(node=self.node.uuid,
+                                                        host='fake')
 
         self.service._sync_power_states(self.context)
 
@@ -1440,31 +1668,31 @@ class ManagerSyncPowerStatesTestCase(_CommonMixIn, tests_base.TestCase):
                 columns=self.columns, filters=self.filters)
         mapped_mock.assert_called_once_with(self.node.uuid,
                                             self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        self.assertFalse(acquire_mock.called)
+        acquire_mock.assert_called_once_with(self.context, self.node.id,
+                                             filters=self.acquire_filters)
         self.assertFalse(sync_mock.called)
 
-    def test_node_in_maintenance(self, get_nodeinfo_mock, get_node_mock,
-                                 mapped_mock, acquire_mock, sync_mock):
+    def test_node_constraints_not_met_on_acquire(self, get_nodeinfo_mock,
+                                                 mapped_mock, acquire_mock,
+                                                 sync_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
-        self.node.maintenance = True
+        mapped_mock.return_value = True
+        acquire_mock.side_effect = exception.NodeConstraintsNotMet(
+                node=self.node.uuid, filters=self.acquire_filters)
 
         self.service._sync_power_states(self.context)
 
-        get_nodeinfo_mock.assert_called_once_with(
-                columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
-                                            self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        self.assertFalse(acquire_mock.called)
+        acquire_mock.assert_called_once_with(self.context, self.node.id,
+                                             filters=self.acquire_filters)
         self.assertFalse(sync_mock.called)
 
-    def test_node_has_reservation(self, get_nodeinfo_mock, get_node_mock,
-                                  mapped_mock, acquire_mock, sync_mock):
+    def test_node_disappears_on_acquire(self, get_nodeinfo_mock,
+                                        mapped_mock, acquire_mock,
+                                        sync_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
-        self.node.reservation = 'fake'
+        mapped_mock.return_value = True
+        acquire_mock.side_effect = exception.NodeNotFound(node=self.node.uuid,
+                                                          host='fake')
 
         self.service._sync_power_states(self.context)
 
@@ -1472,17 +1700,16 @@ class ManagerSyncPowerStatesTestCase(_CommonMixIn, tests_base.TestCase):
                 columns=self.columns, filters=self.filters)
         mapped_mock.assert_called_once_with(self.node.uuid,
                                             self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        self.assertFalse(acquire_mock.called)
+        acquire_mock.assert_called_once_with(self.context, self.node.id,
+                                             filters=self.acquire_filters)
         self.assertFalse(sync_mock.called)
 
-    def test_node_locked_on_acquire(self, get_nodeinfo_mock, get_node_mock,
-                                    mapped_mock, acquire_mock, sync_mock):
+    def test_single_node(self, get_nodeinfo_mock, mapped_mock,
+                         acquire_mock, sync_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
         mapped_mock.return_value = True
-        acquire_mock.side_effect = exception.NodeLocked(node=self.node.uuid,
-                                                        host='fake')
+        task = self._create_task(node_attrs=dict(id=self.node.id))
+        acquire_mock.side_effect = self._get_acquire_side_effect(task)
 
         self.service._sync_power_states(self.context)
 
@@ -1490,141 +1717,110 @@ class ManagerSyncPowerStatesTestCase(_CommonMixIn, tests_base.TestCase):
                 columns=self.columns, filters=self.filters)
         mapped_mock.assert_called_once_with(self.node.uuid,
                                             self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        acquire_mock.assert_called_once_with(self.context, self.node.id)
-        self.assertFalse(sync_mock.called)
+        acquire_mock.assert_called_once_with(self.context, self.node.id,
+                                             filters=self.acquire_filters)
+        sync_mock.assert_called_once_with(task)
 
-    def test_node_in_deploywait_on_acquire(self, get_nodeinfo_mock,
-                                           get_node_mock, mapped_mock,
-                                           acquire_mock, sync_mock):
+    def test_single_node_no_free_worker(self, get_nodeinfo_mock,
+                                        mapped_mock, acquire_mock,
+                                        sync_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
         mapped_mock.return_value = True
-        task = self._create_task(
-                node_attrs=dict(provision_state=states.DEPLOYWAIT,
-                                id=self.node.id))
+        task = self._create_task(node_attrs=dict(id=self.node.id))
         acquire_mock.side_effect = self._get_acquire_side_effect(task)
+        self.spawn_mock.side_effect = exception.NoFreeConductorWorker()
 
         self.service._sync_power_states(self.context)
 
-        get_nodeinfo_mock.assert_called_once_with(
-                columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
-                                            self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        acquire_mock.assert_called_once_with(self.context, self.node.id)
-        self.assertFalse(sync_mock.called)
+        self.assertEqual(1, self.spawn_mock.call_count)
+        acquire_mock.assert_called_once_with(self.context, self.node.id,
+                                             filters=self.acquire_filters)
+        sync_mock.assert_called_once_with(task)
 
-    def test_node_in_maintenance_on_acquire(self, get_nodeinfo_mock,
-                                            get_node_mock, mapped_mock,
-                                            acquire_mock, sync_mock):
-        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
+    def test_slices(self, get_nodeinfo_mock, mapped_mock, acquire_mock,
+                    sync_mock):
+        self.config(sync_power_state_slices=2, group='conductor')
+        node2 = self._create_node(id=2)
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
+                [self.node, node2])
         mapped_mock.return_value = True
-        task = self._create_task(
-                node_attrs=dict(maintenance=True, id=self.node.id))
-        acquire_mock.side_effect = self._get_acquire_side_effect(task)
+        ring = mock.Mock(spec_set=['get_slice'])
+        ring.get_slice.side_effect = lambda uuid, slices: (
+                0 if uuid == self.node.uuid else 1)
+        self.service.ring_manager = mock.Mock(spec_set=['get_hash_ring'])
+        self.service.ring_manager.get_hash_ring.return_value = ring
+        acquire_mock.side_effect = self._get_acquire_side_effect(
+                [self._create_task(node=self.node),
+                 self._create_task(node=node2)])
 
         self.service._sync_power_states(self.context)
+        acquire_mock.assert_called_once_with(self.context, self.node.id,
+                                             filters=self.acquire_filters)
 
-        get_nodeinfo_mock.assert_called_once_with(
-                columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
-                                            self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        acquire_mock.assert_called_once_with(self.context, self.node.id)
-        self.assertFalse(sync_mock.called)
+        self.service._sync_power_states(self.context)
+        acquire_mock.assert_called_with(self.context, node2.id,
+                                        filters=self.acquire_filters)
+        self.assertEqual(2, acquire_mock.call_count)
+        ring.get_slice.assert_called_with(node2.uuid, 2)
 
-    def test_node_disappears_on_acquire(self, get_nodeinfo_mock,
-                                        get_node_mock, mapped_mock,
-                                        acquire_mock, sync_mock):
+    def test_waits_for_workers(self, get_nodeinfo_mock, mapped_mock,
+                               acquire_mock, sync_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
         mapped_mock.return_value = True
-        acquire_mock.side_effect = exception.NodeNotFound(node=self.node.uuid,
-                                                          host='fake')
+        thread = mock.Mock(spec_set=['wait'])
+        self.spawn_mock.side_effect = None
+        self.spawn_mock.return_value = thread
 
         self.service._sync_power_states(self.context)
 
-        get_nodeinfo_mock.assert_called_once_with(
-                columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
-                                            self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        acquire_mock.assert_called_once_with(self.context, self.node.id)
-        self.assertFalse(sync_mock.called)
+        self.spawn_mock.assert_called_once_with(
+                self.service._sync_power_state_for_node, self.context,
+                self.node.id, self.node.uuid, mock.ANY)
+        thread.wait.assert_called_once_with()
 
-    def test_single_node(self, get_nodeinfo_mock, get_node_mock,
-                         mapped_mock, acquire_mock, sync_mock):
-        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        get_node_mock.return_value = self.node
+    def test_waits_for_workers_after_failure(self, get_nodeinfo_mock,
+                                             mapped_mock, acquire_mock,
+                                             sync_mock):
+        node2 = self._create_node(id=2)
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
+                [self.node, node2])
         mapped_mock.return_value = True
-        task = self._create_task(node_attrs=dict(id=self.node.id))
-        acquire_mock.side_effect = self._get_acquire_side_effect(task)
+        thread1 = mock.Mock(spec_set=['wait'])
+        thread1.wait.side_effect = RuntimeError('boom')
+        thread2 = mock.Mock(spec_set=['wait'])
+        self.spawn_mock.side_effect = [thread1, thread2]
 
         self.service._sync_power_states(self.context)
 
-        get_nodeinfo_mock.assert_called_once_with(
-                columns=self.columns, filters=self.filters)
-        mapped_mock.assert_called_once_with(self.node.uuid,
-                                            self.node.driver)
-        get_node_mock.assert_called_once_with(self.context, self.node.id)
-        acquire_mock.assert_called_once_with(self.context, self.node.id)
-        sync_mock.assert_called_once_with(task)
+        thread1.wait.assert_called_once_with()
+        thread2.wait.assert_called_once_with()
 
     def test__sync_power_state_multiple_nodes(self, get_nodeinfo_mock,
-                                              get_node_mock, mapped_mock,
-                                              acquire_mock, sync_mock):
-        # Create 11 nodes:
+                                              mapped_mock, acquire_mock,
+                                              sync_mock):
+        # Create 6 nodes:
         # 1st node: Should acquire and try to sync
         # 2nd node: Not mapped to this conductor
-        # 3rd node: In DEPLOYWAIT provision_state
-        # 4th node: In maintenance mode
-        # 5th node: Has a reservation
-        # 6th node: Disappears after getting nodeinfo list.
-        # 7th node: task_manger.acquire() fails due to lock
-        # 8th node: task_manger.acquire() fails due to node disappearing
-        # 9th node: In DEPLOYWAIT provision_state acquire()
-        # 10th node: In maintenance mode on acquire()
-        # 11th node: Should acquire and try to sync
+        # 3rd node: task_manger.acquire() fails due to lock
+        # 4th node: task_manger.acquire() fails due to node disappearing
+        # 5th node: task_manger.acquire() fails due to constraints
+        # 6th node: Should acquire and try to sync
         nodes = []
-        get_node_map = {}
         mapped_map = {}
-        for i in range(1, 12):
-            attrs = {'id': i,
-                     'uuid': ironic_utils.generate_uuid()}
-            if i == 3:
-                attrs['provision_state'] = states.DEPLOYWAIT
-            elif i == 4:
-                attrs['maintenance'] = True
-            elif i == 5:
-                attrs['reservation'] = 'fake'
-
-            n = self._create_node(**attrs)
+        for i in range(1, 7):
+            n = self._create_node(id=i, uuid=ironic_utils.generate_uuid())
             nodes.append(n)
             mapped_map[n.uuid] = False if i == 2 else True
-            get_node_map[n.uuid] = n
 
         tasks = [self._create_task(node_attrs=dict(id=1)),
-                 exception.NodeLocked(node=7, host='fake'),
-                 exception.NodeNotFound(node=8, host='fake'),
-                 self._create_task(
-                     node_attrs=dict(id=9,
-                                     provision_state=states.DEPLOYWAIT)),
-                 self._create_task(
-                     node_attrs=dict(id=10, maintenance=True)),
-                 self._create_task(node_attrs=dict(id=11))]
-
-        def _get_node_side_effect(ctxt, node_id):
-            if node_id == 6:
-                # Make this node disappear
-                raise exception.NodeNotFound(node=node_id)
-            return nodes[node_id - 1]
+                 exception.NodeLocked(node=3, host='fake'),
+                 exception.NodeNotFound(node=4, host='fake'),
+                 exception.NodeConstraintsNotMet(node=5, filters={}),
+                 self._create_task(node_attrs=dict(id=6))]
 
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
                 nodes)
         mapped_mock.side_effect = lambda x, y: mapped_map[x]
-        get_node_mock.side_effect = _get_node_side_effect
         acquire_mock.side_effect = self._get_acquire_side_effect(tasks)
 
         with mock.patch.object(eventlet, 'sleep') as sleep_mock:
@@ -1636,18 +1832,15 @@ class ManagerSyncPowerStatesTestCase(_CommonMixIn, tests_base.TestCase):
                 columns=self.columns, filters=self.filters)
         mapped_calls = [mock.call(n.uuid, n.driver) for n in nodes]
         self.assertEqual(mapped_calls, mapped_mock.call_args_list)
-        get_node_calls = [mock.call(self.context, n.id)
+        acquire_calls = [mock.call(self.context, n.id,
+                                   filters=self.acquire_filters)
                 for n in nodes[:1] + nodes[2:]]
-        self.assertEqual(get_node_calls,
-                         get_node_mock.call_args_list)
-        acquire_calls = [mock.call(self.context, n.id)
-                for n in nodes[:1] + nodes[6:]]
         self.assertEqual(acquire_calls, acquire_mock.call_args_list)
-        sync_calls = [mock.call(tasks[0]), mock.call(tasks[5])]
+        sync_calls = [mock.call(tasks[0]), mock.call(tasks[4])]
         self.assertEqual(sync_calls, sync_mock.call_args_list)
 
 
-@mock.patch.object(task_manager, 'acquire')
+@mock.patch.object(task_manager, 'acquire_batch')
 @mock.patch.object(manager.ConductorManager, '_mapped_to_this_conductor')
 @mock.patch.object(dbapi.IMPL, 'get_nodeinfo_list')
 class ManagerCheckDeployTimeoutsTestCase(_CommonMixIn, tests_base.TestCase):
@@ -1668,24 +1861,44 @@ class ManagerCheckDeployTimeoutsTestCase(_CommonMixIn, tests_base.TestCase):
         self.filters = {'reserved': False, 'maintenance': False,
                         'provisioned_before': 300,
                         'provision_state': states.DEPLOYWAIT}
+        self.lock_filters = {'maintenance': False,
+                             'provisioned_before': 300,
+                             'provision_state': states.DEPLOYWAIT}
         self.columns = ['uuid', 'driver']
 
+    @staticmethod
+    def _get_batch(tasks, exit_exception=None):
+        batch = mock.MagicMock()
+        batch.__enter__.return_value = tasks
+        if exit_exception is not None:
+            batch.__exit__.side_effect = exit_exception
+        else:
+            batch.__exit__.return_value = False
+        return batch
+
     def _assert_get_nodeinfo_args(self, get_nodeinfo_mock):
         get_nodeinfo_mock.assert_called_once_with(
                 columns=self.columns, filters=self.filters,
                 sort_key='provision_updated_at', sort_dir='asc')
 
+    def _assert_acquire_batch_args(self, acquire_batch_mock, nodes):
+        acquire_batch_mock.assert_called_once_with(
+                self.context, [n.uuid for n in nodes],
+                limit=CONF.conductor.periodic_max_workers,
+                filters=self.lock_filters)
+
     def test_disabled(self, get_nodeinfo_mock, mapped_mock,
-                      acquire_mock):
+                      acquire_batch_mock):
         self.config(deploy_callback_timeout=0, group='conductor')
 
         self.service._check_deploy_timeouts(self.context)
 
         self.assertFalse(get_nodeinfo_mock.called)
         self.assertFalse(mapped_mock.called)
-        self.assertFalse(acquire_mock.called)
+        self.assertFalse(acquire_batch_mock.called)
 
-    def test_not_mapped(self, get_nodeinfo_mock, mapped_mock, acquire_mock):
+    def test_not_mapped(self, get_nodeinfo_mock, mapped_mock,
+                        acquire_batch_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
         mapped_mock.return_value = False
 
@@ -1693,130 +1906,80 @@ class ManagerCheckDeployTimeoutsTestCase(_CommonMixIn, tests_base.TestCase):
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
         mapped_mock.assert_called_once_with(self.node.uuid, self.node.driver)
-        self.assertFalse(acquire_mock.called)
+        self.assertFalse(acquire_batch_mock.called)
 
-    def test_timeout(self, get_nodeinfo_mock, mapped_mock, acquire_mock):
+    def test_timeout(self, get_nodeinfo_mock, mapped_mock,
+                     acquire_batch_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
         mapped_mock.return_value = True
-        acquire_mock.side_effect = self._get_acquire_side_effect(self.task)
+        acquire_batch_mock.return_value = self._get_batch([self.task])
 
         self.service._check_deploy_timeouts(self.context)
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
         mapped_mock.assert_called_once_with(self.node.uuid, self.node.driver)
-        acquire_mock.assert_called_once_with(self.context, self.node.uuid)
+        self._assert_acquire_batch_args(acquire_batch_mock, [self.node])
         self.task.spawn_after.assert_called_with(
-                self.service._spawn_worker,
+                self.service._spawn_periodic_worker,
                 conductor_utils.cleanup_after_timeout, self.task)
 
-    def test_acquire_node_disappears(self, get_nodeinfo_mock, mapped_mock,
-                                     acquire_mock):
-        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        mapped_mock.return_value = True
-        acquire_mock.side_effect = exception.NodeNotFound(node='fake')
-
-        # Exception eaten
-        self.service._check_deploy_timeouts(self.context)
-
-        self._assert_get_nodeinfo_args(get_nodeinfo_mock)
-        mapped_mock.assert_called_once_with(
-                self.node.uuid, self.node.driver)
-        acquire_mock.assert_called_once_with(self.context,
-                                             self.node.uuid)
-        self.assertFalse(self.task.spawn_after.called)
-
-    def test_acquire_node_locked(self, get_nodeinfo_mock, mapped_mock,
-                                 acquire_mock):
-        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        mapped_mock.return_value = True
-        acquire_mock.side_effect = exception.NodeLocked(node='fake',
-                                                        host='fake')
+    def test_only_mapped_nodes_locked(self, get_nodeinfo_mock, mapped_mock,
+                                      acquire_batch_mock):
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
+                [self.node, self.node2])
+        mapped_mock.side_effect = lambda uuid, driver: uuid == self.node2.uuid
+        acquire_batch_mock.return_value = self._get_batch([self.task2])
 
-        # Exception eaten
         self.service._check_deploy_timeouts(self.context)
 
-        self._assert_get_nodeinfo_args(get_nodeinfo_mock)
-        mapped_mock.assert_called_once_with(
-                self.node.uuid, self.node.driver)
-        acquire_mock.assert_called_once_with(self.context,
-                                             self.node.uuid)
-        self.assertFalse(self.task.spawn_after.called)
-
-    def test_no_deploywait_after_lock(self, get_nodeinfo_mock, mapped_mock,
-                                      acquire_mock):
-        task = self._create_task(
-                node_attrs=dict(provision_state=states.NOSTATE,
-                                uuid=self.node.uuid))
-        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response()
-        mapped_mock.return_value = True
-        acquire_mock.side_effect = self._get_acquire_side_effect(task)
-
-        self.service._check_deploy_timeouts(self.context)
+        self.assertEqual([mock.call(self.node.uuid, self.node.driver),
+                          mock.call(self.node2.uuid, self.node2.driver)],
+                         mapped_mock.call_args_list)
+        self._assert_acquire_batch_args(acquire_batch_mock, [self.node2])
+        self.task2.spawn_after.assert_called_with(
+                self.service._spawn_periodic_worker,
+                conductor_utils.cleanup_after_timeout, self.task2)
 
-        self._assert_get_nodeinfo_args(get_nodeinfo_mock)
-        mapped_mock.assert_called_once_with(
-                self.node.uuid, self.node.driver)
-        acquire_mock.assert_called_once_with(self.context,
-                                             self.node.uuid)
-        self.assertFalse(task.spawn_after.called)
-
-    def test_maintenance_after_lock(self, get_nodeinfo_mock, mapped_mock,
-                                    acquire_mock):
-        task = self._create_task(
-                node_attrs=dict(provision_state=states.DEPLOYWAIT,
-                                maintenance=True,
-                                uuid=self.node.uuid))
+    def test_no_nodes_locked(self, get_nodeinfo_mock, mapped_mock,
+                             acquire_batch_mock):
+        # Every node was locked by someone else, had disappeared or no
+        # longer matched the filters.
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
-                [task.node, self.node2])
+                [self.node, self.node2])
         mapped_mock.return_value = True
-        acquire_mock.side_effect = self._get_acquire_side_effect(
-                [task, self.task2])
+        acquire_batch_mock.return_value = self._get_batch([])
 
         self.service._check_deploy_timeouts(self.context)
 
-        self._assert_get_nodeinfo_args(get_nodeinfo_mock)
-        self.assertEqual([mock.call(self.node.uuid, task.node.driver),
-                          mock.call(self.node2.uuid, self.node2.driver)],
-                         mapped_mock.call_args_list)
-        self.assertEqual([mock.call(self.context, self.node.uuid),
-                          mock.call(self.context, self.node2.uuid)],
-                         acquire_mock.call_args_list)
-        # First node skipped
-        self.assertFalse(task.spawn_after.called)
-        # Second node spawned
-        self.task2.spawn_after.assert_called_with(
-                self.service._spawn_worker,
-                conductor_utils.cleanup_after_timeout, self.task2)
+        self._assert_acquire_batch_args(acquire_batch_mock,
+                                        [self.node, self.node2])
+        self.assertFalse(self.task.spawn_after.called)
+        self.assertFalse(self.task2.spawn_after.called)
 
     def test_exiting_no_worker_avail(self, get_nodeinfo_mock, mapped_mock,
-                                     acquire_mock):
+                                     acquire_batch_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
                 [self.node, self.node2])
         mapped_mock.return_value = True
-        acquire_mock.side_effect = self._get_acquire_side_effect(
-                [(self.task, exception.NoFreeConductorWorker()), self.task2])
+        acquire_batch_mock.return_value = self._get_batch(
+                [self.task, self.task2],
+                exit_exception=exception.NoFreeConductorWorker())
 
         # Exception should be nuked
         self.service._check_deploy_timeouts(self.context)
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
-        # mapped should be only called for the first node as we should
-        # have exited the loop early due to NoFreeConductorWorker
-        mapped_mock.assert_called_once_with(
-                self.node.uuid, self.node.driver)
-        acquire_mock.assert_called_once_with(self.context,
-                                             self.node.uuid)
-        self.task.spawn_after.assert_called_with(
-                self.service._spawn_worker,
-                conductor_utils.cleanup_after_timeout, self.task)
+        self._assert_acquire_batch_args(acquire_batch_mock,
+                                        [self.node, self.node2])
 
     def test_exiting_with_other_exception(self, get_nodeinfo_mock,
-                                          mapped_mock, acquire_mock):
+                                          mapped_mock, acquire_batch_mock):
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
                 [self.node, self.node2])
         mapped_mock.return_value = True
-        acquire_mock.side_effect = self._get_acquire_side_effect(
-                [(self.task, exception.IronicException('foo')), self.task2])
+        acquire_batch_mock.return_value = self._get_batch(
+                [self.task, self.task2],
+                exit_exception=exception.IronicException('foo'))
 
         # Should re-raise
         self.assertRaises(exception.IronicException,
@@ -1824,37 +1987,191 @@ class ManagerCheckDeployTimeoutsTestCase(_CommonMixIn, tests_base.TestCase):
                           self.context)
 
         self._assert_get_nodeinfo_args(get_nodeinfo_mock)
-        # mapped should be only called for the first node as we should
-        # have exited the loop early due to unknown exception
-        mapped_mock.assert_called_once_with(
-                self.node.uuid, self.node.driver)
-        acquire_mock.assert_called_once_with(self.context,
-                                             self.node.uuid)
-        self.task.spawn_after.assert_called_with(
-                self.service._spawn_worker,
-                conductor_utils.cleanup_after_timeout, self.task)
+        self._assert_acquire_batch_args(acquire_batch_mock,
+                                        [self.node, self.node2])
 
-    def test_worker_limit(self, get_nodeinfo_mock, mapped_mock, acquire_mock):
+    def test_worker_limit(self, get_nodeinfo_mock, mapped_mock,
+                          acquire_batch_mock):
         self.config(periodic_max_workers=2, group='conductor')
-
-        # Use the same nodes/tasks to make life easier in the tests
-        # here
-
         get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
                 [self.node] * 3)
         mapped_mock.return_value = True
-        acquire_mock.side_effect = self._get_acquire_side_effect(
-                [self.task] * 3)
+        acquire_batch_mock.return_value = self._get_batch([self.task] * 2)
 
         self.service._check_deploy_timeouts(self.context)
 
-        # Should only have ran 2.
-        self.assertEqual([mock.call(self.node.uuid, self.node.driver)] * 2,
-                         mapped_mock.call_args_list)
-        self.assertEqual([mock.call(self.context, self.node.uuid)] * 2,
-                         acquire_mock.call_args_list)
-        spawn_after_call = mock.call(self.service._spawn_worker,
+        acquire_batch_mock.assert_called_once_with(
+                self.context, [self.node.uuid] * 3, limit=2,
+                filters=self.lock_filters)
+        spawn_after_call = mock.call(self.service._spawn_periodic_worker,
                                      conductor_utils.cleanup_after_timeout,
                                      self.task)
         self.assertEqual([spawn_after_call] * 2,
                          self.task.spawn_after.call_args_list)
+
+
+@mock.patch.object(task_manager, 'acquire')
+@mock.patch.object(dbapi.IMPL, 'get_nodeinfo_list')
+class ManagerRebalanceNodeRingTestCase(_CommonMixIn, tests_base.TestCase):
+    def setUp(self):
+        super(ManagerRebalanceNodeRingTestCase, self).setUp()
+        self.service = manager.ConductorManager('host1', 'test-topic')
+        self.dbapi = dbapi.get_instance()
+        self.service.dbapi = self.dbapi
+        self.service.drivers = ['fake']
+        self.service._rebalanced_rings = {}
+        self.service._take_over_retries = {}
+        self.service.ring_manager = mock.Mock(
+                spec_set=['refresh', 'hash_rings'])
+        self.service.ring_manager.refresh.return_value = set(['fake'])
+        self.context = context.get_admin_context()
+        self.columns = ['id', 'uuid']
+        self.filters = {'driver': 'fake', 'associated': True}
+
+        uuid_fmt = '1be26c0b-03f2-4d2e-ae87-c02d7f33c%03d'
+        self.nodes = [self._create_node(id=i, uuid=uuid_fmt % i)
+                      for i in range(1, 9)]
+        self.old_ring = hash.HashRing(['host1', 'host2'])
+        self.new_ring = hash.HashRing(['host1'])
+        self.service.ring_manager.hash_rings = {'fake': self.new_ring}
+
+        spawn_patcher = mock.patch.object(self.service,
+                                          '_spawn_periodic_worker',
+                                          side_effect=self._fake_spawn)
+        self.spawn_mock = spawn_patcher.start()
+        self.addCleanup(spawn_patcher.stop)
+
+    @staticmethod
+    def _fake_spawn(func, *args, **kwargs):
+        func(*args, **kwargs)
+        return mock.Mock(spec_set=['wait'])
+
+    @staticmethod
+    def _create_task(node):
+        task = mock.Mock(spec_set=['node', 'driver'])
+        task.node = node
+        return task
+
+    def test_first_pass_takes_over_mapped_nodes(self, get_nodeinfo_mock,
+                                                acquire_mock):
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
+                self.nodes)
+        tasks = [self._create_task(node) for node in self.nodes]
+        acquire_mock.side_effect = self._get_acquire_side_effect(tasks)
+
+        self.service.rebalance_node_ring(self.context)
+
+        get_nodeinfo_mock.assert_called_once_with(columns=self.columns,
+                                                  filters=self.filters)
+        self.assertEqual([mock.call(self.context, node.id)
+                          for node in self.nodes],
+                         acquire_mock.call_args_list)
+        for task in tasks:
+            task.driver.deploy.prepare.assert_called_once_with(task)
+            task.driver.deploy.take_over.assert_called_once_with(task)
+        self.assertIs(self.new_ring, self.service._rebalanced_rings['fake'])
+
+    def test_only_moved_nodes_taken_over(self, get_nodeinfo_mock,
+                                         acquire_mock):
+        self.service._rebalanced_rings = {'fake': self.old_ring}
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
+                self.nodes)
+        moved = [node for node in self.nodes
+                 if self.old_ring.get_hosts(node.uuid) == ['host2']]
+        self.assertTrue(0 < len(moved) < len(self.nodes))
+        tasks = [self._create_task(node) for node in moved]
+        acquire_mock.side_effect = self._get_acquire_side_effect(tasks)
+
+        self.service.rebalance_node_ring(self.context)
+
+        self.assertEqual([mock.call(self.context, node.id)
+                          for node in moved],
+                         acquire_mock.call_args_list)
+        for task in tasks:
+            task.driver.deploy.take_over.assert_called_once_with(task)
+        self.assertIs(self.new_ring, self.service._rebalanced_rings['fake'])
+
+    def test_ring_unchanged(self, get_nodeinfo_mock, acquire_mock):
+        self.service._rebalanced_rings = {'fake': self.new_ring}
+        self.service.ring_manager.refresh.return_value = set()
+
+        self.service.rebalance_node_ring(self.context)
+
+        self.assertFalse(get_nodeinfo_mock.called)
+        self.assertFalse(acquire_mock.called)
+
+    def test_no_nodes_moved_here(self, get_nodeinfo_mock, acquire_mock):
+        # host1 left the ring, so nothing is mapped to it any more.
+        self.service.ring_manager.hash_rings = {
+                'fake': hash.HashRing(['host2'])}
+        self.service._rebalanced_rings = {'fake': self.old_ring}
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
+                self.nodes)
+
+        self.service.rebalance_node_ring(self.context)
+
+        self.assertFalse(acquire_mock.called)
+        self.assertIs(self.service.ring_manager.hash_rings['fake'],
+                      self.service._rebalanced_rings['fake'])
+
+    def test_node_locked_retried_next_pass(self, get_nodeinfo_mock,
+                                           acquire_mock):
+        node = self.nodes[0]
+        task = self._create_task(node)
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
+                node)
+        acquire_mock.side_effect = self._get_acquire_side_effect(
+                [exception.NodeLocked(node=node.uuid, host='fake'), task])
+
+        self.service.rebalance_node_ring(self.context)
+
+        acquire_mock.assert_called_once_with(self.context, node.id)
+        self.assertIs(self.new_ring, self.service._rebalanced_rings['fake'])
+        self.assertEqual(set([node.uuid]),
+                         self.service._take_over_retries['fake'])
+
+        self.service.ring_manager.refresh.return_value = set()
+        self.service.rebalance_node_ring(self.context)
+
+        self.assertEqual(2, acquire_mock.call_count)
+        task.driver.deploy.take_over.assert_called_once_with(task)
+        self.assertEqual({}, self.service._take_over_retries)
+
+    def test_take_over_fails_retried_next_pass(self, get_nodeinfo_mock,
+                                               acquire_mock):
+        self.service._rebalanced_rings = {'fake': self.old_ring}
+        get_nodeinfo_mock.return_value = self._get_nodeinfo_list_response(
+                self.nodes)
+        moved = [node for node in self.nodes
+                 if self.old_ring.get_hosts(node.uuid) == ['host2']]
+        tasks = [self._create_task(node) for node in moved]
+        tasks[0].driver.deploy.take_over.side_effect = (
+                exception.IronicException('foo'))
+        acquire_mock.side_effect = self._get_acquire_side_effect(tasks)
+
+        self.service.rebalance_node_ring(self.context)
+
+        self.assertIs(self.new_ring, self.service._rebalanced_rings['fake'])
+        self.assertEqual(set([moved[0].uuid]),
+                         self.service._take_over_retries['fake'])
+
+        # Only the failed node is taken over again.
+        retry_task = self._create_task(moved[0])
+        acquire_mock.reset_mock()
+        acquire_mock.side_effect = self._get_acquire_side_effect(retry_task)
+        self.service.ring_manager.refresh.return_value = set()
+        self.service.rebalance_node_ring(self.context)
+
+        acquire_mock.assert_called_once_with(self.context, moved[0].id)
+        retry_task.driver.deploy.take_over.assert_called_once_with(
+                retry_task)
+        self.assertEqual({}, self.service._take_over_retries)
+
+    def test_driver_ring_removed(self, get_nodeinfo_mock, acquire_mock):
+        self.service._rebalanced_rings = {'fake': self.old_ring}
+        self.service.ring_manager.hash_rings = {}
+
+        self.service.rebalance_node_ring(self.context)
+
+        self.assertFalse(get_nodeinfo_mock.called)
+        self.assertEqual({}, self.service._rebalanced_rings)
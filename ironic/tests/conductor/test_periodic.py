@@ -0,0 +1,109 @@
+# coding=utf-8
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for :class:`ironic.conductor.periodic.PeriodicTaskScheduler`."""
+
+import mock
+
+from ironic.conductor import periodic
+from ironic.openstack.common import periodic_task
+from ironic.tests import base as tests_base
+
+
+class FakeManager(periodic_task.PeriodicTasks):
+
+    def __init__(self):
+        self.calls = []
+
+    @periodic_task.periodic_task(spacing=10)
+    def _fast(self, context):
+        self.calls.append(('fast', context))
+
+    @periodic_task.periodic_task(spacing=60, run_immediately=True)
+    def _slow(self, context):
+        self.calls.append(('slow', context))
+
+
+@mock.patch.object(periodic.eventlet, 'spawn')
+@mock.patch.object(periodic, '_now')
+class PeriodicTaskSchedulerTestCase(tests_base.TestCase):
+    def setUp(self):
+        super(PeriodicTaskSchedulerTestCase, self).setUp()
+        self.manager = FakeManager()
+        self.scheduler = periodic.PeriodicTaskScheduler(self.manager,
+                                                        'context')
+        self.tasks = dict(FakeManager._periodic_tasks)
+        self.task = self.tasks['_fast']
+
+    def _start(self, time_mock):
+        time_mock.return_value = 100.0
+        self.scheduler.start()
+        self.scheduler.stop()
+
+    def test_start(self, time_mock, spawn_mock):
+        time_mock.return_value = 100.0
+
+        self.scheduler.start()
+        self.scheduler.start()
+
+        spawn_mock.assert_has_calls(
+                [mock.call(self.scheduler._run_task, '_fast',
+                           self.tasks['_fast'], 10, 110.0),
+                 mock.call(self.scheduler._run_task, '_slow',
+                           self.tasks['_slow'], 60, 100.0)],
+                any_order=True)
+        self.assertEqual(2, spawn_mock.call_count)
+        self.assertTrue(self.scheduler.running)
+
+        self.scheduler.stop()
+        self.assertFalse(self.scheduler.running)
+        self.assertEqual(2, spawn_mock.return_value.kill.call_count)
+
+    def test__run_once(self, time_mock, spawn_mock):
+        self._start(time_mock)
+        time_mock.side_effect = [101.0, 103.5]
+
+        next_run = self.scheduler._run_once('_fast', self.task, 10, 100.0)
+
+        self.assertEqual(110.0, next_run)
+        self.assertEqual([('fast', 'context')], self.manager.calls)
+        stats = self.scheduler.stats['_fast']
+        self.assertEqual(1, stats['runs'])
+        self.assertEqual(0, stats['overruns'])
+        self.assertEqual(2.5, stats['last_duration'])
+        self.assertEqual(1, stats['histogram'][5])
+
+    def test__run_once_overrun(self, time_mock, spawn_mock):
+        self._start(time_mock)
+        time_mock.side_effect = [100.0, 125.0]
+
+        next_run = self.scheduler._run_once('_fast', self.task, 10, 100.0)
+
+        # Runs due at 110 and 120 are skipped, the schedule does not drift.
+        self.assertEqual(130.0, next_run)
+        stats = self.scheduler.stats['_fast']
+        self.assertEqual(1, stats['overruns'])
+        self.assertEqual(2, stats['skipped'])
+        self.assertEqual(1, stats['histogram'][30])
+
+    def test__run_once_failure(self, time_mock, spawn_mock):
+        self._start(time_mock)
+        time_mock.side_effect = [100.0, 101.0]
+        task = mock.Mock(side_effect=Exception('boom'))
+
+        next_run = self.scheduler._run_once('_fast', task, 10, 100.0)
+
+        self.assertEqual(110.0, next_run)
+        task.assert_called_once_with(self.manager, 'context')
+        self.assertEqual(1, self.scheduler.stats['_fast']['failures'])
@@ -79,6 +79,44 @@ class RPCAPITestCase(base.DbTestCase):
                          rpcapi.get_topic_for,
                          self.fake_node_obj)
 
+    def test_get_topics_for_nodes(self):
+        CONF.set_override('host', 'fake-host')
+        self.dbapi.register_conductor({'hostname': 'fake-host',
+                                       'drivers': ['fake-driver']})
+        self.dbapi.register_conductor({'hostname': 'other-host',
+                                       'drivers': ['other-driver']})
+
+        rpcapi = conductor_rpcapi.ConductorAPI(topic='fake-topic')
+        nodes = [('uuid-1', 'fake-driver'), ('uuid-2', 'other-driver'),
+                 ('uuid-3', 'fake-driver')]
+        expected = {'fake-topic.fake-host': ['uuid-1', 'uuid-3'],
+                    'fake-topic.other-host': ['uuid-2']}
+        self.assertEqual(expected, rpcapi.get_topics_for_nodes(nodes))
+
+    def test_get_topics_for_nodes_unknown_driver(self):
+        CONF.set_override('host', 'fake-host')
+        self.dbapi.register_conductor({'hostname': 'fake-host',
+                                       'drivers': ['fake-driver']})
+
+        rpcapi = conductor_rpcapi.ConductorAPI(topic='fake-topic')
+        self.assertRaises(exception.NoValidHost,
+                          rpcapi.get_topics_for_nodes,
+                          [('uuid-1', 'fake-driver'),
+                           ('uuid-2', 'other-driver')])
+
+    def test_get_topics_for_nodes_unknown_driver_unmapped(self):
+        CONF.set_override('host', 'fake-host')
+        self.dbapi.register_conductor({'hostname': 'fake-host',
+                                       'drivers': ['fake-driver']})
+
+        rpcapi = conductor_rpcapi.ConductorAPI(topic='fake-topic')
+        unmapped = {}
+        topics = rpcapi.get_topics_for_nodes([('uuid-1', 'fake-driver'),
+                                              ('uuid-2', 'other-driver')],
+                                             unmapped=unmapped)
+        self.assertEqual({'fake-topic.fake-host': ['uuid-1']}, topics)
+        self.assertEqual(['uuid-2'], list(unmapped))
+
     def test_get_topic_for_driver_known_driver(self):
         CONF.set_override('host', 'fake-host')
         self.dbapi.register_conductor({
@@ -154,6 +192,13 @@ class RPCAPITestCase(base.DbTestCase):
                           node_id=self.fake_node['uuid'],
                           new_state=states.POWER_ON)
 
+    def test_change_nodes_power_state(self):
+        self._test_rpcapi('change_nodes_power_state',
+                          'call',
+                          version='1.16',
+                          node_ids=[self.fake_node['uuid']],
+                          new_state=states.POWER_OFF)
+
     def test_pass_vendor_info(self):
         self._test_rpcapi('vendor_passthru',
                           'call',
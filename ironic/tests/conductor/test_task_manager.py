@@ -52,12 +52,68 @@ class TaskManagerTestCase(tests_base.TestCase):
             self.assertEqual(get_driver_mock.return_value, task.driver)
             self.assertFalse(task.shared)
 
-        reserve_mock.assert_called_once_with(self.host, 'fake-node-id')
+        reserve_mock.assert_called_once_with(self.host, 'fake-node-id',
+                                             filters=None)
         get_ports_mock.assert_called_once_with(self.node.id)
         get_driver_mock.assert_called_once_with(self.node.driver)
         release_mock.assert_called_once_with(self.host, self.node.id)
         self.assertFalse(node_get_mock.called)
 
+    def test_excl_lock_deferred_saves(self, get_ports_mock, get_driver_mock,
+                                      reserve_mock, release_mock,
+                                      node_get_mock):
+        reserve_mock.return_value = self.node
+        with task_manager.TaskManager(self.context, 'fake-node-id') as task:
+            task.defer_node_saves()
+            self.node.defer_saves.assert_called_once_with()
+            self.assertFalse(self.node.flush.called)
+
+        self.node.flush.assert_called_once_with(self.context)
+        release_mock.assert_called_once_with(self.host, self.node.id)
+
+    def test_excl_lock_deferred_saves_fail(self, get_ports_mock,
+                                           get_driver_mock, reserve_mock,
+                                           release_mock, node_get_mock):
+        reserve_mock.return_value = self.node
+        self.node.flush.side_effect = exception.NodeNotFound(node='fake')
+        with task_manager.TaskManager(self.context, 'fake-node-id') as task:
+            task.defer_node_saves()
+
+        # The node is unlocked even if its changes can't be saved.
+        release_mock.assert_called_once_with(self.host, self.node.id)
+
+    def test_excl_lock_deferred_saves_error(self, get_ports_mock,
+                                            get_driver_mock, reserve_mock,
+                                            release_mock, node_get_mock):
+        reserve_mock.return_value = self.node
+        self.node.flush.side_effect = exception.IronicException('foo')
+
+        def _test_it():
+            with task_manager.TaskManager(self.context,
+                                          'fake-node-id') as task:
+                task.defer_node_saves()
+
+        self.assertRaises(exception.IronicException, _test_it)
+        release_mock.assert_called_once_with(self.host, self.node.id)
+
+    def test_excl_lock_deferred_saves_error_in_block(self, get_ports_mock,
+                                                     get_driver_mock,
+                                                     reserve_mock,
+                                                     release_mock,
+                                                     node_get_mock):
+        reserve_mock.return_value = self.node
+        self.node.flush.side_effect = exception.IronicException('foo')
+
+        def _test_it():
+            with task_manager.TaskManager(self.context,
+                                          'fake-node-id') as task:
+                task.defer_node_saves()
+                raise exception.NodeLocked(node='fake', host='fake')
+
+        # The exception raised within the block is not hidden.
+        self.assertRaises(exception.NodeLocked, _test_it)
+        release_mock.assert_called_once_with(self.host, self.node.id)
+
     def test_excl_lock_with_driver(self, get_ports_mock, get_driver_mock,
                                    reserve_mock, release_mock,
                                    node_get_mock):
@@ -70,7 +126,8 @@ class TaskManagerTestCase(tests_base.TestCase):
             self.assertEqual(get_driver_mock.return_value, task.driver)
             self.assertFalse(task.shared)
 
-        reserve_mock.assert_called_once_with(self.host, 'fake-node-id')
+        reserve_mock.assert_called_once_with(self.host, 'fake-node-id',
+                                             filters=None)
         get_ports_mock.assert_called_once_with(self.node.id)
         get_driver_mock.assert_called_once_with('fake-driver')
         release_mock.assert_called_once_with(self.host, self.node.id)
@@ -86,6 +143,7 @@ class TaskManagerTestCase(tests_base.TestCase):
         get_driver_mock.return_value = mock.sentinel.driver1
 
         with task_manager.TaskManager(self.context, 'node-id1') as task:
+            self.assertEqual(mock.sentinel.ports1, task.ports)
             reserve_mock.return_value = node2
             get_ports_mock.return_value = mock.sentinel.ports2
             get_driver_mock.return_value = mock.sentinel.driver2
@@ -101,8 +159,8 @@ class TaskManagerTestCase(tests_base.TestCase):
                 self.assertEqual(mock.sentinel.driver2, task2.driver)
                 self.assertFalse(task2.shared)
 
-        self.assertEqual([mock.call(self.host, 'node-id1'),
-                          mock.call(self.host, 'node-id2')],
+        self.assertEqual([mock.call(self.host, 'node-id1', filters=None),
+                          mock.call(self.host, 'node-id2', filters=None)],
                          reserve_mock.call_args_list)
         self.assertEqual([mock.call(self.node.id), mock.call(node2.id)],
                          get_ports_mock.call_args_list)
@@ -126,26 +184,67 @@ class TaskManagerTestCase(tests_base.TestCase):
                           self.context,
                           'fake-node-id')
 
-        reserve_mock.assert_called_once_with(self.host, 'fake-node-id')
+        reserve_mock.assert_called_once_with(self.host, 'fake-node-id',
+                                             filters=None)
         self.assertFalse(get_ports_mock.called)
         self.assertFalse(get_driver_mock.called)
         self.assertFalse(release_mock.called)
         self.assertFalse(node_get_mock.called)
 
+    def test_excl_lock_with_filters(self, get_ports_mock, get_driver_mock,
+                                    reserve_mock, release_mock,
+                                    node_get_mock):
+        reserve_mock.return_value = self.node
+        filters = {'maintenance': False}
+        with task_manager.TaskManager(self.context, 'fake-node-id',
+                                      filters=filters) as task:
+            self.assertEqual(self.node, task.node)
+            self.assertFalse(task.shared)
+
+        reserve_mock.assert_called_once_with(self.host, 'fake-node-id',
+                                             filters=filters)
+        release_mock.assert_called_once_with(self.host, self.node.id)
+
+    def test_excl_lock_constraints_not_met(self, get_ports_mock,
+                                           get_driver_mock, reserve_mock,
+                                           release_mock, node_get_mock):
+        reserve_mock.side_effect = exception.NodeConstraintsNotMet(
+                node='foo', filters={})
+
+        self.assertRaises(exception.NodeConstraintsNotMet,
+                          task_manager.TaskManager,
+                          self.context,
+                          'fake-node-id',
+                          filters={'maintenance': False})
+
+        self.assertFalse(get_driver_mock.called)
+        self.assertFalse(release_mock.called)
+
+    def test_excl_lock_ports_not_loaded(self, get_ports_mock,
+                                        get_driver_mock, reserve_mock,
+                                        release_mock, node_get_mock):
+        reserve_mock.return_value = self.node
+        with task_manager.TaskManager(self.context, 'fake-node-id'):
+            pass
+
+        self.assertFalse(get_ports_mock.called)
+
     def test_excl_lock_get_ports_exception(self, get_ports_mock,
                                            get_driver_mock, reserve_mock,
                                            release_mock, node_get_mock):
         reserve_mock.return_value = self.node
         get_ports_mock.side_effect = exception.IronicException('foo')
 
-        self.assertRaises(exception.IronicException,
-                          task_manager.TaskManager,
-                          self.context,
-                          'fake-node-id')
+        def _test_it():
+            with task_manager.TaskManager(self.context,
+                                          'fake-node-id') as task:
+                task.ports
+
+        self.assertRaises(exception.IronicException, _test_it)
 
-        reserve_mock.assert_called_once_with(self.host, 'fake-node-id')
+        reserve_mock.assert_called_once_with(self.host, 'fake-node-id',
+                                             filters=None)
         get_ports_mock.assert_called_once_with(self.node.id)
-        self.assertFalse(get_driver_mock.called)
         release_mock.assert_called_once_with(self.host, self.node.id)
         self.assertFalse(node_get_mock.called)
 
@@ -161,8 +260,9 @@ class TaskManagerTestCase(tests_base.TestCase):
                           self.context,
                           'fake-node-id')
 
-        reserve_mock.assert_called_once_with(self.host, 'fake-node-id')
-        get_ports_mock.assert_called_once_with(self.node.id)
+        reserve_mock.assert_called_once_with(self.host, 'fake-node-id',
+                                             filters=None)
+        self.assertFalse(get_ports_mock.called)
         get_driver_mock.assert_called_once_with(self.node.driver)
         release_mock.assert_called_once_with(self.host, self.node.id)
         self.assertFalse(node_get_mock.called)
@@ -227,17 +327,17 @@ class TaskManagerTestCase(tests_base.TestCase):
         node_get_mock.return_value = self.node
         get_ports_mock.side_effect = exception.IronicException('foo')
 
-        self.assertRaises(exception.IronicException,
-                          task_manager.TaskManager,
-                          self.context,
-                          'fake-node-id',
-                          shared=True)
+        def _test_it():
+            with task_manager.TaskManager(self.context, 'fake-node-id',
+                                          shared=True) as task:
+                task.ports
+
+        self.assertRaises(exception.IronicException, _test_it)
 
         self.assertFalse(reserve_mock.called)
         self.assertFalse(release_mock.called)
         node_get_mock.assert_called_once_with(self.context, 'fake-node-id')
         get_ports_mock.assert_called_once_with(self.node.id)
-        self.assertFalse(get_driver_mock.called)
 
     def test_shared_lock_get_driver_exception(self, get_ports_mock,
                                               get_driver_mock, reserve_mock,
@@ -255,7 +355,7 @@ class TaskManagerTestCase(tests_base.TestCase):
         self.assertFalse(reserve_mock.called)
         self.assertFalse(release_mock.called)
         node_get_mock.assert_called_once_with(self.context, 'fake-node-id')
-        get_ports_mock.assert_called_once_with(self.node.id)
+        self.assertFalse(get_ports_mock.called)
         get_driver_mock.assert_called_once_with(self.node.driver)
 
     def test_spawn_after(self, get_ports_mock, get_driver_mock,
@@ -277,6 +377,49 @@ class TaskManagerTestCase(tests_base.TestCase):
         # thread
         self.assertFalse(task_release_mock.called)
 
+    def test_spawn_after_deferred_saves(self, get_ports_mock, get_driver_mock,
+                                        reserve_mock, release_mock,
+                                        node_get_mock):
+        reserve_mock.return_value = self.node
+        thread_mock = mock.Mock(spec_set=['link', 'cancel'])
+        spawn_mock = mock.Mock(return_value=thread_mock)
+        func_mock = mock.Mock(return_value='result')
+
+        with task_manager.TaskManager(self.context, 'node-id') as task:
+            task.defer_node_saves()
+            task.spawn_after(spawn_mock, func_mock, 1, foo='bar')
+
+        spawn_mock.assert_called_once_with(mock.ANY, 1, foo='bar')
+        self.assertFalse(self.node.flush.called)
+
+        # The worker saves the node's changes before it returns, and the
+        # link callback only unlocks the node.
+        worker_func = spawn_mock.call_args[0][0]
+        self.assertEqual('result', worker_func(1, foo='bar'))
+        func_mock.assert_called_once_with(1, foo='bar')
+        self.node.flush.assert_called_once_with(self.context)
+        task._thread_release_resources(thread_mock)
+        self.node.flush.assert_called_once_with(self.context)
+        release_mock.assert_called_once_with(self.host, self.node.id)
+
+    def test_spawn_after_deferred_saves_func_fails(self, get_ports_mock,
+                                                   get_driver_mock,
+                                                   reserve_mock,
+                                                   release_mock,
+                                                   node_get_mock):
+        reserve_mock.return_value = self.node
+        self.node.flush.side_effect = exception.IronicException('bar')
+        func_mock = mock.Mock(side_effect=exception.NodeLocked(node='fake',
+                                                               host='fake'))
+        with task_manager.TaskManager(self.context, 'node-id') as task:
+            task.defer_node_saves()
+
+            # The function's exception is not hidden by the failure to
+            # save the node's changes.
+            self.assertRaises(exception.NodeLocked,
+                              task._call_and_flush_node_saves, func_mock)
+            self.node.flush.assert_called_once_with(self.context)
+
     def test_spawn_after_exception_while_yielded(self, get_ports_mock,
                                                  get_driver_mock,
                                                  reserve_mock,
@@ -379,6 +522,197 @@ class TaskManagerTestCase(tests_base.TestCase):
                                                  'fake-argument')
 
 
+@mock.patch.object(dbapi.IMPL, 'release_nodes')
+@mock.patch.object(dbapi.IMPL, 'reserve_nodes')
+@mock.patch.object(driver_factory, 'get_driver')
+class BatchTaskManagerTestCase(tests_base.TestCase):
+    def setUp(self):
+        super(BatchTaskManagerTestCase, self).setUp()
+        self.host = 'test-host'
+        self.config(host=self.host)
+        self.context = mock.sentinel.context
+        self.node1 = mock.Mock(spec_set=objects.Node)
+        self.node1.id = 1
+        self.node2 = mock.Mock(spec_set=objects.Node)
+        self.node2.id = 2
+
+    def test_acquire_batch(self, get_driver_mock, reserve_mock,
+                           release_mock):
+        reserve_mock.return_value = [self.node1, self.node2]
+        filters = {'maintenance': False}
+
+        with task_manager.acquire_batch(self.context, ['id1', 'id2', 'id3'],
+                                        limit=5, filters=filters) as tasks:
+            self.assertEqual(2, len(tasks))
+            self.assertEqual([self.node1, self.node2],
+                             [task.node for task in tasks])
+            for task in tasks:
+                self.assertFalse(task.shared)
+                self.assertEqual(self.context, task.context)
+                self.assertEqual(get_driver_mock.return_value, task.driver)
+
+        reserve_mock.assert_called_once_with(self.host,
+                                             ['id1', 'id2', 'id3'],
+                                             limit=5, filters=filters)
+        release_mock.assert_called_once_with(self.host, [1, 2])
+
+    def test_acquire_batch_members_share_task_state(self, get_driver_mock,
+                                                    reserve_mock,
+                                                    release_mock):
+        reserve_mock.return_value = [self.node1]
+
+        with mock.patch.object(task_manager.TaskManager, '_init_state',
+                               autospec=True,
+                               side_effect=task_manager.TaskManager.
+                                           _init_state) as init_mock:
+            with task_manager.acquire_batch(self.context,
+                                            ['id1']) as tasks:
+                task = tasks.tasks[0]
+                init_mock.assert_called_once_with(task, self.context,
+                                                  shared=False)
+                self.assertEqual(self.node1, task.node)
+                self.assertFalse(task._node_saves_deferred)
+
+    def test_acquire_batch_deferred_saves_error(self, get_driver_mock,
+                                                reserve_mock, release_mock):
+        reserve_mock.return_value = [self.node1, self.node2]
+        self.node1.flush.side_effect = exception.IronicException('foo')
+
+        def _test_it():
+            with task_manager.acquire_batch(self.context,
+                                            ['id1', 'id2']) as tasks:
+                for task in tasks:
+                    task.defer_node_saves()
+
+        self.assertRaises(exception.IronicException, _test_it)
+        self.node2.flush.assert_called_once_with(self.context)
+        release_mock.assert_called_once_with(self.host, [1, 2])
+
+    def test_acquire_batch_nothing_reserved(self, get_driver_mock,
+                                            reserve_mock, release_mock):
+        reserve_mock.return_value = []
+
+        with task_manager.acquire_batch(self.context, ['id1']) as tasks:
+            self.assertEqual(0, len(tasks))
+
+        self.assertFalse(get_driver_mock.called)
+        self.assertFalse(release_mock.called)
+
+    def test_acquire_batch_get_driver_exception(self, get_driver_mock,
+                                                reserve_mock, release_mock):
+        reserve_mock.return_value = [self.node1, self.node2]
+        get_driver_mock.side_effect = exception.DriverNotFound(
+                driver_name='foo')
+
+        self.assertRaises(exception.DriverNotFound,
+                          task_manager.BatchTaskManager,
+                          self.context, ['id1', 'id2'])
+
+        release_mock.assert_called_once_with(self.host, [1, 2])
+
+    def test_acquire_batch_exception_in_block(self, get_driver_mock,
+                                              reserve_mock, release_mock):
+        reserve_mock.return_value = [self.node1, self.node2]
+        spawn_mock = mock.Mock()
+
+        def _test_it():
+            with task_manager.acquire_batch(self.context,
+                                            ['id1', 'id2']) as tasks:
+                for task in tasks:
+                    task.spawn_after(spawn_mock)
+                raise exception.IronicException('foo')
+
+        self.assertRaises(exception.IronicException, _test_it)
+        self.assertFalse(spawn_mock.called)
+        release_mock.assert_called_once_with(self.host, [1, 2])
+
+    def test_acquire_batch_spawn_after(self, get_driver_mock, reserve_mock,
+                                       release_mock):
+        reserve_mock.return_value = [self.node1, self.node2]
+        thread_mock = mock.Mock(spec_set=['link', 'cancel'])
+        spawn_mock = mock.Mock(return_value=thread_mock)
+
+        with task_manager.acquire_batch(self.context,
+                                        ['id1', 'id2']) as tasks:
+            spawned = tasks.tasks[0]
+            spawned.spawn_after(spawn_mock, 'fake-arg')
+
+        spawn_mock.assert_called_once_with('fake-arg')
+        thread_mock.link.assert_called_once_with(
+                spawned._thread_release_resources)
+        # Only the node without background work is released with the batch
+        release_mock.assert_called_once_with(self.host, [2])
+        self.assertEqual(self.node1, spawned.node)
+
+    @mock.patch.object(dbapi.IMPL, 'release_node')
+    def test_acquire_batch_spawn_fails(self, release_node_mock,
+                                       get_driver_mock, reserve_mock,
+                                       release_mock):
+        reserve_mock.return_value = [self.node1, self.node2]
+        spawn_mock = mock.Mock(
+                side_effect=exception.NoFreeConductorWorker())
+
+        def _test_it():
+            with task_manager.acquire_batch(self.context,
+                                            ['id1', 'id2']) as tasks:
+                for task in tasks:
+                    task.spawn_after(spawn_mock)
+
+        self.assertRaises(exception.NoFreeConductorWorker, _test_it)
+        self.assertEqual(2, spawn_mock.call_count)
+        # Each task released its own node when its spawn failed
+        self.assertEqual([mock.call(self.host, 1), mock.call(self.host, 2)],
+                         release_node_mock.call_args_list)
+        self.assertFalse(release_mock.called)
+
+    def test_acquire_batch_spawn_after_batch(self, get_driver_mock,
+                                             reserve_mock, release_mock):
+        reserve_mock.return_value = [self.node1, self.node2]
+        thread_mock = mock.Mock(spec_set=['link', 'cancel'])
+        spawn_mock = mock.Mock(return_value=thread_mock)
+
+        with task_manager.acquire_batch(self.context,
+                                        ['id1', 'id2']) as tasks:
+            tasks.spawn_after(spawn_mock, 'fake-arg')
+
+        spawn_mock.assert_called_once_with('fake-arg')
+        thread_mock.link.assert_called_once_with(
+                tasks._thread_release_resources)
+        # The nodes are held until the thread finishes
+        self.assertFalse(release_mock.called)
+
+        tasks._thread_release_resources(thread_mock)
+        release_mock.assert_called_once_with(self.host, [1, 2])
+
+    def test_acquire_batch_spawn_after_batch_fails(self, get_driver_mock,
+                                                   reserve_mock,
+                                                   release_mock):
+        reserve_mock.return_value = [self.node1, self.node2]
+        spawn_mock = mock.Mock(
+                side_effect=exception.NoFreeConductorWorker())
+
+        def _test_it():
+            with task_manager.acquire_batch(self.context,
+                                            ['id1', 'id2']) as tasks:
+                tasks.spawn_after(spawn_mock)
+
+        self.assertRaises(exception.NoFreeConductorWorker, _test_it)
+        release_mock.assert_called_once_with(self.host, [1, 2])
+
+    @mock.patch.object(dbapi.IMPL, 'release_node')
+    def test_acquire_batch_release(self, release_node_mock, get_driver_mock,
+                                   reserve_mock, release_mock):
+        reserve_mock.return_value = [self.node1, self.node2]
+
+        with task_manager.acquire_batch(self.context,
+                                        ['id1', 'id2']) as tasks:
+            tasks.release(tasks.tasks[0])
+            self.assertEqual([self.node2], [task.node for task in tasks])
+            release_node_mock.assert_called_once_with(self.host, 1)
+
+        release_mock.assert_called_once_with(self.host, [2])
+
+
 @task_manager.require_exclusive_lock
 def _req_excl_lock_method(*args, **kwargs):
     return (args, kwargs)
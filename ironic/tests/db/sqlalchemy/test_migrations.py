@@ -533,3 +533,21 @@ class TestMigrations(BaseMigrationTestCase, WalkVersionsMixin):
         data['uuid'] = utils.generate_uuid()
         self.assertRaises(sqlalchemy.exc.IntegrityError,
                           nodes.insert().execute, data)
+
+    def _check_4f399b21ae71(self, engine, data):
+        expected = {'nodes': {'nodes_provision_state_idx':
+                                  ['provision_state', 'maintenance',
+                                   'provision_updated_at'],
+                              'nodes_reservation_idx':
+                                  ['reservation', 'maintenance'],
+                              'nodes_driver_idx': ['driver', 'maintenance'],
+                              'nodes_chassis_id_idx': ['chassis_id']},
+                    'ports': {'ports_node_id_idx': ['node_id']},
+                    'conductors': {'conductors_updated_at_idx':
+                                       ['updated_at']}}
+        for table_name, indexes in expected.items():
+            table = db_utils.get_table(engine, table_name)
+            found = dict((index.name, [c.name for c in index.columns])
+                         for index in table.indexes)
+            for name, columns in indexes.items():
+                self.assertEqual(columns, found.get(name))
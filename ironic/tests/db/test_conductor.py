@@ -173,3 +173,18 @@ class DbConductorTestCase(base.DbTestCase):
         expected = {d: set([h1, h2]), d1: set([h1]), d2: set([h2])}
         result = self.dbapi.get_active_driver_dict(interval=two_minute)
         self.assertEqual(expected, result)
+
+    @mock.patch.object(timeutils, 'utcnow')
+    def test_get_active_conductor_ids(self, mock_utcnow):
+        past = datetime.datetime(2000, 1, 1, 0, 0)
+        present = past + datetime.timedelta(minutes=2)
+
+        mock_utcnow.return_value = past
+        self._create_test_cdr(id=1, hostname='old-host')
+        mock_utcnow.return_value = present
+        self._create_test_cdr(id=2, hostname='new-host')
+
+        self.assertEqual(frozenset([2]),
+                         self.dbapi.get_active_conductor_ids(interval=60))
+        self.assertEqual(frozenset([1, 2]),
+                         self.dbapi.get_active_conductor_ids(interval=120))
@@ -123,6 +123,30 @@ class DbNodeTestCase(base.DbTestCase):
         res = self.dbapi.get_node_list(filters={'maintenance': False})
         self.assertEqual([1], [r.id for r in res])
 
+        res = self.dbapi.get_nodeinfo_list(
+                filters={'uuid_in': [n2['uuid'],
+                                     ironic_utils.generate_uuid()]})
+        self.assertEqual([2], [r[0] for r in res])
+
+    @mock.patch('ironic.db.sqlalchemy.api._MAX_IN_ITEMS', 2)
+    def test_get_nodeinfo_list_uuid_in_chunked(self):
+        uuids = []
+        for i in range(1, 6):
+            n = utils.get_test_node(id=i, uuid=ironic_utils.generate_uuid(),
+                                    maintenance=(i == 3))
+            self.dbapi.create_node(n)
+            uuids.append(n['uuid'])
+
+        res = self.dbapi.get_nodeinfo_list(
+                filters={'uuid_in': uuids, 'maintenance': False})
+        self.assertEqual([1, 2, 4, 5], sorted(r[0] for r in res))
+
+    def test_get_nodeinfo_list_uuid_in_paginated(self):
+        self.assertRaises(exception.InvalidParameterValue,
+                          self.dbapi.get_nodeinfo_list,
+                          filters={'uuid_in': [ironic_utils.generate_uuid()]},
+                          limit=1)
+
     @mock.patch.object(timeutils, 'utcnow')
     def test_get_nodeinfo_list_provision(self, mock_utcnow):
         past = datetime.datetime(2000, 1, 1, 0, 0)
@@ -161,6 +185,31 @@ class DbNodeTestCase(base.DbTestCase):
         res_uuids = [r.uuid for r in res]
         self.assertEqual(uuids.sort(), res_uuids.sort())
 
+    def test_get_node_list_marker(self):
+        past = datetime.datetime(2000, 1, 1, 0, 0)
+        for i in range(1, 6):
+            updated = past + datetime.timedelta(seconds=i % 2)
+            n = utils.get_test_node(id=i, uuid=ironic_utils.generate_uuid(),
+                                    provision_updated_at=updated)
+            self.dbapi.create_node(n)
+
+        def _ids(marker, sort_dir):
+            res = self.dbapi.get_node_list(marker=marker,
+                                           sort_key='provision_updated_at',
+                                           sort_dir=sort_dir)
+            return [r.id for r in res]
+
+        # a dict of the sort key values, as decoded from an API marker
+        marker = {'provision_updated_at': timeutils.strtime(past), 'id': 4}
+        self.assertEqual([1, 3, 5], _ids(marker, 'asc'))
+        marker = {'provision_updated_at': timeutils.strtime(
+                      past + datetime.timedelta(seconds=1)), 'id': 3}
+        self.assertEqual([1, 4, 2], _ids(marker, 'desc'))
+
+        # the last node of the previous page
+        marker = self.dbapi.get_node_by_id(1)
+        self.assertEqual([3, 5], _ids(marker, 'asc'))
+
     def test_get_node_list_with_filters(self):
         ch1 = utils.get_test_chassis(id=1, uuid=ironic_utils.generate_uuid())
         ch2 = utils.get_test_chassis(id=2, uuid=ironic_utils.generate_uuid())
@@ -315,6 +364,29 @@ class DbNodeTestCase(base.DbTestCase):
                           n['id'],
                           {'instance_uuid': new_i_uuid_two})
 
+    @mock.patch.object(timeutils, 'utcnow')
+    def test_update_node_expected_updated_at(self, mock_utcnow):
+        first = datetime.datetime(2000, 1, 1, 0, 0)
+        second = datetime.datetime(2000, 1, 1, 0, 1)
+        mock_utcnow.return_value = first
+        n = self._create_test_node()
+        res = self.dbapi.update_node(n['id'], {'extra': {'foo': 'bar'}})
+        self.assertEqual(first, timeutils.normalize_time(res['updated_at']))
+
+        mock_utcnow.return_value = second
+        res = self.dbapi.update_node(n['id'], {'extra': {'foo': 'baz'}},
+                                     expected_updated_at=first)
+        self.assertEqual({'foo': 'baz'}, res['extra'])
+        self.assertEqual(second,
+                         timeutils.normalize_time(res['updated_at']))
+
+        self.assertRaises(exception.NodeUpdateConflict,
+                          self.dbapi.update_node,
+                          n['id'], {'extra': {'foo': 'qux'}},
+                          expected_updated_at=first)
+        res = self.dbapi.get_node_by_id(n['id'])
+        self.assertEqual({'foo': 'baz'}, res['extra'])
+
     @mock.patch.object(timeutils, 'utcnow')
     def test_update_node_provision(self, mock_utcnow):
         mocked_time = datetime.datetime(2000, 1, 1, 0, 0)
@@ -342,6 +414,141 @@ class DbNodeTestCase(base.DbTestCase):
         res = self.dbapi.get_node_by_uuid(uuid)
         self.assertEqual(r1, res.reservation)
 
+    def test_reserve_node_with_filters(self):
+        n = self._create_test_node(maintenance=False)
+        uuid = n['uuid']
+
+        self.dbapi.reserve_node('fake-reservation', uuid,
+                                filters={'maintenance': False})
+
+        res = self.dbapi.get_node_by_uuid(uuid)
+        self.assertEqual('fake-reservation', res.reservation)
+
+    def test_reserve_node_filters_not_met(self):
+        n = self._create_test_node(provision_state=states.DEPLOYWAIT)
+        uuid = n['uuid']
+
+        filters = {'provision_state_not_in': [states.DEPLOYWAIT]}
+        self.assertRaises(exception.NodeConstraintsNotMet,
+                          self.dbapi.reserve_node,
+                          'fake-reservation', uuid, filters=filters)
+
+        res = self.dbapi.get_node_by_uuid(uuid)
+        self.assertIsNone(res.reservation)
+
+    def test_reserve_node_provision_state_not_in_nostate(self):
+        n = self._create_test_node(provision_state=states.NOSTATE)
+        uuid = n['uuid']
+
+        filters = {'provision_state_not_in': [states.DEPLOYWAIT]}
+        self.dbapi.reserve_node('fake-reservation', uuid, filters=filters)
+
+        res = self.dbapi.get_node_by_uuid(uuid)
+        self.assertEqual('fake-reservation', res.reservation)
+
+    def test_reserve_node_locked_takes_precedence_over_filters(self):
+        n = self._create_test_node(maintenance=True)
+        uuid = n['uuid']
+
+        self.dbapi.reserve_node('fake-reservation', uuid)
+        self.assertRaises(exception.NodeLocked,
+                          self.dbapi.reserve_node,
+                          'another', uuid, filters={'maintenance': False})
+
+    def _create_many_nodes(self, count, **kwargs):
+        return [self._create_test_node(id=i,
+                                       uuid=ironic_utils.generate_uuid(),
+                                       **kwargs)
+                for i in range(1, count + 1)]
+
+    def test_reserve_nodes(self):
+        nodes = self._create_many_nodes(3)
+        ids = [n['id'] for n in nodes]
+
+        res = self.dbapi.reserve_nodes('fake-reservation', ids)
+
+        self.assertEqual(sorted(ids), sorted(n.id for n in res))
+        for n in res:
+            self.assertEqual('fake-reservation', n.reservation)
+        for node_id in ids:
+            self.assertEqual('fake-reservation',
+                             self.dbapi.get_node_by_id(node_id).reservation)
+
+    def test_reserve_nodes_by_uuid(self):
+        nodes = self._create_many_nodes(2)
+        uuids = [n['uuid'] for n in nodes]
+
+        res = self.dbapi.reserve_nodes('fake-reservation', uuids)
+
+        self.assertEqual(sorted(uuids), sorted(n.uuid for n in res))
+
+    def test_reserve_nodes_skips_reserved(self):
+        nodes = self._create_many_nodes(3)
+        ids = [n['id'] for n in nodes]
+        self.dbapi.reserve_node('other', ids[0])
+
+        res = self.dbapi.reserve_nodes('fake-reservation', ids)
+
+        self.assertEqual(sorted(ids[1:]), sorted(n.id for n in res))
+        self.assertEqual('other',
+                         self.dbapi.get_node_by_id(ids[0]).reservation)
+
+    def test_reserve_nodes_skips_own_reservation(self):
+        nodes = self._create_many_nodes(2)
+        ids = [n['id'] for n in nodes]
+        self.dbapi.reserve_node('fake-reservation', ids[0])
+
+        res = self.dbapi.reserve_nodes('fake-reservation', ids)
+
+        self.assertEqual([ids[1]], [n.id for n in res])
+
+    def test_reserve_nodes_limit(self):
+        nodes = self._create_many_nodes(5)
+        ids = [n['id'] for n in nodes]
+
+        res = self.dbapi.reserve_nodes('fake-reservation', ids, limit=2)
+
+        self.assertEqual(2, len(res))
+        reserved = [i for i in ids
+                    if self.dbapi.get_node_by_id(i).reservation]
+        self.assertEqual(sorted(n.id for n in res), sorted(reserved))
+
+    def test_reserve_nodes_with_filters(self):
+        nodes = self._create_many_nodes(2)
+        ids = [n['id'] for n in nodes]
+        self.dbapi.update_node(ids[0], {'maintenance': True})
+
+        res = self.dbapi.reserve_nodes('fake-reservation', ids,
+                                       filters={'maintenance': False})
+
+        self.assertEqual([ids[1]], [n.id for n in res])
+        self.assertIsNone(self.dbapi.get_node_by_id(ids[0]).reservation)
+
+    @mock.patch('ironic.db.sqlalchemy.api._MAX_IN_ITEMS', 2)
+    def test_reserve_nodes_chunked(self):
+        nodes = self._create_many_nodes(5)
+        ids = [n['id'] for n in nodes]
+
+        res = self.dbapi.reserve_nodes('fake-reservation', ids, limit=3)
+
+        self.assertEqual(3, len(res))
+
+    def test_reserve_nodes_none_found(self):
+        self.assertEqual([], self.dbapi.reserve_nodes('fake', [1, 2]))
+
+    def test_release_nodes(self):
+        nodes = self._create_many_nodes(3)
+        ids = [n['id'] for n in nodes]
+        self.dbapi.reserve_nodes('fake-reservation', ids[:2])
+        self.dbapi.reserve_node('other', ids[2])
+
+        self.dbapi.release_nodes('fake-reservation', ids)
+
+        self.assertIsNone(self.dbapi.get_node_by_id(ids[0]).reservation)
+        self.assertIsNone(self.dbapi.get_node_by_id(ids[1]).reservation)
+        self.assertEqual('other',
+                         self.dbapi.get_node_by_id(ids[2]).reservation)
+
     def test_release_reservation(self):
         n = self._create_test_node()
         uuid = n['uuid']
@@ -57,6 +57,26 @@ class DbPortTestCase(base.DbTestCase):
         res_uuids = [r.uuid for r in res]
         self.assertEqual(uuids.sort(), res_uuids.sort())
 
+    def test_get_portinfo_list(self):
+        other = self.dbapi.create_node(db_utils.get_test_node(
+                id=2, uuid=ironic_utils.generate_uuid()))
+        p1 = db_utils.get_test_port(id=1, uuid=ironic_utils.generate_uuid(),
+                                    node_id=self.n.id,
+                                    address='52:54:00:cf:2d:31')
+        p2 = db_utils.get_test_port(id=2, uuid=ironic_utils.generate_uuid(),
+                                    node_id=other.id,
+                                    address='52:54:00:cf:2d:32')
+        self.dbapi.create_port(p1)
+        self.dbapi.create_port(p2)
+
+        res = self.dbapi.get_portinfo_list(columns=['uuid', 'address'])
+        self.assertEqual(sorted([(p1['uuid'], p1['address']),
+                                 (p2['uuid'], p2['address'])]),
+                         sorted(res))
+
+        res = self.dbapi.get_portinfo_list(filters={'node_id': other.id})
+        self.assertEqual([(2,)], [tuple(r) for r in res])
+
     def test_get_port_by_address(self):
         self.dbapi.create_port(self.p)
 
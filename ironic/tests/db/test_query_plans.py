@@ -0,0 +1,92 @@
+# coding=utf-8
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests that the periodic task and API queries are served by an index."""
+
+import re
+
+from ironic.common import states
+from ironic.db.sqlalchemy import api as sa_api
+from ironic.db.sqlalchemy import models
+from ironic.openstack.common import timeutils
+from ironic.tests.db import base
+
+_SQLITE_INDEX = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+
+
+class QueryPlanTestCase(base.DbTestCase):
+
+    def setUp(self):
+        super(QueryPlanTestCase, self).setUp()
+        self.dbapi = sa_api.get_backend()
+        self.engine = sa_api.get_engine()
+
+    def _explain(self, query):
+        """Return the names of the indexes used by the query plan.
+
+        A table read without any index shows up as None.
+        """
+        compiled = query.statement.compile(dialect=self.engine.dialect)
+        params = tuple(compiled.params[name]
+                       for name in compiled.positiontup)
+        if self.engine.name == 'sqlite':
+            rows = self.engine.execute('EXPLAIN QUERY PLAN %s' % compiled,
+                                       params)
+            indexes = []
+            for row in rows:
+                match = _SQLITE_INDEX.search(row['detail'])
+                indexes.append(match.group(1) if match else None)
+            return indexes
+        rows = self.engine.execute('EXPLAIN %s' % compiled, params)
+        return [row['key'] for row in rows]
+
+    def _assert_uses_index(self, index_name, query):
+        self.assertEqual([index_name], self._explain(query))
+
+    def _nodes_query(self, filters):
+        query = sa_api.model_query(models.Node.uuid, models.Node.driver)
+        return self.dbapi._add_nodes_filters(query, filters)
+
+    def test_check_deploy_timeouts(self):
+        filters = {'reserved': False,
+                   'provision_state': states.DEPLOYWAIT,
+                   'maintenance': False,
+                   'provisioned_before': 60}
+        query = self._nodes_query(filters).order_by(
+                    models.Node.provision_updated_at.asc())
+        self._assert_uses_index('nodes_provision_state_idx', query)
+
+    def test_sync_power_states(self):
+        filters = {'reserved': False, 'maintenance': False}
+        self._assert_uses_index('nodes_reservation_idx',
+                                self._nodes_query(filters))
+
+    def test_filter_by_driver(self):
+        filters = {'driver': 'fake', 'associated': True}
+        self._assert_uses_index('nodes_driver_idx',
+                                self._nodes_query(filters))
+
+    def test_filter_by_chassis(self):
+        query = sa_api.model_query(models.Node.uuid).filter_by(chassis_id=1)
+        self._assert_uses_index('nodes_chassis_id_idx', query)
+
+    def test_ports_by_node(self):
+        query = sa_api.add_port_filter_by_node(
+                    sa_api.model_query(models.Port.uuid), 1)
+        self._assert_uses_index('ports_node_id_idx', query)
+
+    def test_active_conductors(self):
+        query = sa_api.model_query(models.Conductor).filter(
+                    models.Conductor.updated_at >= timeutils.utcnow())
+        self._assert_uses_index('conductors_updated_at_idx', query)
@@ -19,6 +19,7 @@
 
 """Test class for IPMITool driver module."""
 
+import eventlet
 import mock
 import os
 import stat
@@ -88,11 +89,22 @@ class IPMIToolCheckTimingTestCase(base.TestCase):
         self.assertEqual(expected, mock_timing.call_args_list)
 
 
-@mock.patch.object(time, 'sleep')
+@mock.patch.object(eventlet, 'sleep')
 class IPMIToolPrivateMethodTestCase(base.TestCase):
 
     def setUp(self):
         super(IPMIToolPrivateMethodTestCase, self).setUp()
+        ipmi.SESSIONS.clear()
+        self.addCleanup(ipmi.SESSIONS.clear)
+        ipmi.NODE_ADDRESSES.clear()
+        self.addCleanup(ipmi.NODE_ADDRESSES.clear)
+        ipmi.SESSION_SWEEPER = None
+        self.addCleanup(setattr, ipmi, 'SESSION_SWEEPER', None)
+        spawn_patcher = mock.patch.object(eventlet, 'spawn_after')
+        self.mock_spawn_after = spawn_patcher.start()
+        self.addCleanup(spawn_patcher.stop)
+        ipmi.POWER_TRANSITIONS.clear()
+        self.addCleanup(ipmi.POWER_TRANSITIONS.clear)
         self.context = context.get_admin_context()
         self.node = obj_utils.get_test_node(
                 self.context,
@@ -100,15 +112,14 @@ class IPMIToolPrivateMethodTestCase(base.TestCase):
                 driver_info=INFO_DICT)
         self.info = ipmi._parse_driver_info(self.node)
 
-    def test__make_password_file(self, mock_sleep):
-        with ipmi._make_password_file(self.info.get('password')) as pw_file:
-            del_chk_pw_file = pw_file
-            self.assertTrue(os.path.isfile(pw_file))
-            self.assertEqual(0o600, os.stat(pw_file)[stat.ST_MODE] & 0o777)
-            with open(pw_file, "r") as f:
-                password = f.read()
-            self.assertEqual(self.info.get('password'), password)
-        self.assertFalse(os.path.isfile(del_chk_pw_file))
+    def test__write_password_file(self, mock_sleep):
+        pw_file = ipmi._write_password_file(self.info.get('password'))
+        self.addCleanup(utils.delete_if_exists, pw_file)
+        self.assertTrue(os.path.isfile(pw_file))
+        self.assertEqual(0o600, os.stat(pw_file)[stat.ST_MODE] & 0o777)
+        with open(pw_file, "r") as f:
+            password = f.read()
+        self.assertEqual(self.info.get('password'), password)
 
     def test__parse_driver_info(self, mock_sleep):
         # make sure we get back the expected things
@@ -169,11 +180,10 @@ class IPMIToolPrivateMethodTestCase(base.TestCase):
                           node)
 
     @mock.patch.object(ipmi, '_is_timing_supported')
-    @mock.patch.object(ipmi, '_make_password_file', autospec=True)
+    @mock.patch.object(ipmi, '_write_password_file', autospec=True)
     @mock.patch.object(utils, 'execute', autospec=True)
     def test__exec_ipmitool_first_call_to_address(self, mock_exec, mock_pwf,
             mock_timing_support, mock_sleep):
-        ipmi.LAST_CMD_TIME = {}
         pw_file_handle = tempfile.NamedTemporaryFile()
         pw_file = pw_file_handle.name
         file_handle = open(pw_file, "w")
@@ -198,17 +208,13 @@ class IPMIToolPrivateMethodTestCase(base.TestCase):
         self.assertFalse(mock_sleep.called)
 
     @mock.patch.object(ipmi, '_is_timing_supported')
-    @mock.patch.object(ipmi, '_make_password_file', autospec=True)
+    @mock.patch.object(ipmi, '_write_password_file', autospec=True)
     @mock.patch.object(utils, 'execute', autospec=True)
     def test__exec_ipmitool_second_call_to_address_sleep(self, mock_exec,
             mock_pwf, mock_timing_support, mock_sleep):
-        ipmi.LAST_CMD_TIME = {}
         pw_file_handle1 = tempfile.NamedTemporaryFile()
         pw_file1 = pw_file_handle1.name
         file_handle1 = open(pw_file1, "w")
-        pw_file_handle2 = tempfile.NamedTemporaryFile()
-        pw_file2 = pw_file_handle2.name
-        file_handle2 = open(pw_file2, "w")
         args = [[
             'ipmitool',
             '-I', 'lanplus',
@@ -224,12 +230,12 @@ class IPMIToolPrivateMethodTestCase(base.TestCase):
             '-H', self.info['address'],
             '-L', self.info['priv_level'],
             '-U', self.info['username'],
-            '-f', file_handle2,
+            '-f', file_handle1,
             'D', 'E', 'F',
         ]]
 
         mock_timing_support.return_value = False
-        mock_pwf.side_effect = iter([file_handle1, file_handle2])
+        mock_pwf.return_value = file_handle1
         mock_exec.side_effect = iter([(None, None), (None, None)])
 
         ipmi._exec_ipmitool(self.info, 'A B C')
@@ -238,19 +244,17 @@ class IPMIToolPrivateMethodTestCase(base.TestCase):
         ipmi._exec_ipmitool(self.info, 'D E F')
         self.assertTrue(mock_sleep.called)
         mock_exec.assert_called_with(*args[1])
+        # the session's password file is reused
+        mock_pwf.assert_called_once_with(self.info['password'])
 
     @mock.patch.object(ipmi, '_is_timing_supported')
-    @mock.patch.object(ipmi, '_make_password_file', autospec=True)
+    @mock.patch.object(ipmi, '_write_password_file', autospec=True)
     @mock.patch.object(utils, 'execute', autospec=True)
     def test__exec_ipmitool_second_call_to_address_no_sleep(self, mock_exec,
             mock_pwf, mock_timing_support, mock_sleep):
-        ipmi.LAST_CMD_TIME = {}
         pw_file_handle1 = tempfile.NamedTemporaryFile()
         pw_file1 = pw_file_handle1.name
         file_handle1 = open(pw_file1, "w")
-        pw_file_handle2 = tempfile.NamedTemporaryFile()
-        pw_file2 = pw_file_handle2.name
-        file_handle2 = open(pw_file2, "w")
         args = [[
             'ipmitool',
             '-I', 'lanplus',
@@ -266,29 +270,28 @@ class IPMIToolPrivateMethodTestCase(base.TestCase):
             '-H', self.info['address'],
             '-L', self.info['priv_level'],
             '-U', self.info['username'],
-            '-f', file_handle2,
+            '-f', file_handle1,
             'D', 'E', 'F',
         ]]
 
         mock_timing_support.return_value = False
-        mock_pwf.side_effect = iter([file_handle1, file_handle2])
+        mock_pwf.return_value = file_handle1
         mock_exec.side_effect = iter([(None, None), (None, None)])
 
         ipmi._exec_ipmitool(self.info, 'A B C')
         mock_exec.assert_called_with(*args[0])
         # act like enough time has passed
-        ipmi.LAST_CMD_TIME[self.info['address']] = (time.time() -
+        ipmi.SESSIONS[self.info['address']].last_cmd_time = (time.time() -
                 CONF.ipmi.min_command_interval)
         ipmi._exec_ipmitool(self.info, 'D E F')
         self.assertFalse(mock_sleep.called)
         mock_exec.assert_called_with(*args[1])
 
     @mock.patch.object(ipmi, '_is_timing_supported')
-    @mock.patch.object(ipmi, '_make_password_file', autospec=True)
+    @mock.patch.object(ipmi, '_write_password_file', autospec=True)
     @mock.patch.object(utils, 'execute', autospec=True)
     def test__exec_ipmitool_two_calls_to_diff_address(self, mock_exec,
             mock_pwf, mock_timing_support, mock_sleep):
-        ipmi.LAST_CMD_TIME = {}
         pw_file_handle1 = tempfile.NamedTemporaryFile()
         pw_file1 = pw_file_handle1.name
         file_handle1 = open(pw_file1, "w")
@@ -326,7 +329,7 @@ class IPMIToolPrivateMethodTestCase(base.TestCase):
         mock_exec.assert_called_with(*args[1])
 
     @mock.patch.object(ipmi, '_is_timing_supported')
-    @mock.patch.object(ipmi, '_make_password_file', autospec=True)
+    @mock.patch.object(ipmi, '_write_password_file', autospec=True)
     @mock.patch.object(utils, 'execute', autospec=True)
     def test__exec_ipmitool_without_timing(self, mock_exec, mock_pwf,
             mock_timing_support, mock_sleep):
@@ -359,7 +362,7 @@ class IPMIToolPrivateMethodTestCase(base.TestCase):
         mock_exec.assert_called_once_with(*args)
 
     @mock.patch.object(ipmi, '_is_timing_supported')
-    @mock.patch.object(ipmi, '_make_password_file', autospec=True)
+    @mock.patch.object(ipmi, '_write_password_file', autospec=True)
     @mock.patch.object(utils, 'execute', autospec=True)
     def test__exec_ipmitool_with_timing(self, mock_exec, mock_pwf,
             mock_timing_support, mock_sleep):
@@ -393,7 +396,7 @@ class IPMIToolPrivateMethodTestCase(base.TestCase):
         mock_exec.assert_called_once_with(*args)
 
     @mock.patch.object(ipmi, '_is_timing_supported')
-    @mock.patch.object(ipmi, '_make_password_file', autospec=True)
+    @mock.patch.object(ipmi, '_write_password_file', autospec=True)
     @mock.patch.object(utils, 'execute', autospec=True)
     def test__exec_ipmitool_without_username(self, mock_exec, mock_pwf,
             mock_timing_support, mock_sleep):
@@ -421,7 +424,7 @@ class IPMIToolPrivateMethodTestCase(base.TestCase):
         self.assertTrue(mock_pwf.called)
         mock_exec.assert_called_once_with(*args, attempts=3)
 
-    @mock.patch.object(ipmi, '_make_password_file', autospec=True)
+    @mock.patch.object(ipmi, '_write_password_file', autospec=True)
     @mock.patch.object(utils, 'execute', autospec=True)
     def test__exec_ipmitool_with_single_bridging(self, mock_exec, mock_pwf):
         self.info['transit_channel'] = self.info['transit_address'] = None
@@ -447,7 +450,7 @@ class IPMIToolPrivateMethodTestCase(base.TestCase):
         self.assertTrue(mock_pwf.called)
         mock_exec.assert_called_once_with(*args, attempts=3)
 
-    @mock.patch.object(ipmi, '_make_password_file', autospec=True)
+    @mock.patch.object(ipmi, '_write_password_file', autospec=True)
     @mock.patch.object(utils, 'execute', autospec=True)
     def test__exec_ipmitool_without_bridging(self, mock_exec, mock_pwf):
         self.info['local_address'] = self.info['transit_channel'] = \
@@ -474,7 +477,7 @@ class IPMIToolPrivateMethodTestCase(base.TestCase):
         mock_exec.assert_called_once_with(*args)
 
     @mock.patch.object(ipmi, '_is_timing_supported')
-    @mock.patch.object(ipmi, '_make_password_file', autospec=True)
+    @mock.patch.object(ipmi, '_write_password_file', autospec=True)
     @mock.patch.object(utils, 'execute', autospec=True)
     def test__exec_ipmitool_exception(self, mock_exec, mock_pwf,
             mock_timing_support, mock_sleep):
@@ -505,6 +508,111 @@ class IPMIToolPrivateMethodTestCase(base.TestCase):
         mock_pwf.assert_called_once_with(self.info['password'])
         mock_exec.assert_called_once_with(*args)
 
+    @mock.patch.object(utils, 'delete_if_exists', autospec=True)
+    @mock.patch.object(ipmi, '_write_password_file', autospec=True)
+    @mock.patch.object(utils, 'execute', autospec=True)
+    def test_ipmi_session_password_changed(self, mock_exec, mock_pwf,
+                                           mock_delete, mock_sleep):
+        mock_pwf.side_effect = iter(['/tmp/pw1', '/tmp/pw2'])
+        mock_exec.return_value = (None, None)
+        session = ipmi.IPMISession(self.info['address'])
+
+        session.execute(['ipmitool'], 'pass1', ['A'])
+        session.execute(['ipmitool'], 'pass2', ['B'])
+
+        self.assertEqual([mock.call('pass1'), mock.call('pass2')],
+                         mock_pwf.call_args_list)
+        mock_delete.assert_called_once_with('/tmp/pw1')
+        mock_exec.assert_called_with('ipmitool', '-f', '/tmp/pw2', 'B')
+
+    @mock.patch.object(utils, 'delete_if_exists', autospec=True)
+    @mock.patch.object(ipmi, '_write_password_file', autospec=True)
+    @mock.patch.object(utils, 'execute', autospec=True)
+    def test_ipmi_session_exception_releases_session(self, mock_exec,
+                                                     mock_pwf, mock_delete,
+                                                     mock_sleep):
+        mock_pwf.return_value = '/tmp/pw1'
+        mock_exec.side_effect = processutils.ProcessExecutionError("x")
+        session = ipmi.IPMISession(self.info['address'])
+
+        self.assertRaises(processutils.ProcessExecutionError,
+                          session.execute, ['ipmitool'], 'pass', ['A'])
+
+        self.assertFalse(session.busy)
+        self.assertNotEqual(0, session.last_cmd_time)
+        session.close()
+        mock_delete.assert_called_once_with('/tmp/pw1')
+
+    @mock.patch.object(ipmi.IPMISession, 'close', autospec=True)
+    def test__get_session(self, mock_close, mock_sleep):
+        self.config(session_idle_timeout=60, group='ipmi')
+        idle = ipmi._get_session('10.0.0.1')
+        idle.last_used = time.time() - 61
+
+        session = ipmi._get_session(self.info['address'])
+
+        # Idle sessions are left to the sweeper.
+        self.assertEqual({'10.0.0.1': idle,
+                          self.info['address']: session},
+                         ipmi.SESSIONS)
+        self.assertFalse(mock_close.called)
+        self.assertIs(session, ipmi._get_session(self.info['address']))
+
+    @mock.patch.object(ipmi.IPMISession, 'close', autospec=True)
+    def test__sweep_sessions(self, mock_close, mock_sleep):
+        self.config(session_idle_timeout=60, group='ipmi')
+        idle = ipmi._get_session('10.0.0.1')
+        idle.last_used = time.time() - 61
+        busy = ipmi._get_session('10.0.0.2')
+        busy.last_used = time.time() - 61
+        busy._lock.acquire()
+        active = ipmi._get_session('10.0.0.3')
+
+        ipmi._sweep_sessions()
+
+        self.assertEqual({'10.0.0.2': busy, '10.0.0.3': active},
+                         ipmi.SESSIONS)
+        mock_close.assert_called_once_with(idle)
+
+    def test__get_session_starts_sweeper(self, mock_sleep):
+        self.config(session_idle_timeout=60, group='ipmi')
+
+        ipmi._get_session('10.0.0.1')
+        ipmi._get_session('10.0.0.2')
+
+        self.mock_spawn_after.assert_called_once_with(
+                60, ipmi._run_session_sweeper)
+
+    @mock.patch.object(ipmi.IPMISession, 'close', autospec=True)
+    def test__run_session_sweeper(self, mock_close, mock_sleep):
+        self.config(session_idle_timeout=60, group='ipmi')
+        idle = ipmi._get_session('10.0.0.1')
+        idle.last_used = time.time() - 61
+        ipmi.NODE_ADDRESSES['fake-uuid'] = '10.0.0.1'
+        self.mock_spawn_after.reset_mock()
+
+        ipmi._run_session_sweeper()
+
+        mock_close.assert_called_once_with(idle)
+        self.assertEqual({}, ipmi.SESSIONS)
+        self.assertEqual({}, ipmi.NODE_ADDRESSES)
+        self.assertIsNone(ipmi.SESSION_SWEEPER)
+        # Nothing is left to sweep, so the sweeper is not rescheduled.
+        self.assertFalse(self.mock_spawn_after.called)
+
+    @mock.patch.object(ipmi.IPMISession, 'close', autospec=True)
+    def test__get_node_session_address_changed(self, mock_close,
+                                               mock_sleep):
+        old = ipmi._get_node_session(self.info)
+        info = dict(self.info, address='10.0.0.1')
+
+        session = ipmi._get_node_session(info)
+
+        mock_close.assert_called_once_with(old)
+        self.assertEqual({'10.0.0.1': session}, ipmi.SESSIONS)
+        self.assertEqual({self.info['uuid']: '10.0.0.1'},
+                         ipmi.NODE_ADDRESSES)
+
     @mock.patch.object(ipmi, '_exec_ipmitool', autospec=True)
     def test__power_status_on(self, mock_exec, mock_sleep):
         mock_exec.return_value = ["Chassis Power is on\n", None]
@@ -543,7 +651,7 @@ class IPMIToolPrivateMethodTestCase(base.TestCase):
     @mock.patch.object(ipmi, '_exec_ipmitool', autospec=True)
     @mock.patch('eventlet.greenthread.sleep')
     def test__power_on_max_retries(self, sleep_mock, mock_exec, mock_sleep):
-        self.config(retry_timeout=2, group='ipmi')
+        self.config(retry_timeout=2, power_poll_jitter=0, group='ipmi')
 
         def side_effect(driver_info, command):
             resp_dict = {"power status": ["Chassis Power is off\n", None],
@@ -561,6 +669,84 @@ class IPMIToolPrivateMethodTestCase(base.TestCase):
         self.assertEqual(mock_exec.call_args_list, expected)
         self.assertEqual(states.ERROR, state)
 
+    @mock.patch.object(ipmi, '_exec_ipmitool', autospec=True)
+    @mock.patch('eventlet.greenthread.sleep')
+    def test__power_on_learns_transition_time(self, sleep_mock, mock_exec,
+                                              mock_sleep):
+        self.config(power_poll_jitter=0, group='ipmi')
+        responses = {"power status": [["Chassis Power is off\n", None],
+                                      ["Chassis Power is on\n", None]],
+                     "power on": [[None, None]]}
+        mock_exec.side_effect = lambda info, cmd: responses[cmd].pop(0)
+
+        with mock.patch.object(ipmi, 'time') as time_mock:
+            # power on at 100, missed poll at 101, successful poll at 103
+            time_mock.time.side_effect = [100, 101, 103]
+            state = ipmi._power_on(self.info)
+
+        self.assertEqual(states.POWER_ON, state)
+        self.assertEqual({(self.info['address'], states.POWER_ON): 2.0},
+                         ipmi.POWER_TRANSITIONS)
+
+    @mock.patch.object(ipmi, '_exec_ipmitool', autospec=True)
+    @mock.patch('eventlet.greenthread.sleep')
+    def test__power_on_first_poll_at_learnt_time(self, sleep_mock,
+                                                 mock_exec, mock_sleep):
+        self.config(power_poll_jitter=0, group='ipmi')
+        ipmi.POWER_TRANSITIONS[(self.info['address'], states.POWER_ON)] = 7
+        responses = {"power status": ["Chassis Power is on\n", None],
+                     "power on": [None, None]}
+        mock_exec.side_effect = lambda info, cmd: responses[cmd]
+
+        with mock.patch.object(ipmi, 'time') as time_mock:
+            # power on at 100, successful first poll at 109
+            time_mock.time.side_effect = [100, 109]
+            state = ipmi._power_on(self.info)
+
+        self.assertEqual(states.POWER_ON, state)
+        sleep_mock.assert_called_once_with(7)
+        self.assertEqual(2, mock_exec.call_count)
+        # The learnt time is kept, as the first poll was a hit.
+        self.assertEqual({(self.info['address'], states.POWER_ON): 7},
+                         ipmi.POWER_TRANSITIONS)
+
+    @mock.patch.object(ipmi.random, 'uniform')
+    def test__first_poll_time(self, uniform_mock, mock_sleep):
+        self.config(power_poll_jitter=0.5, retry_timeout=60, group='ipmi')
+        uniform_mock.return_value = 0.25
+
+        # no history: jittered default interval
+        self.assertEqual(0.25, ipmi._first_poll_time(self.info,
+                                                      states.POWER_OFF))
+        uniform_mock.assert_called_once_with(0.5, 1.5)
+
+        uniform_mock.reset_mock()
+        ipmi.POWER_TRANSITIONS[(self.info['address'], states.POWER_OFF)] = 8
+        self.assertEqual(10, ipmi._first_poll_time(self.info,
+                                                   states.POWER_OFF))
+        uniform_mock.assert_called_once_with(0, 0.5)
+
+        ipmi.POWER_TRANSITIONS[(self.info['address'], states.POWER_OFF)] = 80
+        self.assertEqual(60, ipmi._first_poll_time(self.info,
+                                                   states.POWER_OFF))
+
+    def test__record_transition_time(self, mock_sleep):
+        key = (self.info['address'], states.POWER_OFF)
+        ipmi._record_transition_time(self.info, states.POWER_OFF, 4, 8)
+        self.assertEqual(6.0, ipmi.POWER_TRANSITIONS[key])
+        ipmi._record_transition_time(self.info, states.POWER_OFF, 0, 4)
+        self.assertEqual(4.0, ipmi.POWER_TRANSITIONS[key])
+
+    def test__record_transition_time_first_poll(self, mock_sleep):
+        key = (self.info['address'], states.POWER_OFF)
+        ipmi._record_transition_time(self.info, states.POWER_OFF, None, 8)
+        self.assertEqual(8, ipmi.POWER_TRANSITIONS[key])
+        # The first poll only bounds the transition time from above.
+        ipmi._record_transition_time(self.info, states.POWER_OFF, None, 10)
+        self.assertEqual(8, ipmi.POWER_TRANSITIONS[key])
+        ipmi._record_transition_time(self.info, states.POWER_OFF, None, 5)
+        self.assertEqual(5, ipmi.POWER_TRANSITIONS[key])
+
 
 class IPMIToolDriverTestCase(db_base.DbTestCase):
 
@@ -191,6 +191,12 @@ class SSHPrivateMethodsTestCase(base.TestCase):
                         driver='fake_ssh',
                         driver_info=db_utils.get_test_ssh_info())
         self.sshclient = paramiko.SSHClient()
+        ssh.SSH_CONNECTIONS.clear()
+        ssh.RUNNING_VMS.clear()
+        ssh.MAC_INVENTORIES.clear()
+        self.addCleanup(ssh.SSH_CONNECTIONS.clear)
+        self.addCleanup(ssh.RUNNING_VMS.clear)
+        self.addCleanup(ssh.MAC_INVENTORIES.clear)
 
     @mock.patch.object(utils, 'ssh_connect')
     def test__get_connection_client(self, ssh_connect_mock):
@@ -201,13 +207,80 @@ class SSHPrivateMethodsTestCase(base.TestCase):
         ssh_connect_mock.assert_called_once_with(driver_info)
 
     @mock.patch.object(utils, 'ssh_connect')
-    def test__get_connection_exception(self, ssh_connect_mock):
-        ssh_connect_mock.side_effect = exception.SSHConnectFailed(host='fake')
-        self.assertRaises(exception.SSHConnectFailed,
-                          ssh._get_connection,
-                          self.node)
-        driver_info = ssh._parse_driver_info(self.node)
-        ssh_connect_mock.assert_called_once_with(driver_info)
+    def test__get_connection_reuses_active_client(self, ssh_connect_mock):
+        client = mock.Mock(spec_set=['get_transport', 'close'])
+        client.get_transport.return_value.is_active.return_value = True
+        ssh_connect_mock.return_value = client
+
+        self.assertEqual(client, ssh._get_connection(self.node))
+        self.assertEqual(client, ssh._get_connection(self.node))
+
+        self.assertEqual(1, ssh_connect_mock.call_count)
+        self.assertFalse(client.close.called)
+
+    @mock.patch.object(utils, 'ssh_connect')
+    def test__get_connection_reconnects_inactive_client(self,
+                                                        ssh_connect_mock):
+        client1 = mock.Mock(spec_set=['get_transport', 'close'])
+        client1.get_transport.return_value.is_active.return_value = False
+        client2 = mock.Mock(spec_set=['get_transport', 'close'])
+        ssh_connect_mock.side_effect = [client1, client2]
+
+        self.assertEqual(client1, ssh._get_connection(self.node))
+        self.assertEqual(client2, ssh._get_connection(self.node))
+
+        self.assertEqual(2, ssh_connect_mock.call_count)
+        client1.close.assert_called_once_with()
+
+    @mock.patch.object(processutils, 'ssh_execute')
+    def test__get_mac_inventory(self, exec_ssh_mock):
+        info = ssh._parse_driver_info(self.node)
+        exec_ssh_mock.return_value = (
+            '080027A1B2C3 NodeName\n'
+            '080027D4E5F6 Other Node\n'
+            '\n', '')
+
+        inventory = ssh._get_mac_inventory(self.sshclient, info)
+
+        self.assertEqual({'080027a1b2c3': 'NodeName',
+                          '080027d4e5f6': 'Other Node'}, inventory)
+        self.assertEqual(1, exec_ssh_mock.call_count)
+        cmd = exec_ssh_mock.call_args[0][1]
+        self.assertTrue(cmd.startswith('%s %s | while read -r name; do ' %
+                                       (info['cmd_set']['base_cmd'],
+                                        info['cmd_set']['list_all'])))
+        self.assertIn('showvminfo --machinereadable "$name"', cmd)
+
+    @mock.patch.object(processutils, 'ssh_execute')
+    def test__get_cached_running_list(self, exec_ssh_mock):
+        self.config(power_state_cache_timeout=60, group='ssh')
+        info = ssh._parse_driver_info(self.node)
+        exec_ssh_mock.return_value = ('"NodeName" {uuid}', '')
+        ssh_cmd = "%s %s" % (info['cmd_set']['base_cmd'],
+                             info['cmd_set']['list_running'])
+
+        self.assertEqual(['"NodeName" {uuid}'],
+                         ssh._get_cached_running_list(self.sshclient, info))
+        self.assertEqual(['"NodeName" {uuid}'],
+                         ssh._get_cached_running_list(self.sshclient, info))
+        exec_ssh_mock.assert_called_once_with(self.sshclient, ssh_cmd)
+
+        ssh._invalidate_running_list(info)
+        ssh._get_cached_running_list(self.sshclient, info)
+        self.assertEqual(2, exec_ssh_mock.call_count)
+
+    @mock.patch.object(ssh, '_get_cached_running_list')
+    @mock.patch.object(ssh, '_get_hosts_name_for_node')
+    def test__get_power_status_use_cache(self, get_hosts_name_mock,
+                                         running_list_mock):
+        info = ssh._parse_driver_info(self.node)
+        running_list_mock.return_value = ['"NodeName" {uuid}']
+        get_hosts_name_mock.return_value = "NodeName"
+
+        pstate = ssh._get_power_status(self.sshclient, info, use_cache=True)
+
+        self.assertEqual(states.POWER_ON, pstate)
+        running_list_mock.assert_called_once_with(self.sshclient, info)
 
     @mock.patch.object(processutils, 'ssh_execute')
     def test__ssh_execute(self, exec_ssh_mock):
@@ -299,65 +372,80 @@ class SSHPrivateMethodsTestCase(base.TestCase):
     def test__get_hosts_name_for_node_match(self, exec_ssh_mock):
         info = ssh._parse_driver_info(self.node)
         info['macs'] = ["11:11:11:11:11:11", "52:54:00:cf:2d:31"]
-        ssh_cmd = "%s %s" % (info['cmd_set']['base_cmd'],
-                             info['cmd_set']['list_all'])
-
-        cmd_to_exec = "%s %s" % (info['cmd_set']['base_cmd'],
-                                 info['cmd_set']['get_node_macs'])
-        cmd_to_exec = cmd_to_exec.replace('{_NodeName_}', 'NodeName')
-        exec_ssh_mock.side_effect = [('NodeName', ''),
-                                          ('52:54:00:cf:2d:31', '')]
-        expected = [mock.call(self.sshclient, ssh_cmd),
-                    mock.call(self.sshclient, cmd_to_exec)]
+        exec_ssh_mock.return_value = ('525400cf2d31 NodeName', '')
 
         found_name = ssh._get_hosts_name_for_node(self.sshclient, info)
 
         self.assertEqual('NodeName', found_name)
-        self.assertEqual(expected, exec_ssh_mock.call_args_list)
+        self.assertEqual(1, exec_ssh_mock.call_count)
 
     @mock.patch.object(processutils, 'ssh_execute')
     def test__get_hosts_name_for_node_no_match(self, exec_ssh_mock):
         info = ssh._parse_driver_info(self.node)
         info['macs'] = ["11:11:11:11:11:11", "22:22:22:22:22:22"]
-        exec_ssh_mock.side_effect = [('NodeName', ''),
-                                          ('52:54:00:cf:2d:31', '')]
-
-        ssh_cmd = "%s %s" % (info['cmd_set']['base_cmd'],
-                             info['cmd_set']['list_all'])
-
-        cmd_to_exec = "%s %s" % (info['cmd_set']['base_cmd'],
-                                 info['cmd_set']['get_node_macs'])
-
-        cmd_to_exec = cmd_to_exec.replace('{_NodeName_}', 'NodeName')
-        expected = [mock.call(self.sshclient, ssh_cmd),
-                    mock.call(self.sshclient, cmd_to_exec)]
+        exec_ssh_mock.return_value = ('525400cf2d31 NodeName', '')
 
         found_name = ssh._get_hosts_name_for_node(self.sshclient, info)
 
         self.assertIsNone(found_name)
-        self.assertEqual(expected, exec_ssh_mock.call_args_list)
+        # The inventory was just fetched, so it is not fetched again.
+        self.assertEqual(1, exec_ssh_mock.call_count)
 
     @mock.patch.object(processutils, 'ssh_execute')
     def test__get_hosts_name_for_node_exception(self, exec_ssh_mock):
         info = ssh._parse_driver_info(self.node)
         info['macs'] = ["11:11:11:11:11:11", "52:54:00:cf:2d:31"]
-        ssh_cmd = "%s %s" % (info['cmd_set']['base_cmd'],
-                             info['cmd_set']['list_all'])
-
-        cmd_to_exec = "%s %s" % (info['cmd_set']['base_cmd'],
-                                 info['cmd_set']['get_node_macs'])
-        cmd_to_exec = cmd_to_exec.replace('{_NodeName_}', 'NodeName')
-
-        exec_ssh_mock.side_effect = [('NodeName', ''),
-                                     processutils.ProcessExecutionError]
-        expected = [mock.call(self.sshclient, ssh_cmd),
-                    mock.call(self.sshclient, cmd_to_exec)]
+        exec_ssh_mock.side_effect = processutils.ProcessExecutionError
 
         self.assertRaises(exception.SSHCommandFailed,
                           ssh._get_hosts_name_for_node,
                           self.sshclient,
                           info)
-        self.assertEqual(expected, exec_ssh_mock.call_args_list)
+        self.assertEqual({}, ssh.MAC_INVENTORIES)
+
+    @mock.patch.object(ssh, '_get_mac_inventory')
+    def test__get_hosts_name_for_node_cached(self, inventory_mock):
+        self.config(mac_cache_timeout=60, group='ssh')
+        info = ssh._parse_driver_info(self.node)
+        info['macs'] = ["52:54:00:cf:2d:31"]
+        inventory_mock.return_value = {'525400cf2d31': 'NodeName'}
+
+        for i in range(3):
+            self.assertEqual('NodeName',
+                             ssh._get_hosts_name_for_node(self.sshclient,
+                                                          info))
+        inventory_mock.assert_called_once_with(self.sshclient, info)
+
+    @mock.patch.object(ssh, '_get_mac_inventory')
+    def test__get_hosts_name_for_node_miss_refreshes(self, inventory_mock):
+        self.config(mac_cache_timeout=60, group='ssh')
+        info = ssh._parse_driver_info(self.node)
+        info['macs'] = ["52:54:00:cf:2d:31"]
+        inventory_mock.side_effect = [{},
+                                      {'525400cf2d31': 'NewNode'}]
+
+        # fetched on a cold cache; not found and not fetched again
+        self.assertIsNone(ssh._get_hosts_name_for_node(self.sshclient, info))
+        # found in the cache by the refresh which follows the miss
+        self.assertEqual('NewNode',
+                         ssh._get_hosts_name_for_node(self.sshclient, info))
+        self.assertEqual(2, inventory_mock.call_count)
+
+    @mock.patch.object(processutils, 'ssh_execute')
+    def test__exec_on_node_failure_drops_inventory(self, exec_ssh_mock):
+        info = ssh._parse_driver_info(self.node)
+        ssh.MAC_INVENTORIES[ssh._get_host_key(info)] = mock.sentinel.inv
+        exec_ssh_mock.side_effect = processutils.ProcessExecutionError
+
+        self.assertRaises(exception.SSHCommandFailed,
+                          ssh._exec_on_node, self.sshclient, info,
+                          'NodeName', 'start_cmd')
+
+        cmd = "%s %s" % (info['cmd_set']['base_cmd'],
+                         info['cmd_set']['start_cmd'])
+        exec_ssh_mock.assert_called_once_with(
+                self.sshclient, cmd.replace('{_NodeName_}', 'NodeName'))
+        self.assertEqual({}, ssh.MAC_INVENTORIES)
 
     @mock.patch.object(processutils, 'ssh_execute')
     @mock.patch.object(ssh, '_get_power_status')
@@ -567,6 +655,12 @@ class SSHDriverTestCase(db_base.DbTestCase):
         self.port = self.dbapi.create_port(db_utils.get_test_port(
                                                          node_id=self.node.id))
         self.sshclient = paramiko.SSHClient()
+        ssh.SSH_CONNECTIONS.clear()
+        ssh.RUNNING_VMS.clear()
+        ssh.MAC_INVENTORIES.clear()
+        self.addCleanup(ssh.SSH_CONNECTIONS.clear)
+        self.addCleanup(ssh.RUNNING_VMS.clear)
+        self.addCleanup(ssh.MAC_INVENTORIES.clear)
 
     @mock.patch.object(utils, 'ssh_connect')
     def test__validate_info_ssh_connect_failed(self, ssh_connect_mock):
@@ -771,3 +865,52 @@ class SSHDriverTestCase(db_base.DbTestCase):
                 get_mac_addr_mock.assert_called_once_with(mock.ANY)
                 get_conn_mock.assert_called_once_with(task.node)
                 power_off_mock.assert_called_once_with(self.sshclient, info)
+
+    @mock.patch.object(driver_utils, 'get_node_mac_addresses')
+    @mock.patch.object(ssh, '_get_connection')
+    @mock.patch.object(ssh, '_get_power_status')
+    def test_get_power_state_cached(self, get_power_status_mock,
+                                    get_conn_mock, get_mac_addr_mock):
+        get_mac_addr_mock.return_value = ["08:00:27:a1:b2:c3"]
+        get_conn_mock.return_value = self.sshclient
+        get_power_status_mock.return_value = states.POWER_ON
+        with task_manager.acquire(self.context, self.node.uuid,
+                                  shared=True) as task:
+            self.assertEqual(states.POWER_ON,
+                             task.driver.power.get_power_state(task))
+        get_power_status_mock.assert_called_once_with(self.sshclient,
+                                                      mock.ANY,
+                                                      use_cache=True)
+
+    @mock.patch.object(driver_utils, 'get_node_mac_addresses')
+    @mock.patch.object(ssh, '_get_connection')
+    @mock.patch.object(ssh, '_get_power_status')
+    def test_get_power_state_cache_disabled(self, get_power_status_mock,
+                                            get_conn_mock,
+                                            get_mac_addr_mock):
+        self.config(power_state_cache_timeout=0, group='ssh')
+        get_mac_addr_mock.return_value = ["08:00:27:a1:b2:c3"]
+        get_conn_mock.return_value = self.sshclient
+        get_power_status_mock.return_value = states.POWER_OFF
+        with task_manager.acquire(self.context, self.node.uuid,
+                                  shared=True) as task:
+            self.assertEqual(states.POWER_OFF,
+                             task.driver.power.get_power_state(task))
+        get_power_status_mock.assert_called_once_with(self.sshclient,
+                                                      mock.ANY,
+                                                      use_cache=False)
+
+    @mock.patch.object(driver_utils, 'get_node_mac_addresses')
+    @mock.patch.object(ssh, '_get_connection')
+    @mock.patch.object(ssh, '_power_off')
+    def test_set_power_state_invalidates_running_list(self, power_off_mock,
+                                                      get_conn_mock,
+                                                      get_mac_addr_mock):
+        get_mac_addr_mock.return_value = ["08:00:27:a1:b2:c3"]
+        get_conn_mock.return_value = self.sshclient
+        power_off_mock.return_value = states.POWER_OFF
+        info = ssh._parse_driver_info(self.node)
+        ssh.RUNNING_VMS[ssh._get_host_key(info)] = mock.sentinel.running
+        with task_manager.acquire(self.context, self.node.uuid) as task:
+            task.driver.power.set_power_state(task, states.POWER_OFF)
+        self.assertEqual({}, ssh.RUNNING_VMS)
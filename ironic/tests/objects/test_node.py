@@ -73,6 +73,47 @@ class TestNodeObject(base.DbTestCase):
                 mock_update_node.assert_called_once_with(
                         uuid, {'properties': {"fake": "property"}})
 
+    def test_save_unchanged(self):
+        uuid = self.fake_node['uuid']
+        with mock.patch.object(self.dbapi, 'get_node_by_uuid',
+                               autospec=True) as mock_get_node:
+            mock_get_node.return_value = self.fake_node
+            with mock.patch.object(self.dbapi, 'update_node',
+                                   autospec=True) as mock_update_node:
+
+                n = objects.Node.get(self.context, uuid)
+                n.last_error = self.fake_node['last_error']
+                n.power_state = self.fake_node['power_state']
+                n.save()
+
+                self.assertFalse(mock_update_node.called)
+
+    def test_save_deferred(self):
+        uuid = self.fake_node['uuid']
+        with mock.patch.object(self.dbapi, 'get_node_by_uuid',
+                               autospec=True) as mock_get_node:
+            mock_get_node.return_value = self.fake_node
+            with mock.patch.object(self.dbapi, 'update_node',
+                                   autospec=True) as mock_update_node:
+
+                n = objects.Node.get(self.context, uuid)
+                n.defer_saves()
+                n.power_state = 'fake-state'
+                n.save()
+                n.last_error = 'fake-error'
+                n.save()
+                self.assertFalse(mock_update_node.called)
+
+                n.flush(self.context)
+                mock_update_node.assert_called_once_with(
+                        uuid, {'power_state': 'fake-state',
+                               'last_error': 'fake-error'})
+
+                # Saves are still deferred after a flush.
+                n.power_state = 'other-state'
+                n.save()
+                self.assertEqual(1, mock_update_node.call_count)
+
     def test_refresh(self):
         uuid = self.fake_node['uuid']
         returns = [dict(self.fake_node, properties={"fake": "first"}),
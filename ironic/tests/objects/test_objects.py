@@ -390,6 +390,14 @@ class _TestObject(object):
         self.assertEqual('refreshed', obj.bar)
         self.assertRemotes()
 
+    def test_changed_same_value(self):
+        obj = MyObj.query(self.context)
+        obj.foo = obj.foo
+        self.assertEqual(set([]), obj.obj_what_changed())
+        obj.foo = 123
+        obj.foo = 1
+        self.assertEqual(set(['foo']), obj.obj_what_changed())
+
     def test_changed_4(self):
         obj = MyObj.query(self.context)
         obj.bar = 'something'
@@ -13,6 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
+import mock
 from oslo.config import cfg
 
 from ironic.common import exception
@@ -108,6 +111,56 @@ class HashRingTestCase(base.TestCase):
         self.assertEqual(['foo'], ring.get_hosts('fake',
                                                  ignore_hosts=['baz']))
 
+    def test_get_hosts_many(self):
+        hosts = ['foo', 'bar', 'baz']
+        ring = hash.HashRing(hosts, replicas=2)
+        self.assertEqual({'fake': ['foo', 'bar'],
+                          'fake-again': ['bar', 'baz']},
+                         ring.get_hosts_many(['fake', 'fake-again']))
+
+    def test_get_hosts_many_ignore_hosts(self):
+        hosts = ['foo', 'bar', 'baz']
+        ring = hash.HashRing(hosts, replicas=2)
+        self.assertEqual({'fake': ['bar', 'baz'],
+                          'fake-again': ['bar', 'baz']},
+                         ring.get_hosts_many(['fake', 'fake-again'],
+                                             ignore_hosts=['foo']))
+
+    def test_ignore_hosts_not_cached(self):
+        hosts = ['foo', 'bar', 'baz']
+        ring = hash.HashRing(hosts, replicas=1)
+        self.assertEqual(['bar'], ring.get_hosts('fake',
+                                                 ignore_hosts=['foo']))
+        self.assertEqual(['foo'], ring.get_hosts('fake'))
+        self.assertEqual(['foo'], ring.get_hosts('fake'))
+        self.assertEqual(['bar'], ring.get_hosts('fake',
+                                                 ignore_hosts=['foo']))
+
+    def test_get_hosts_returns_copy(self):
+        hosts = ['foo', 'bar']
+        ring = hash.HashRing(hosts, replicas=1)
+        ring.get_hosts('fake').append('baz')
+        self.assertEqual(['foo'], ring.get_hosts('fake'))
+
+    def test_partition_table_layout(self):
+        hosts = ['foo', 'bar', 'baz']
+        CONF.set_override('hash_partition_exponent', 3)
+        ring = hash.HashRing(hosts)
+        self.assertEqual([0, 1, 2, 0, 1, 2, 0, 1], list(ring.part2host))
+
+    def test_get_slice(self):
+        CONF.set_override('hash_partition_exponent', 3)
+        ring = hash.HashRing(['foo', 'bar'])
+        with mock.patch.object(ring, '_get_partition') as partition_mock:
+            partition_mock.side_effect = range(8)
+            slices = [ring.get_slice('fake', 2) for i in range(8)]
+        self.assertEqual([0, 0, 0, 0, 1, 1, 1, 1], slices)
+
+    def test_create_ring_no_hosts(self):
+        self.assertRaises(exception.Invalid,
+                          hash.HashRing,
+                          [])
+
     def test_create_ring_invalid_data(self):
         hosts = None
         self.assertRaises(exception.Invalid,
@@ -151,14 +204,92 @@ class HashRingManagerTestCase(db_base.DbTestCase):
                           self.ring_manager.get_hash_ring,
                           'driver3')
 
-    def test_hash_ring_manager_no_refresh(self):
+    @mock.patch.object(time, 'time')
+    def test_hash_ring_manager_no_refresh(self, mock_time):
         # If a new conductor is registered after the ring manager is
-        # initialized, it won't be seen. Long term this is probably
-        # undesirable, but today is the intended behavior.
+        # initialized, it won't be seen until hash_ring_reset_interval
+        # has passed.
+        CONF.set_override('hash_ring_reset_interval', 60)
+        mock_time.return_value = 1000
         self.assertRaises(exception.DriverNotFound,
                           self.ring_manager.get_hash_ring,
                           'driver1')
         self.register_conductors()
+        mock_time.return_value = 1059
         self.assertRaises(exception.DriverNotFound,
                           self.ring_manager.get_hash_ring,
                           'driver1')
+
+    @mock.patch.object(time, 'time')
+    def test_hash_ring_manager_refresh_after_interval(self, mock_time):
+        CONF.set_override('hash_ring_reset_interval', 60)
+        mock_time.return_value = 1000
+        self.assertRaises(exception.DriverNotFound,
+                          self.ring_manager.get_hash_ring,
+                          'driver1')
+        self.register_conductors()
+        mock_time.return_value = 1060
+        ring = self.ring_manager.get_hash_ring('driver1')
+        self.assertEqual(sorted(['host1', 'host2']), sorted(ring.hosts))
+
+    @mock.patch.object(hash.threading, 'Thread')
+    @mock.patch.object(time, 'time')
+    def test_hash_ring_manager_background_refresh(self, mock_time,
+                                                  mock_thread):
+        CONF.set_override('hash_ring_reset_interval', 60)
+        ring_manager = hash.HashRingManager(background_refresh=True)
+        self.register_conductors()
+        mock_time.return_value = 1000
+        ring = ring_manager.get_hash_ring('driver1')
+        self.assertFalse(mock_thread.called)
+
+        self.dbapi.register_conductor({'hostname': 'host3',
+                                       'drivers': ['driver1']})
+        mock_time.return_value = 1060
+        # The current ring is served until the refresh has finished, and
+        # a single refresh is started.
+        self.assertIs(ring, ring_manager.get_hash_ring('driver1'))
+        self.assertIs(ring, ring_manager.get_hash_ring('driver1'))
+        mock_thread.assert_called_once_with(
+                target=ring_manager._refresh_and_release)
+        mock_thread.return_value.start.assert_called_once_with()
+
+        ring_manager._refresh_and_release()
+        ring = ring_manager.get_hash_ring('driver1')
+        self.assertEqual(sorted(['host1', 'host2', 'host3']),
+                         sorted(ring.hosts))
+
+    def test_hash_ring_manager_refresh(self):
+        self.register_conductors()
+        self.ring_manager.get_hash_ring('driver1')
+        ring2 = self.ring_manager.get_hash_ring('driver2')
+
+        self.dbapi.register_conductor({'hostname': 'host3',
+                                       'drivers': ['driver1']})
+        self.assertEqual(set(['driver1']), self.ring_manager.refresh())
+
+        ring1 = self.ring_manager.get_hash_ring('driver1')
+        self.assertEqual(sorted(['host1', 'host2', 'host3']),
+                         sorted(ring1.hosts))
+        # driver2's hosts did not change, so its ring was kept
+        self.assertIs(ring2, self.ring_manager.get_hash_ring('driver2'))
+
+    def test_hash_ring_manager_refresh_unchanged(self):
+        self.register_conductors()
+        self.ring_manager.get_hash_ring('driver1')
+
+        with mock.patch.object(self.dbapi,
+                               'get_active_driver_dict') as mock_d2c:
+            self.assertEqual(set(), self.ring_manager.refresh())
+            self.assertFalse(mock_d2c.called)
+
+    def test_hash_ring_manager_refresh_conductor_gone(self):
+        self.register_conductors()
+        self.ring_manager.get_hash_ring('driver2')
+
+        self.dbapi.unregister_conductor('host1')
+        self.assertEqual(set(['driver1', 'driver2']),
+                         self.ring_manager.refresh())
+        self.assertRaises(exception.DriverNotFound,
+                          self.ring_manager.get_hash_ring,
+                          'driver2')
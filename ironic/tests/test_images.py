@@ -17,10 +17,16 @@
 #    under the License.
 
 import contextlib
+import hashlib
+import os
+import tempfile
+
 import fixtures
+import mock
 
 from ironic.common import exception
 from ironic.common import images
+from ironic.common import utils
 from ironic.openstack.common import excutils
 from ironic.tests import base
 
@@ -110,3 +116,108 @@ class IronicImagesTestCase(base.TestCase):
         self.assertEqual(expected_commands, self.executes)
 
         del self.executes
+
+    def _fake_image_service(self, chunks, checksum=None):
+        def fake_download(image_href, data):
+            for chunk in chunks:
+                data.write(chunk)
+
+        image_service = mock.Mock(spec_set=['download', 'show'])
+        image_service.download.side_effect = fake_download
+        image_service.show.return_value = {'checksum': checksum}
+        return image_service
+
+    def _get_path(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(utils.delete_if_exists, path)
+        return path
+
+    def test_fetch_raw_checksum_ok(self):
+        chunks = [b'\0' * 300, b'\0' * 210 + b'\x55\xaa' + b'a' * 100]
+        image_service = self._fake_image_service(
+                chunks, hashlib.md5(b''.join(chunks)).hexdigest())
+        path = self._get_path()
+
+        self.assertTrue(images.fetch('ctx', 'image', path, image_service))
+
+        with open(path, 'rb') as f:
+            self.assertEqual(b''.join(chunks), f.read())
+        image_service.show.assert_called_once_with('image')
+
+    def test_fetch_qcow2_header(self):
+        chunks = [b'QF', b'I\xfb' + b'\0' * 200]
+        image_service = self._fake_image_service(chunks)
+        path = self._get_path()
+
+        self.assertFalse(images.fetch('ctx', 'image', path, image_service))
+
+    def test_fetch_vdi_header(self):
+        chunks = [b'\0' * 0x40 + b'\x7f\x10\xda\xbe' + b'\0' * 100]
+        image_service = self._fake_image_service(chunks)
+        path = self._get_path()
+
+        self.assertFalse(images.fetch('ctx', 'image', path, image_service))
+
+    def test_fetch_mbr_with_qcow2_header(self):
+        chunks = [b'QFI\xfb' + b'\0' * 506 + b'\x55\xaa']
+        image_service = self._fake_image_service(chunks)
+        path = self._get_path()
+
+        self.assertFalse(images.fetch('ctx', 'image', path, image_service))
+
+    def test_fetch_unrecognised_header(self):
+        # Not known to be raw, so it is left for qemu-img to inspect.
+        chunks = [b'koly' + b'\0' * 600]
+        image_service = self._fake_image_service(chunks)
+        path = self._get_path()
+
+        self.assertFalse(images.fetch('ctx', 'image', path, image_service))
+
+    def test_fetch_short_image(self):
+        image_service = self._fake_image_service([b'\0' * 100])
+        path = self._get_path()
+
+        self.assertFalse(images.fetch('ctx', 'image', path, image_service))
+
+    def test_fetch_checksum_mismatch(self):
+        image_service = self._fake_image_service([b'\0' * 100], 'bogus')
+        path = self._get_path()
+
+        self.assertRaises(exception.ImageDownloadFailed,
+                          images.fetch, 'ctx', 'image', path, image_service)
+        self.assertFalse(os.path.exists(path))
+
+    def test_fetch_not_written_through_writer(self):
+        image_service = self._fake_image_service([])
+        path = self._get_path()
+
+        self.assertFalse(images.fetch('ctx', 'image', path, image_service))
+        self.assertFalse(image_service.show.called)
+
+    @mock.patch.object(images, 'image_to_raw')
+    @mock.patch.object(os, 'rename')
+    @mock.patch.object(images, 'fetch')
+    def test_fetch_to_raw_raw_image(self, fetch_mock, rename_mock,
+                                    image_to_raw_mock):
+        fetch_mock.return_value = True
+
+        images.fetch_to_raw('ctx', 'image', 't.raw', 'service')
+
+        fetch_mock.assert_called_once_with('ctx', 'image', 't.raw.part',
+                                           'service')
+        rename_mock.assert_called_once_with('t.raw.part', 't.raw')
+        self.assertFalse(image_to_raw_mock.called)
+
+    @mock.patch.object(images, 'image_to_raw')
+    @mock.patch.object(os, 'rename')
+    @mock.patch.object(images, 'fetch')
+    def test_fetch_to_raw_other_image(self, fetch_mock, rename_mock,
+                                      image_to_raw_mock):
+        fetch_mock.return_value = False
+
+        images.fetch_to_raw('ctx', 'image', 't.qcow2', 'service')
+
+        self.assertFalse(rename_mock.called)
+        image_to_raw_mock.assert_called_once_with('image', 't.qcow2',
+                                                  't.qcow2.part')
@@ -0,0 +1,80 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Latency benchmark for PATCH /v1/nodes/<uuid> against a running API.
+
+Sends the given number of PATCH requests, each setting a key in the
+node's extra field, and reports the p50, p99 and maximum latency. Run it
+against the API service before and after a change to compare them.
+
+Usage: python tools/api_latency_benchmark.py --node UUID
+           [--url http://127.0.0.1:6385] [--token TOKEN]
+           [--requests N] [--warmup N]
+"""
+
+import argparse
+import json
+import time
+
+from six.moves import http_client
+from six.moves.urllib import parse
+
+
+def _percentile(sorted_values, percent):
+    index = int(round(percent / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:6385',
+                        help='Endpoint of the Ironic API.')
+    parser.add_argument('--node', required=True,
+                        help='UUID of the node to patch.')
+    parser.add_argument('--token',
+                        help='Keystone token, sent as X-Auth-Token.')
+    parser.add_argument('--requests', type=int, default=1000,
+                        help='Number of timed requests.')
+    parser.add_argument('--warmup', type=int, default=10,
+                        help='Number of requests sent before timing.')
+    args = parser.parse_args()
+
+    url = parse.urlparse(args.url)
+    conn = http_client.HTTPConnection(url.hostname, url.port)
+    path = '%s/v1/nodes/%s' % (url.path.rstrip('/'), args.node)
+    headers = {'Content-Type': 'application/json'}
+    if args.token:
+        headers['X-Auth-Token'] = args.token
+
+    latencies = []
+    for i in range(args.warmup + args.requests):
+        body = json.dumps([{'op': 'add', 'path': '/extra/benchmark',
+                            'value': str(i)}])
+        start = time.time()
+        conn.request('PATCH', path, body, headers)
+        response = conn.getresponse()
+        response.read()
+        elapsed = time.time() - start
+        if response.status != 200:
+            raise SystemExit('PATCH %s returned %d' % (path,
+                                                       response.status))
+        if i >= args.warmup:
+            latencies.append(elapsed)
+
+    latencies.sort()
+    print('%d requests: p50 %.1f ms, p99 %.1f ms, max %.1f ms'
+          % (len(latencies), _percentile(latencies, 50) * 1000,
+             _percentile(latencies, 99) * 1000, latencies[-1] * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# Copyright 2014 Hewlett-Packard Development Company, L.P.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Micro-benchmark for ironic.common.hash_ring.HashRing.
+
+Builds a ring and reports how many node lookups per second it can serve,
+using get_hosts() one node at a time and get_hosts_many() in bulk.
+
+Usage: python tools/hash_ring_benchmark.py [--nodes N] [--hosts N]
+                                           [--replicas N] [--ignore N]
+"""
+
+import argparse
+import time
+import uuid
+
+from ironic.common import hash_ring
+
+
+def _time(func, *args, **kwargs):
+    start = time.time()
+    func(*args, **kwargs)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--nodes', type=int, default=100000,
+                        help='Number of node uuids to look up.')
+    parser.add_argument('--hosts', type=int, default=20,
+                        help='Number of conductors in the ring.')
+    parser.add_argument('--replicas', type=int, default=1,
+                        help='Number of hosts mapped to each partition.')
+    parser.add_argument('--ignore', type=int, default=0,
+                        help='Number of hosts to pass as ignore_hosts.')
+    args = parser.parse_args()
+
+    hosts = ['conductor-%d' % i for i in range(args.hosts)]
+    ignore_hosts = hosts[:args.ignore] or None
+    uuids = [str(uuid.uuid4()) for i in range(args.nodes)]
+
+    elapsed = _time(hash_ring.HashRing, hosts, replicas=args.replicas)
+    print('Ring build: %.4f seconds' % elapsed)
+
+    ring = hash_ring.HashRing(hosts, replicas=args.replicas)
+
+    def _lookup_each():
+        for node_uuid in uuids:
+            ring.get_hosts(node_uuid, ignore_hosts=ignore_hosts)
+
+    for label, func, func_args in (
+            ('get_hosts (cold)', _lookup_each, ()),
+            ('get_hosts (warm)', _lookup_each, ()),
+            ('get_hosts_many', ring.get_hosts_many, (uuids, ignore_hosts))):
+        elapsed = _time(func, *func_args)
+        print('%-18s %10.0f lookups/second (%d nodes in %.3f seconds)'
+              % (label, args.nodes / elapsed, args.nodes, elapsed))
+
+
+if __name__ == '__main__':
+    main()